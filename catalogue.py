@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# ============================================================
+# SQLITE CATALOGUE OF DEFECT, SPECTRUM AND CAVITY RESULTS
+# - Indexes every artifact (<folder>/<name>_*) with defect and stage,
+#   plus key scalars: atoms, spin, magnetic moment, KS gap, screening,
+#   ZPL (LR-TDDFT) and bright transitions, stage timings; cavity modes /
+#   Purcell spectra (also in cavity_runs/) and cavity_results.csv
+# - Transitions are labelled by backend; the pipeline's <name>_spectrum.csv
+#   takes the one recorded in <name>_timings.json (LR if none)
+# - Incremental: only files whose size/mtime changed are re-parsed
+#   (tddft_pipeline.py updates the folder of each finished job)
+# Usage:
+#   python catalogue.py update
+#   python catalogue.py bright --window 560 590 --magmom 0.1
+#   python catalogue.py sql "SELECT defect, zpl_nm FROM defects ORDER BY zpl_nm"
+# ============================================================
+import os
+import re
+import json
+import glob
+import time
+import sqlite3
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from zpl_purcell_table_and_tolerance import HC, BRIGHT_THR, load_purcell_csv, zpl_from_transitions
+
+# =========================
+# USER SETTINGS
+# =========================
+BASE = "."
+DB_FILE = "catalogue.sqlite"
+BRIGHT_OSC = 1e-3              # default |f| of a "bright" transition in queries
+SKIP_DIRS = ("logs", "cavity_runs", "nanobeam_structure_cache", "__pycache__", ".git")
+# =========================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY, defect TEXT, stage TEXT, kind TEXT, size INTEGER, mtime REAL);
+CREATE INDEX IF NOT EXISTS idx_artifacts_defect ON artifacts(defect, stage);
+
+CREATE TABLE IF NOT EXISTS defects (
+    defect TEXT PRIMARY KEY, folder TEXT, n_atoms INTEGER, spin_polarized INTEGER,
+    magmom REAL, ks_gap_ev REAL, vbm_ev REAL, cbm_ev REAL,
+    screen_passed INTEGER, screen_score REAL,
+    zpl_ev REAL, zpl_nm REAL, zpl_osc REAL, n_bright INTEGER);
+CREATE INDEX IF NOT EXISTS idx_defects_zpl ON defects(zpl_nm);
+
+CREATE TABLE IF NOT EXISTS transitions (
+    defect TEXT, backend TEXT, energy_ev REAL, wavelength_nm REAL, osc REAL);
+CREATE INDEX IF NOT EXISTS idx_transitions_wl ON transitions(wavelength_nm, osc);
+CREATE INDEX IF NOT EXISTS idx_transitions_defect ON transitions(defect, backend);
+
+CREATE TABLE IF NOT EXISTS timings (
+    defect TEXT, stage TEXT, seconds REAL, ranks INTEGER, PRIMARY KEY (defect, stage));
+
+CREATE TABLE IF NOT EXISTS cavities (
+    path TEXT PRIMARY KEY, a REAL, r REAL, w REAL, nholes INTEGER, n_beam REAL, resolution INTEGER,
+    lambda_nm REAL, q REAL, fp_max REAL, lambda_peak_nm REAL);
+CREATE INDEX IF NOT EXISTS idx_cavities_lambda ON cavities(lambda_nm);
+"""
+
+# file suffix (after the defect name) → stage; first match wins
+STAGES = [
+    ("_spectrum_rt.csv", "rt_tddft"), ("_absorption_rt.dat", "rt_tddft"), ("_rt", "rt_tddft"),
+    ("_relaxed", "relax"), ("_opt", "relax"), ("_lcao", "lcao"), ("_fd", "fd"),
+    ("_lrtddft", "tddft"), ("_spectrum.csv", "tddft"), ("_screen.json", "screen"),
+    ("_timings.json", "timings"), ("_lineshape.csv", "lineshape"),
+]
+
+
+def connect(db=DB_FILE):
+    con = sqlite3.connect(db, timeout=60)      # concurrent pipeline jobs update the same file
+    con.executescript(SCHEMA)
+    return con
+
+
+def stage_of(defect, fname):
+    rest = fname[len(defect):]
+    for suffix, stage in STAGES:
+        if rest.startswith(suffix):
+            return stage
+    return "structure"
+
+
+def set_defect(con, defect, **values):
+    con.execute("INSERT OR IGNORE INTO defects(defect) VALUES (?)", (defect,))
+    cols = ", ".join(f"{k} = ?" for k in values)
+    con.execute(f"UPDATE defects SET {cols} WHERE defect = ?", (*values.values(), defect))
+
+
+# =========================
+# PARSERS (one per artifact kind)
+# =========================
+def pipeline_backend(defect, path):
+    """Backend of the pipeline's <name>_spectrum.csv, as recorded in <name>_timings.json."""
+    timings = os.path.join(os.path.dirname(path), f"{defect}_timings.json")
+    if os.path.exists(timings):
+        with open(timings) as f:
+            return json.load(f).get("spectrum", {}).get("backend", "lr")
+    return "lr"
+
+
+def parse_spectrum(con, defect, path, backend):
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    if path.endswith("_spectrum.csv"):
+        # the pipeline's single spectrum replaces whatever backend produced it before
+        con.execute("DELETE FROM transitions WHERE defect = ? AND backend = 'lr'", (defect,))
+        if backend != "lr":
+            set_defect(con, defect, zpl_ev=None, zpl_nm=None, zpl_osc=None, n_bright=None)
+    con.execute("DELETE FROM transitions WHERE defect = ? AND backend = ?", (defect, backend))
+    con.executemany("INSERT INTO transitions VALUES (?, ?, ?, ?, ?)",
+                    [(defect, backend, float(e), HC / float(e), float(f)) for e, f in data if e > 0])
+    if backend == "lr" and len(data):
+        df = pd.DataFrame({"Molecule": defect, "Energy(eV)": data[:, 0], "Osc": data[:, 1]})
+        zpl_ev, zpl_nm, osc = zpl_from_transitions(df, defect)
+        set_defect(con, defect, zpl_ev=zpl_ev, zpl_nm=zpl_nm, zpl_osc=osc,
+                   n_bright=int(np.sum(data[:, 1] > BRIGHT_THR)))
+
+
+def parse_screen(con, defect, path):
+    with open(path) as f:
+        s = json.load(f)
+    set_defect(con, defect, magmom=s.get("Magnetic_moment"), ks_gap_ev=s.get("KS_gap_eV"),
+               vbm_ev=s.get("VBM_eV"), cbm_ev=s.get("CBM_eV"),
+               screen_passed=int(bool(s.get("Passed"))), screen_score=s.get("Score"))
+
+
+def parse_timings(con, defect, path):
+    with open(path) as f:
+        timings = json.load(f)
+    con.executemany("INSERT OR REPLACE INTO timings VALUES (?, ?, ?, ?)",
+                    [(defect, st, t["seconds"], t.get("ranks")) for st, t in timings.items()
+                     if "seconds" in t])
+
+
+def parse_gpaw_log(con, defect, path):
+    """Spin flag and the converged (last) total magnetic moment; the
+    "Magnetic moment:" echo of the input is only the starting guess."""
+    magmom, spin = None, False
+    with open(path, errors="ignore") as f:
+        for line in f:
+            if line.startswith("Spin-polarized calculation"):
+                spin = True
+            if line.startswith("Total magnetic moment:"):
+                m = np.array(re.findall(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?", line.split(":", 1)[1]), float)
+                if len(m) == 3:
+                    # collinear runs print (0, 0, m_z); non-collinear ones a full vector
+                    magmom = float(m[2]) if not m[:2].any() else float(np.linalg.norm(m))
+                elif len(m) == 1:
+                    magmom = float(m[0])
+    values = {"spin_polarized": int(spin)}
+    if magmom is not None:
+        values["magmom"] = magmom
+    set_defect(con, defect, **values)
+
+
+def parse_xyz(con, defect, path):
+    with open(path) as f:
+        set_defect(con, defect, n_atoms=int(f.readline()))
+
+
+def parse_defect_file(con, defect, path):
+    fname = os.path.basename(path)
+    rest = fname[len(defect):]
+    if rest == "_spectrum.csv":
+        parse_spectrum(con, defect, path, pipeline_backend(defect, path))
+    elif rest == "_spectrum_rt.csv":
+        parse_spectrum(con, defect, path, "rt")
+    elif rest == "_screen.json":
+        parse_screen(con, defect, path)
+    elif rest == "_timings.json":
+        parse_timings(con, defect, path)
+    elif rest in ("_lcao.log", "_fd.log"):
+        parse_gpaw_log(con, defect, path)
+    elif rest in (".xyz", "_relaxed.xyz"):
+        parse_xyz(con, defect, path)
+
+
+def parse_cavity_folder(con, base, folder):
+    """cavity_mode_best.txt + purcell_spectrum.csv of one cavity run."""
+    row = {"path": os.path.relpath(folder, base)}
+    mode = os.path.join(folder, "cavity_mode_best.txt")
+    if os.path.exists(mode):
+        _, row["q"], row["lambda_nm"] = np.loadtxt(mode)
+    pur = os.path.join(folder, "purcell_spectrum.csv")
+    if os.path.exists(pur):
+        p = load_purcell_csv(pur)
+        i = int(np.argmax(p["Fp"].to_numpy()))
+        row["fp_max"], row["lambda_peak_nm"] = float(p["Fp"].iloc[i]), float(p["wavelength_nm"].iloc[i])
+    cols = ", ".join(row)
+    con.execute(f"INSERT OR REPLACE INTO cavities ({cols}) VALUES ({', '.join('?' * len(row))})",
+                tuple(float(v) if isinstance(v, np.floating) else v for v in row.values()))
+
+
+def parse_cavity_results(con, base, path):
+    df = pd.read_csv(path)
+    key = os.path.relpath(path, base)
+    con.execute("DELETE FROM cavities WHERE path LIKE ?", (f"{key}#%",))
+    con.executemany(
+        "INSERT OR REPLACE INTO cavities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(f"{key}#{i}", r.a, r.r, r.w, int(r.Nholes_each_side), r.n_beam,
+          int(r.resolution), r.lambda_nm, r.Q, None if pd.isna(r.Fp_peak) else r.Fp_peak, None)
+         for i, r in df.iterrows()])
+
+
+def parse_metrics_csv(con, path):
+    """Root summary tables fill values that no per-defect artifact provided."""
+    df = pd.read_csv(path)
+    for _, r in df.iterrows():
+        con.execute("INSERT OR IGNORE INTO defects(defect) VALUES (?)", (r["Defect"],))
+        con.execute("UPDATE defects SET ks_gap_ev = COALESCE(ks_gap_ev, ?), magmom = COALESCE(magmom, ?) "
+                    "WHERE defect = ?", (r["KS_gap (eV)"], r["Magnetic_moment (μB)"], r["Defect"]))
+
+
+# =========================
+# INCREMENTAL UPDATE
+# =========================
+def changed(con, base, path, defect, stage, kind):
+    """Record the artifact (path relative to base); True if new or modified."""
+    st = os.stat(path)
+    key = os.path.relpath(path, base)
+    old = con.execute("SELECT size, mtime FROM artifacts WHERE path = ?", (key,)).fetchone()
+    if old == (st.st_size, st.st_mtime):
+        return False
+    con.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?)",
+                (key, defect, stage, kind, st.st_size, st.st_mtime))
+    return True
+
+
+def update(base=BASE, db=DB_FILE, folders=None):
+    """Index new/changed artifacts below base (or only the given defect folders)."""
+    t0 = time.time()
+    con = connect(db)
+    n_new = 0
+    with con:
+        if folders is None:
+            folders = [d for d in sorted(glob.glob(os.path.join(base, "*"))) if os.path.isdir(d)
+                       and os.path.basename(d) not in SKIP_DIRS]
+        for folder in folders:
+            defect = os.path.basename(os.path.normpath(folder))
+            files = sorted(glob.glob(os.path.join(folder, f"{glob.escape(defect)}[._]*")))
+            if not files:
+                continue
+            con.execute("INSERT OR IGNORE INTO defects(defect) VALUES (?)", (defect,))
+            set_defect(con, defect, folder=os.path.relpath(folder, base))
+            # logs before screening results: the screen JSON has the more precise moment
+            for path in sorted(files, key=lambda p: p.endswith("_screen.json")):
+                kind = os.path.splitext(path)[1].lstrip(".")
+                stage = stage_of(defect, os.path.basename(path))
+                if stage == "tddft" and path.endswith("_spectrum.csv") and pipeline_backend(defect, path) == "rt":
+                    stage = "rt_tddft"
+                if changed(con, base, path, defect, stage, kind):
+                    parse_defect_file(con, defect, path)
+                    n_new += 1
+
+        for path in glob.glob(os.path.join(base, "*.csv")):
+            name = os.path.basename(path)
+            if name == "cavity_results.csv" and changed(con, base, path, None, "cavity", "csv"):
+                parse_cavity_results(con, base, path)
+                n_new += 1
+            elif name == "electronic_defect_metrics.csv" and changed(con, base, path, None, "summary", "csv"):
+                parse_metrics_csv(con, path)
+                n_new += 1
+
+        for mode in glob.glob(os.path.join(base, "**", "cavity_mode_best.txt"), recursive=True):
+            folder = os.path.dirname(mode)
+            pur = os.path.join(folder, "purcell_spectrum.csv")
+            new = changed(con, base, mode, None, "cavity", "txt")
+            if os.path.exists(pur):
+                new = changed(con, base, pur, None, "cavity", "csv") or new
+            if new:
+                parse_cavity_folder(con, base, folder)
+                n_new += 1
+    con.close()
+    return n_new, time.time() - t0
+
+
+# =========================
+# QUERIES
+# =========================
+def query(sql, params=(), db=DB_FILE):
+    with sqlite3.connect(db) as con:
+        return pd.read_sql_query(sql, con, params=params)
+
+
+def bright_in_window(lo_nm, hi_nm, min_osc=BRIGHT_OSC, min_magmom=None, backend="lr", db=DB_FILE):
+    """Defects with a transition of |f| ≥ min_osc in [lo_nm, hi_nm] (and |magmom| > min_magmom)."""
+    sql = """
+        SELECT d.defect, d.magmom, d.ks_gap_ev, d.zpl_nm,
+               COUNT(*) AS n_lines, MIN(t.wavelength_nm) AS lambda_min_nm, MAX(t.osc) AS osc_max
+        FROM transitions t JOIN defects d ON d.defect = t.defect
+        WHERE t.backend = ? AND t.wavelength_nm BETWEEN ? AND ? AND t.osc >= ?
+    """
+    params = [backend, lo_nm, hi_nm, min_osc]
+    if min_magmom is not None:
+        sql += " AND ABS(d.magmom) > ?"
+        params.append(min_magmom)
+    sql += " GROUP BY d.defect ORDER BY osc_max DESC"
+    return query(sql, params, db)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Catalogue of defect / spectrum / cavity results.")
+    p.add_argument("--db", default=DB_FILE)
+    sub = p.add_subparsers(dest="cmd", required=True)
+    u = sub.add_parser("update", help="index new and changed artifacts")
+    u.add_argument("--base", default=BASE)
+    b = sub.add_parser("bright", help="defects with bright transitions in a wavelength window")
+    b.add_argument("--window", type=float, nargs=2, default=(560.0, 590.0), metavar=("LO_NM", "HI_NM"))
+    b.add_argument("--osc", type=float, default=BRIGHT_OSC)
+    b.add_argument("--magmom", type=float, default=None, help="min |magnetic moment| (μB)")
+    b.add_argument("--backend", choices=["lr", "rt"], default="lr")
+    s = sub.add_parser("sql", help="run an SQL query")
+    s.add_argument("sql")
+    args = p.parse_args()
+
+    if args.cmd == "update":
+        n, dt = update(args.base, args.db)
+        print(f"Indexed {n} new/changed artifacts in {1e3 * dt:.0f} ms → {args.db}")
+        return
+
+    t0 = time.time()
+    if args.cmd == "bright":
+        out = bright_in_window(*args.window, args.osc, args.magmom, args.backend, args.db)
+    else:
+        out = query(args.sql, db=args.db)
+    dt = time.time() - t0
+    print(out.to_string(index=False, float_format=lambda v: f"{v:.4g}") if len(out) else "No rows.")
+    print(f"\n{len(out)} rows in {1e3 * dt:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# ============================================================
+# MULTI-FIDELITY CAVITY SCREENING
+# - Every candidate design first runs Harminv + Purcell at COARSE
+#   fidelity (low resolution, short ringdown, loose decay criterion)
+# - Coarse → fine bias per target (Δλ, log Q ratio, log Fp ratio) is
+#   calibrated on designs that have both fidelities; it is updated
+#   after every batch of fine runs
+# - Corrected coarse estimates ± bias σ give P(feasible) (target λ
+#   window, Q_MIN, FP_MIN, as in cavity_surrogate.py); only designs
+#   with P ≥ PROMOTE_P run at FINE fidelity (until MIN_PAIRS pairs exist,
+#   the most promising designs are promoted for calibration)
+# Candidates: cavity_surrogate_suggestions.csv, --candidates CSV,
+#             or N_RANDOM random designs
+# Outputs:
+#   cavity_multifidelity.csv        coarse, corrected, fine per design
+#   cavity_multifidelity_bias.json  coarse → fine bias and σ
+# ============================================================
+import os
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cavity_surrogate import (
+    PARAMS, RESULTS_CSV, design_key, feasibility, load_results, random_designs, run_design,
+)
+
+# =========================
+# USER SETTINGS
+# =========================
+COARSE = {"resolution": 40, "run_time": 150, "decay": 1e-4}
+FINE = {"resolution": 80, "run_time": 400, "decay": 1e-8}    # = nanobeam_*_2d.py defaults
+CANDIDATES_CSV = "cavity_surrogate_suggestions.csv"
+N_RANDOM = 24
+PROMOTE_P = 0.1               # min. P(feasible) of the corrected coarse estimate
+MIN_PAIRS = 3                 # coarse/fine pairs before the bias is trusted
+PRIOR_SIGMA = {"lambda_nm": 10.0, "Q": 0.5, "Fp_peak": 0.5}   # nm, log units (before pairs)
+N_PARALLEL = 2
+SEED = 0
+OUT_CSV = "cavity_multifidelity.csv"
+OUT_BIAS = "cavity_multifidelity_bias.json"
+# =========================
+
+TARGETS = list(PRIOR_SIGMA)
+LOG_TARGETS = ("Q", "Fp_peak")
+
+
+def fidelity_cost(fid):
+    """Relative 2D FDTD cost: cells ∝ res², time steps ∝ res · run time."""
+    return fid["resolution"] ** 3 * fid["run_time"]
+
+
+def to_model_units(target, v):
+    return np.log(v) if target in LOG_TARGETS else np.asarray(v, float)
+
+
+def results_at(path, fid):
+    df = load_results(path, fid["resolution"])
+    df["key"] = [design_key(row) for _, row in df[PARAMS].iterrows()]
+    return df.set_index("key")[TARGETS]
+
+
+def calibrate(coarse, fine):
+    """Mean and σ of the coarse → fine correction per target (model units)."""
+    pairs = coarse.join(fine, lsuffix="_coarse", rsuffix="_fine", how="inner")
+    bias = {"n_pairs": int(len(pairs))}
+    for t in TARGETS:
+        ok = pairs[f"{t}_coarse"].notna() & pairs[f"{t}_fine"].notna()
+        d = to_model_units(t, pairs.loc[ok, f"{t}_fine"]) - to_model_units(t, pairs.loc[ok, f"{t}_coarse"])
+        mean = float(np.mean(d)) if ok.sum() else 0.0
+        sd = float(np.std(d, ddof=1)) if ok.sum() >= 2 else PRIOR_SIGMA[t]
+        # never more confident than the scatter allows from a handful of pairs
+        bias[t] = {"shift": mean, "sigma": max(sd, PRIOR_SIGMA[t] / np.sqrt(max(ok.sum(), 1)))}
+    return bias
+
+
+def corrected(coarse, bias):
+    """Fine-fidelity estimate from the coarse results, with P(feasible)."""
+    out = pd.DataFrame(index=coarse.index)
+    p = np.ones(len(coarse))
+    for t in TARGETS:
+        mean = to_model_units(t, coarse[t].to_numpy(float)) + bias[t]["shift"]
+        sd = bias[t]["sigma"]
+        out[f"{t}_corrected"] = np.exp(mean) if t in LOG_TARGETS else mean
+        pt = feasibility(t, mean, sd)
+        p *= np.where(np.isfinite(pt), pt, 0.0)
+    out["P_feasible"] = p
+    return out
+
+
+def run_batch(designs, results_csv, fid, n_parallel=N_PARALLEL):
+    if not designs:
+        return
+    with ThreadPoolExecutor(max_workers=n_parallel) as pool:
+        list(pool.map(lambda d: run_design(d, results_csv, fid), designs))
+
+
+def load_candidates(path, n_random, seed):
+    if path and os.path.exists(path):
+        X = pd.read_csv(path)[PARAMS].to_numpy(float)
+    else:
+        X = random_designs(n_random, np.random.default_rng(seed))
+    designs = [dict(zip(PARAMS, x)) for x in X]
+    return {design_key(d): d for d in designs}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Coarse-then-fine screening of nanobeam designs.")
+    p.add_argument("--candidates", default=CANDIDATES_CSV, help="CSV with design columns")
+    p.add_argument("--random", type=int, default=N_RANDOM, help="random designs if no candidate CSV")
+    p.add_argument("--results", default=RESULTS_CSV)
+    p.add_argument("--parallel", type=int, default=N_PARALLEL)
+    p.add_argument("--seed", type=int, default=SEED)
+    args = p.parse_args()
+
+    cands = load_candidates(args.candidates, args.random, args.seed)
+    print(f"{len(cands)} candidate designs")
+
+    # --- coarse pass for every candidate ---
+    coarse = results_at(args.results, COARSE)
+    todo = [d for k, d in cands.items() if k not in coarse.index]
+    print(f"Coarse ({COARSE['resolution']} px/um): {len(todo)} runs", flush=True)
+    run_batch(todo, args.results, COARSE, args.parallel)
+    coarse = results_at(args.results, COARSE).reindex(list(cands))
+
+    # --- promote in batches, recalibrating the bias after each ---
+    while True:
+        fine = results_at(args.results, FINE)
+        bias = calibrate(coarse, fine)
+        est = corrected(coarse, bias)
+        pending = est[~est.index.isin(fine.index) & coarse["lambda_nm"].notna()]
+
+        promote = pending[pending["P_feasible"] >= PROMOTE_P]
+        if bias["n_pairs"] < MIN_PAIRS:
+            # calibration: the most promising designs, even below PROMOTE_P
+            extra = pending.drop(promote.index).sort_values("P_feasible", ascending=False)
+            promote = pd.concat([promote, extra.head(MIN_PAIRS - bias["n_pairs"])])
+        if promote.empty:
+            break
+
+        batch = list(promote.sort_values("P_feasible", ascending=False).index[:args.parallel])
+        print(f"Fine ({FINE['resolution']} px/um): {', '.join(batch)} "
+              f"(bias from {bias['n_pairs']} pairs)", flush=True)
+        before = len(fine)
+        run_batch([cands[k] for k in batch], args.results, FINE, args.parallel)
+        if len(results_at(args.results, FINE)) == before:
+            print("⚠ fine runs produced no results, stopping")
+            break
+
+    table = pd.DataFrame.from_dict(cands, orient="index")
+    table = table.join(coarse.add_suffix("_coarse")).join(est)
+    table = table.join(fine.add_suffix("_fine"))
+    table["Promoted"] = table.index.isin(fine.index)
+    table.index.name = "key"
+    table.to_csv(OUT_CSV)
+    with open(OUT_BIAS, "w") as f:
+        json.dump({"coarse": COARSE, "fine": FINE, **bias}, f, indent=1)
+
+    n_fine = int(table["Promoted"].sum())
+    cost = len(cands) * fidelity_cost(COARSE) + n_fine * fidelity_cost(FINE)
+    print(f"\nPromoted {n_fine}/{len(cands)} designs; compute ≈ "
+          f"{100 * cost / (len(cands) * fidelity_cost(FINE)):.0f}% of running all at fine fidelity")
+    for t in TARGETS:
+        print(f"  bias {t}: {bias[t]['shift']:+.3g} ± {bias[t]['sigma']:.3g}"
+              f"{' (log)' if t in LOG_TARGETS else ' nm'}")
+    print(f"Saved → {OUT_CSV}, {OUT_BIAS}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# ============================================================
+# CAVITY SURROGATE: λ, Q, Fp of the 2D nanobeam without FDTD
+# - Training data: cavity_results.csv, one row appended by every
+#   nanobeam_harminv_2d.py (λ, Q) and nanobeam_purcell_2d.py (λ, Q, Fp)
+#   run; design = a, r, w, Nholes_each_side, n_beam
+# - One Gaussian process per target (λ, log Q, log Fp), ARD RBF kernel
+#   on the design scaled to BOUNDS; hyperparameters by max. marginal
+#   likelihood, warm-started from cavity_surrogate_hyper.json
+# - P(feasible) = P(λ in TARGET_NM) · P(Q > Q_MIN) · P(Fp > FP_MIN)
+#   from the predictive mean and σ; designs below RULE_OUT are discarded,
+#   the rest ranked by P(feasible) (+ a few max-σ exploration picks)
+# - --run K: simulate the K best suggestions (Harminv + Purcell in
+#   cavity_runs/), append the results and retrain
+# Outputs:
+#   cavity_surrogate_suggestions.csv
+#   cavity_surrogate_hyper.json
+# ============================================================
+import os
+import sys
+import csv
+import json
+import time
+import fcntl
+import hashlib
+import argparse
+import subprocess
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.stats import norm
+
+from screen_defects import TARGET_NM
+from lremit2meep.profiling import wrap_command
+
+# =========================
+# USER SETTINGS
+# =========================
+RESULTS_CSV = "cavity_results.csv"
+HYPER_JSON = "cavity_surrogate_hyper.json"
+OUT_SUGGEST = "cavity_surrogate_suggestions.csv"
+RUN_DIR = "cavity_runs"
+TRAIN_RESOLUTION = 80          # only results at this resolution are training data
+
+BOUNDS = {                     # design space (um, count, index)
+    "a": (0.20, 0.30),
+    "r": (0.050, 0.110),
+    "w": (0.35, 0.60),
+    "Nholes_each_side": (8, 16),
+    "n_beam": (1.8, 2.4),
+}
+TARGETS = {"lambda_nm": False, "Q": True, "Fp_peak": True}   # name → log-transform
+Q_MIN = 100.0
+FP_MIN = 10.0
+MIN_TRAIN = 4                  # points before a target gets a GP (else P = 1, not ruled out)
+RULE_OUT = 0.01                # P(feasible) below which a design is discarded
+N_CANDIDATES = 20000
+N_SUGGEST = 8
+N_EXPLORE = 2                  # of N_SUGGEST, picked by largest λ uncertainty
+MIN_SEP = 0.1                  # min. scaled distance between suggestions
+SEED = 0
+# =========================
+
+PARAMS = list(BOUNDS)
+ENV_NAMES = {"a": "NANOBEAM_A", "r": "NANOBEAM_R", "w": "NANOBEAM_W",
+             "Nholes_each_side": "NANOBEAM_NHOLES", "n_beam": "NANOBEAM_N_BEAM"}
+LOG_BOUNDS = [(np.log(0.03), np.log(10.0))] * len(PARAMS) + [
+    (np.log(0.1), np.log(10.0)),     # signal σ (standardized y)
+    (np.log(1e-3), np.log(1.0)),     # noise σ
+]
+
+
+def record_result(design, lambda_nm, Q, Fp_peak=np.nan, resolution=TRAIN_RESOLUTION):
+    """Append one simulated design to the results CSV (NANOBEAM_RESULTS or RESULTS_CSV)."""
+    path = os.environ.get("NANOBEAM_RESULTS", RESULTS_CSV)
+    row = {**{k: design[k] for k in PARAMS}, "resolution": resolution,
+           "lambda_nm": lambda_nm, "Q": Q, "Fp_peak": Fp_peak}
+    # header check + append under a lock: cavity_multifidelity.py runs jobs concurrently
+    with open(path, "a", newline="") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        writer = csv.DictWriter(f, fieldnames=list(row))
+        if f.seek(0, os.SEEK_END) == 0:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def load_results(path=RESULTS_CSV, resolution=TRAIN_RESOLUTION):
+    """One row per design (repeats averaged), at the training resolution."""
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=PARAMS + list(TARGETS))
+    df = pd.read_csv(path)
+    df = df[df["resolution"] == resolution]
+    return df.groupby(PARAMS, as_index=False)[list(TARGETS)].mean()
+
+
+def scale(X):
+    lo = np.array([BOUNDS[k][0] for k in PARAMS], float)
+    hi = np.array([BOUNDS[k][1] for k in PARAMS], float)
+    return (np.asarray(X, float) - lo) / (hi - lo)
+
+
+# =========================
+# GAUSSIAN PROCESS (ARD RBF)
+# =========================
+class GaussianProcess:
+    def __init__(self, log_transform=False):
+        self.log_transform = log_transform
+        self.theta = np.array([np.log(0.5)] * len(PARAMS) + [0.0, np.log(0.05)])
+
+    def _kernel(self, A, B, theta):
+        ell, s = np.exp(theta[:len(PARAMS)]), np.exp(theta[len(PARAMS)])
+        d2 = (((A[:, None, :] - B[None, :, :]) / ell) ** 2).sum(axis=-1)
+        return s ** 2 * np.exp(-0.5 * d2)
+
+    def _nll(self, theta):
+        K = self._kernel(self.X, self.X, theta)
+        K[np.diag_indices_from(K)] += np.exp(theta[-1]) ** 2 + 1e-8
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return 1e10
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, self.y))
+        return 0.5 * self.y @ alpha + np.log(np.diag(L)).sum() + 0.5 * len(self.y) * np.log(2 * np.pi)
+
+    def fit(self, X, y, theta0=None):
+        y = np.log(y) if self.log_transform else np.asarray(y, float)
+        self.X = scale(X)
+        self.mu, self.sd = y.mean(), y.std() or 1.0
+        self.y = (y - self.mu) / self.sd
+
+        best = None
+        for start in ([theta0] if theta0 is not None else []) + [self.theta]:
+            res = minimize(self._nll, np.clip(start, *np.array(LOG_BOUNDS).T),
+                           method="L-BFGS-B", bounds=LOG_BOUNDS)
+            if best is None or res.fun < best.fun:
+                best = res
+        self.theta = best.x
+
+        K = self._kernel(self.X, self.X, self.theta)
+        K[np.diag_indices_from(K)] += np.exp(self.theta[-1]) ** 2 + 1e-8
+        self.L = np.linalg.cholesky(K)
+        self.alpha = np.linalg.solve(self.L.T, np.linalg.solve(self.L, self.y))
+        return self
+
+    def predict(self, X):
+        """Mean and σ in the (log-)transformed target units."""
+        Ks = self._kernel(scale(X), self.X, self.theta)
+        mean = Ks @ self.alpha
+        v = np.linalg.solve(self.L, Ks.T)
+        var = np.exp(self.theta[len(PARAMS)]) ** 2 - (v ** 2).sum(axis=0)
+        return self.mu + self.sd * mean, self.sd * np.sqrt(np.maximum(var, 1e-12))
+
+
+def load_hyper(path=HYPER_JSON):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {k: np.array(v) for k, v in json.load(f).items()}
+
+
+def train(results, hyper=None):
+    """GP per target with at least MIN_TRAIN finite values."""
+    hyper = hyper or {}
+    models = {}
+    for target, log_t in TARGETS.items():
+        ok = results[target].notna() & (results[target] > 0 if log_t else True)
+        if ok.sum() < MIN_TRAIN:
+            continue
+        models[target] = GaussianProcess(log_t).fit(
+            results.loc[ok, PARAMS].to_numpy(float), results.loc[ok, target].to_numpy(float),
+            hyper.get(target))
+    return models
+
+
+def save_hyper(models, path=HYPER_JSON):
+    hyper = {k: v.tolist() for k, v in load_hyper(path).items()}
+    hyper.update({k: m.theta.tolist() for k, m in models.items()})
+    with open(path, "w") as f:
+        json.dump(hyper, f, indent=1)
+
+
+# =========================
+# PREDICTION / ACQUISITION
+# =========================
+def feasibility(target, mean, sd):
+    """P(target meets its constraint) for a normal estimate (log units for Q and Fp)."""
+    if target == "lambda_nm":
+        return norm.cdf((TARGET_NM[1] - mean) / sd) - norm.cdf((TARGET_NM[0] - mean) / sd)
+    if target == "Q":
+        return norm.sf((np.log(Q_MIN) - mean) / sd)
+    return norm.sf((np.log(FP_MIN) - mean) / sd)
+
+
+def predict_table(models, X):
+    """Predictions (natural units, with ±1σ) and P(feasible) per design."""
+    out = pd.DataFrame(X, columns=PARAMS)
+    p_feas = np.ones(len(X))
+    for target, m in models.items():
+        mean, sd = m.predict(X)
+        if m.log_transform:
+            out[target] = np.exp(mean)
+            out[f"{target}_lo"], out[f"{target}_hi"] = np.exp(mean - sd), np.exp(mean + sd)
+        else:
+            out[target] = mean
+            out[f"{target}_sigma"] = sd
+
+        p = feasibility(target, mean, sd)
+        out[f"P_{target}"] = p
+        p_feas *= p
+    out["P_feasible"] = p_feas
+    return out
+
+
+def random_designs(n, rng):
+    X = np.column_stack([rng.uniform(*BOUNDS[k], n) for k in PARAMS])
+    j = PARAMS.index("Nholes_each_side")
+    X[:, j] = np.round(X[:, j])
+    return X
+
+
+def suggest(table, n_suggest=N_SUGGEST, n_explore=N_EXPLORE):
+    """Best P(feasible) plus max-σ(λ) picks among the designs not ruled out, spread apart."""
+    alive = table[table["P_feasible"] >= RULE_OUT]
+    picks = []
+
+    def take(order, k, why):
+        for i in order:
+            if k == 0:
+                break
+            x = scale(alive.loc[i, PARAMS].to_numpy(float)[None, :])[0]
+            if all(np.linalg.norm(x - scale(alive.loc[j, PARAMS].to_numpy(float)[None, :])[0]) >= MIN_SEP
+                   for j, _ in picks):
+                picks.append((i, why))
+                k -= 1
+
+    take(alive.sort_values("P_feasible", ascending=False).index, n_suggest - n_explore, "exploit")
+    if "lambda_nm_sigma" in alive:
+        take(alive.sort_values("lambda_nm_sigma", ascending=False).index, n_explore, "explore")
+    out = alive.loc[[i for i, _ in picks]].copy()
+    out["Reason"] = [why for _, why in picks]
+    return out.reset_index(drop=True)
+
+
+# =========================
+# SIMULATION OF SUGGESTIONS
+# =========================
+def design_key(design):
+    return hashlib.sha1(json.dumps([round(float(design[k]), 6) for k in PARAMS]).encode()).hexdigest()[:10]
+
+
+def run_design(design, results_csv=RESULTS_CSV, fidelity=None):
+    """
+    Harminv + Purcell for one design in its own folder; results appended to
+    results_csv. fidelity: optional {"resolution", "run_time", "decay"}.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    folder = os.path.join(RUN_DIR, f"design_{design_key(design)}")
+    if fidelity:
+        folder = os.path.join(folder, f"res{fidelity['resolution']}")
+    os.makedirs(folder, exist_ok=True)
+
+    env = {k: v for k, v in os.environ.items() if k != "NANOBEAM_HOLES"}
+    env.update({ENV_NAMES[k]: (str(int(design[k])) if k == "Nholes_each_side" else repr(float(design[k])))
+                for k in PARAMS})
+    if fidelity:
+        env.update({"NANOBEAM_RESOLUTION": str(fidelity["resolution"]),
+                    "NANOBEAM_RUN_TIME": str(fidelity["run_time"]),
+                    "NANOBEAM_DECAY": str(fidelity["decay"])})
+    env["NANOBEAM_RESULTS"] = os.path.abspath(results_csv)
+    for script in ("nanobeam_harminv_2d.py", "nanobeam_purcell_2d.py"):
+        with open(os.path.join(folder, script.replace(".py", ".log")), "w") as log:
+            code = subprocess.run(wrap_command([sys.executable, os.path.join(here, script)]), cwd=folder,
+                                  env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+        if code != 0:
+            print(f"  ⚠ {folder}: {script} failed", flush=True)
+            return False
+    print(f"  ✔ {folder}", flush=True)
+    return True
+
+
+def parse_design(items):
+    """['r=0.08', 'w=0.5'] → full design (unset parameters from the baseline nanobeam)."""
+    design = {"a": 0.25, "r": 0.075, "w": 0.45, "Nholes_each_side": 12, "n_beam": 2.0}
+    for item in items:
+        k, v = item.split("=")
+        if k not in design:
+            raise KeyError(f"unknown parameter {k} (one of {', '.join(PARAMS)})")
+        design[k] = float(v)
+    return design
+
+
+def main():
+    p = argparse.ArgumentParser(description="GP surrogate of the nanobeam cavity response.")
+    p.add_argument("--results", default=RESULTS_CSV)
+    p.add_argument("--predict", nargs="+", metavar="PARAM=VALUE", help="e.g. r=0.08 w=0.5")
+    p.add_argument("--run", type=int, default=0, help="simulate the K best suggestions, then retrain")
+    p.add_argument("--rounds", type=int, default=1, help="suggest → run → retrain cycles")
+    p.add_argument("--seed", type=int, default=SEED)
+    args = p.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for rnd in range(max(args.rounds, 1)):
+        results = load_results(args.results)
+        t0 = time.time()
+        models = train(results, load_hyper())
+        save_hyper(models)
+        print(f"Trained on {len(results)} designs ({', '.join(models) or 'no targets yet'}) "
+              f"in {time.time() - t0:.2f} s")
+
+        if args.predict:
+            design = parse_design(args.predict)
+            row = predict_table(models, np.array([[design[k] for k in PARAMS]])).iloc[0]
+            print(row.to_string(float_format=lambda v: f"{v:.4g}"))
+            return
+
+        t0 = time.time()
+        table = predict_table(models, random_designs(N_CANDIDATES, rng))
+        elapsed = time.time() - t0
+        ruled_out = (table["P_feasible"] < RULE_OUT).mean()
+        print(f"{N_CANDIDATES:,} candidate designs in {1e3 * elapsed:.0f} ms: "
+              f"{100 * ruled_out:.1f}% ruled out (P(feasible) < {RULE_OUT:g})")
+
+        picks = suggest(table)
+        picks.to_csv(OUT_SUGGEST, index=False)
+        cols = PARAMS + [c for c in ("lambda_nm", "Q", "Fp_peak", "P_feasible", "Reason") if c in picks]
+        print(picks[cols].to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+        print(f"Saved → {OUT_SUGGEST}")
+
+        if not args.run:
+            break
+        print(f"\nRound {rnd + 1}: simulating {min(args.run, len(picks))} designs", flush=True)
+        for _, design in picks.head(args.run).iterrows():
+            run_design(design, args.results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# ============================================================
+# LR-TDDFT vs REAL-TIME LCAO-TDDFT: COST AND ACCURACY
+# - LR:  <folder>/<name>_spectrum.csv, cost = FD restart + LR-TDDFT
+#        ("Total:" of *_fd.log and *_lrtddft.log)
+# - RT:  <folder>/<name>_spectrum_rt.csv, computed here from
+#        <name>_lcao.gpw if missing (cost from *_timings.json)
+# - Accuracy: first bright line, matched bright lines, similarity of
+#   the broadened spectra, bright lines in the ZPL target window
+# Outputs:
+#   spectrum_backend_comparison.csv
+#   spectrum_backend_comparison.png
+# ============================================================
+import os
+import re
+import glob
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from screen_defects import target_window_ev
+
+# =========================
+# USER SETTINGS
+# =========================
+BASE = "."
+EMAX = 6.0            # eV
+BRIGHT = 1e-3         # |f| threshold of a bright line
+MATCH_EV = 0.15       # max |ΔE| for an LR line to be matched by an RT peak
+SIGMA = 0.10          # broadening for the spectral similarity (eV)
+RUN_MISSING = True    # run RT-TDDFT where *_spectrum_rt.csv is missing and a gpw exists
+OUT_CSV = "spectrum_backend_comparison.csv"
+OUT_PNG = "spectrum_backend_comparison.png"
+# =========================
+
+
+def read_spectrum(path, emax=EMAX):
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    keep = data[:, 0] <= emax
+    return data[keep, 0], data[keep, 1]
+
+
+def log_total_seconds(path):
+    """'Total:' wall time from a GPAW text log (None if absent)."""
+    if not os.path.exists(path):
+        return None
+    total = None
+    with open(path) as f:
+        for line in f:
+            m = re.match(r"^Total:\s+([\d.]+)", line)
+            if m:
+                total = float(m.group(1))
+    return total
+
+
+def stage_seconds(folder, name, stage):
+    path = os.path.join(folder, f"{name}_timings.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        entry = json.load(f).get(stage)
+    return None if entry is None else entry["seconds"]
+
+
+def run_rt(folder, name):
+    """RT-TDDFT from the LCAO ground state → <name>_spectrum_rt.csv (+ timing)."""
+    from rt_tddft import run_rt_tddft
+
+    t0 = time.time()
+    energies, osc = run_rt_tddft(name, folder, os.path.join(folder, f"{name}_lcao.gpw"),
+                                 emax=EMAX, txt=os.path.join(folder, f"{name}_rt.log"))
+    seconds = time.time() - t0
+
+    np.savetxt(os.path.join(folder, f"{name}_spectrum_rt.csv"),
+               np.column_stack([energies, osc]),
+               delimiter=",", header="Energy(eV),Osc", comments="")
+
+    path = os.path.join(folder, f"{name}_timings.json")
+    timings = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            timings = json.load(f)
+    timings["rt_tddft"] = {"seconds": seconds, "ranks": 1}
+    with open(path, "w") as f:
+        json.dump(timings, f, indent=1)
+
+
+def broadened(energies, osc, x, sigma=SIGMA):
+    return np.sum(osc[:, None] * np.exp(-0.5 * ((x[None, :] - energies[:, None]) / sigma) ** 2), axis=0)
+
+
+def compare(e_lr, f_lr, e_rt, f_rt):
+    """Accuracy metrics of the RT lines against the LR reference."""
+    lr_b, rt_b = e_lr[f_lr >= BRIGHT], e_rt[f_rt >= BRIGHT]
+    out = {
+        "LR_bright": len(lr_b),
+        "RT_bright": len(rt_b),
+        "First_bright_LR (eV)": lr_b.min() if len(lr_b) else np.nan,
+        "First_bright_RT (eV)": rt_b.min() if len(rt_b) else np.nan,
+    }
+    out["ΔE_first (eV)"] = out["First_bright_RT (eV)"] - out["First_bright_LR (eV)"]
+
+    if len(lr_b) and len(rt_b):
+        d = np.abs(lr_b[:, None] - rt_b[None, :]).min(axis=1)
+        matched = d <= MATCH_EV
+        out["Matched_fraction"] = matched.mean()
+        out["Mean_|ΔE|_matched (eV)"] = d[matched].mean() if matched.any() else np.nan
+    else:
+        out["Matched_fraction"] = np.nan
+        out["Mean_|ΔE|_matched (eV)"] = np.nan
+
+    x = np.linspace(0.0, EMAX, 1500)
+    y_lr, y_rt = broadened(e_lr, f_lr, x), broadened(e_rt, f_rt, x)
+    out["Spectral_similarity"] = float(y_lr @ y_rt / (np.linalg.norm(y_lr) * np.linalg.norm(y_rt) + 1e-300))
+
+    e_lo, e_hi = target_window_ev()
+    out["LR_in_window"] = int(np.sum((lr_b >= e_lo) & (lr_b <= e_hi)))
+    out["RT_in_window"] = int(np.sum((rt_b >= e_lo) & (rt_b <= e_hi)))
+    return out, (x, y_lr, y_rt)
+
+
+def main():
+    rows, curves = [], {}
+    for lr_csv in sorted(glob.glob(os.path.join(BASE, "*", "*_spectrum.csv"))):
+        folder = os.path.dirname(lr_csv)
+        name = os.path.basename(lr_csv).replace("_spectrum.csv", "")
+        rt_csv = os.path.join(folder, f"{name}_spectrum_rt.csv")
+
+        if not os.path.exists(rt_csv):
+            if RUN_MISSING and os.path.exists(os.path.join(folder, f"{name}_lcao.gpw")):
+                print(f"RT-TDDFT → {name}", flush=True)
+                run_rt(folder, name)
+            else:
+                print(f"⚠ {name}: no RT spectrum and no LCAO gpw, skipped")
+                continue
+
+        e_lr, f_lr = read_spectrum(lr_csv)
+        e_rt, f_rt = read_spectrum(rt_csv)
+        metrics, curves[name] = compare(e_lr, f_lr, e_rt, f_rt)
+
+        lr_fd = log_total_seconds(os.path.join(folder, f"{name}_fd.log"))
+        lr_td = log_total_seconds(os.path.join(folder, f"{name}_lrtddft.log"))
+        lr_cost = (lr_fd or 0.0) + (lr_td or 0.0) if lr_td is not None else np.nan
+        rt_cost = stage_seconds(folder, name, "rt_tddft") or log_total_seconds(
+            os.path.join(folder, f"{name}_rt.log")) or np.nan
+
+        rows.append({
+            "Defect": name,
+            "LR_cost (s)": lr_cost,
+            "RT_cost (s)": rt_cost,
+            "Speedup": lr_cost / rt_cost,
+            **metrics,
+        })
+
+    if not rows:
+        print("No defects with both LR and RT spectra.")
+        return
+
+    df = pd.DataFrame(rows)
+    df.to_csv(OUT_CSV, index=False)
+    print(df.to_string(index=False, float_format=lambda v: f"{v:.3g}"))
+
+    n = len(curves)
+    ncol = min(3, n)
+    nrow = int(np.ceil(n / ncol))
+    fig, axes = plt.subplots(nrow, ncol, figsize=(4 * ncol, 2.8 * nrow), squeeze=False)
+    for ax, (name, (x, y_lr, y_rt)) in zip(axes.ravel(), curves.items()):
+        ax.plot(x, y_lr / (y_lr.max() + 1e-300), label="LR-TDDFT")
+        ax.plot(x, y_rt / (y_rt.max() + 1e-300), "--", label="RT-TDDFT")
+        ax.axvspan(*target_window_ev(), color="0.85", zorder=0)
+        ax.set_title(name, fontsize=9)
+        ax.set_xlabel("Energy (eV)")
+    for ax in axes.ravel()[n:]:
+        ax.axis("off")
+    axes[0, 0].set_ylabel("Norm. absorption")
+    axes[0, 0].legend(frameon=False, fontsize=8)
+    fig.tight_layout()
+    fig.savefig(OUT_PNG, dpi=300)
+    plt.close(fig)
+
+    print(f"\nSaved → {OUT_CSV}, {OUT_PNG}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# ============================================================
+# h-BN NxN Defect Enumerator (symmetry-unique complexes)
+# - Enumerates every substitution/vacancy complex up to
+#   MAX_SITES sites with all pairwise separations <= MAX_SEP
+# - Removes symmetry-equivalent configurations with a canonical
+#   hash over the C3v point group x supercell translations
+# - Writes the per-folder layout used by find_defect_jobs:
+#   <PREFIX>_<label>/<PREFIX>_<label>.{cif,xyz,traj}
+# ============================================================
+import os
+import csv
+import hashlib
+import argparse
+import itertools
+
+import numpy as np
+from ase import Atoms
+from ase.build import make_supercell
+from ase.io import write
+
+# =========================
+# USER SETTINGS
+# =========================
+A_LAT = 2.50                  # lattice constant (Å)
+VACUUM = 20.0                 # vacuum along z (Å)
+SUPERCELL = 5
+MAX_SITES = 2                 # largest complex (number of modified sites)
+MAX_SEP = 2.6                 # max pairwise site separation inside a complex (Å)
+SUBSTITUENTS = ("C",)         # species allowed on B or N sites (besides vacancies)
+MAX_VACANCIES = 2             # max vacancies per complex
+MANIFEST = "enumerated_defects.csv"
+# =========================
+
+BASE_DIR = os.getcwd()
+
+# Sites are stored as integer coordinates in units of 1/3 of the primitive
+# lattice vectors: B at (3i, 3j), N at (3i + 1, 3j + 2).
+SUBLATTICE = {(0, 0): "B", (1, 2): "N"}
+
+
+# =========================
+# LATTICE + SYMMETRY
+# =========================
+def build_primitive():
+    cell = [
+        [A_LAT, 0.0, 0.0],
+        [-A_LAT / 2, A_LAT * np.sqrt(3) / 2, 0.0],
+        [0.0, 0.0, VACUUM],
+    ]
+    primitive = Atoms(
+        symbols="BN",
+        scaled_positions=[(0.0, 0.0, 0.0), (1 / 3, 2 / 3, 0.0)],
+        cell=cell,
+        pbc=(True, True, False),
+    )
+    primitive.center(axis=2, vacuum=VACUUM)
+    return primitive
+
+
+def build_supercell(n):
+    P = [[n, 0, 0],
+         [0, n, 0],
+         [0, 0, 1]]
+    slab = make_supercell(build_primitive(), P)
+    slab.center(axis=2, vacuum=VACUUM)
+    return slab
+
+
+def point_group_ops():
+    """
+    Integer 2x2 matrices (acting on fractional coordinates) that preserve the
+    hexagonal metric and map the B and N sublattices onto themselves.
+    For monolayer h-BN this is C3v (6 operations).
+    """
+    a = np.array([[1.0, -0.5], [0.0, np.sqrt(3) / 2]])
+    G = a.T @ a
+    ops = []
+    for entries in itertools.product((-1, 0, 1), repeat=4):
+        M = np.array(entries).reshape(2, 2)
+        if not np.allclose(M.T @ G @ M, G):
+            continue
+        if tuple(M @ np.array([1, 2]) % 3) != (1, 2):
+            continue
+        ops.append(M)
+    return ops
+
+
+def site_positions(n):
+    """All lattice sites of the NxN supercell as integer (x, y) and sublattice."""
+    sites = []
+    for i in range(n):
+        for j in range(n):
+            for (dx, dy), sub in SUBLATTICE.items():
+                sites.append(((3 * i + dx, 3 * j + dy), sub))
+    return sites
+
+
+def site_distance(p, q, n):
+    """Minimum-image Cartesian distance (Å) between two integer sites."""
+    L = 3 * n
+    d = (np.array(p) - np.array(q)) % L
+    a = A_LAT / 3 * np.array([[1.0, -0.5], [0.0, np.sqrt(3) / 2]])
+    best = np.inf
+    for sx in (-L, 0, L):
+        for sy in (-L, 0, L):
+            v = a @ (d + np.array([sx, sy]))
+            best = min(best, float(np.linalg.norm(v)))
+    return best
+
+
+def canonical_form(config, ops, n):
+    """
+    Canonical representative of a configuration [((x, y), species), ...].
+
+    Every point operation is combined with the lattice translation that moves
+    each site's unit cell to the origin; the lexicographically smallest sorted
+    tuple is the canonical form. Returns (form, number of distinct symmetry
+    operations that leave the configuration invariant).
+    """
+    L = 3 * n
+    best = None
+    stabilizer = set()
+    for k, M in enumerate(ops):
+        moved = [(tuple(int(c) for c in M @ np.array(p) % L), s) for p, s in config]
+        for (ax, ay), _ in moved:
+            tx, ty = ax - ax % 3, ay - ay % 3
+            form = tuple(sorted((((x - tx) % L, (y - ty) % L), s) for (x, y), s in moved))
+            if best is None or form < best:
+                best = form
+                stabilizer = {(k, tx, ty)}
+            elif form == best:
+                stabilizer.add((k, tx, ty))
+    return best, len(stabilizer)
+
+
+def canonical_hash(form):
+    return hashlib.sha1(repr(form).encode()).hexdigest()
+
+
+# =========================
+# ENUMERATION
+# =========================
+def defect_label(config):
+    """Folder label, e.g. CB, VN, CB-VN (sublattice written as suffix)."""
+    parts = sorted(f"{s}{SUBLATTICE[(x % 3, y % 3)]}" for (x, y), s in config)
+    return "-".join(parts)
+
+
+def enumerate_configs(n, max_sites=MAX_SITES, max_sep=MAX_SEP,
+                      substituents=SUBSTITUENTS, max_vacancies=MAX_VACANCIES):
+    """
+    Enumerate all symmetry-unique complexes of 1..max_sites modified sites.
+
+    By translation symmetry every complex has an image with a site in the
+    origin cell, so only clusters anchored there are generated.
+    Returns (unique configurations, number of anchored raw configurations).
+    """
+    if max_sep >= n * A_LAT / 2:
+        print(f"⚠ MAX_SEP={max_sep} Å reaches half the {n}x{n} cell; complexes may see their images.")
+
+    ops = point_group_ops()
+    sites = site_positions(n)
+    unique = {}
+    raw = 0
+
+    for anchor in SUBLATTICE:
+        near = [p for p, _ in sites
+                if p != anchor and site_distance(anchor, p, n) <= max_sep]
+
+        for k in range(max_sites):
+            for others in itertools.combinations(near, k):
+                cluster = (anchor,) + others
+                if any(site_distance(p, q, n) > max_sep
+                       for p, q in itertools.combinations(others, 2)):
+                    continue
+
+                options = [("V",) + tuple(substituents) for _ in cluster]
+                for species in itertools.product(*options):
+                    if species.count("V") > max_vacancies:
+                        continue
+                    config = list(zip(cluster, species))
+                    raw += 1
+
+                    form, n_stab = canonical_form(config, ops, n)
+                    key = canonical_hash(form)
+                    if key in unique:
+                        continue
+                    unique[key] = {
+                        "config": list(form),
+                        "label": defect_label(form),
+                        "n_sites": len(form),
+                        "multiplicity": len(ops) * n * n // n_stab,
+                    }
+
+    return list(unique.items()), raw
+
+
+def apply_config(slab, config, n):
+    """Return a copy of the pristine slab with the configuration applied."""
+    atoms = slab.copy()
+    frac = atoms.get_scaled_positions(wrap=True)[:, :2]
+    grid = np.round(frac * 3 * n).astype(int) % (3 * n)
+    index = {tuple(g): i for i, g in enumerate(grid)}
+
+    vacancies = []
+    for p, species in config:
+        i = index[p]
+        if species == "V":
+            vacancies.append(i)
+        else:
+            atoms[i].symbol = species
+    del atoms[vacancies]
+    return atoms
+
+
+def save_variant(atoms, name, base_dir=BASE_DIR, overwrite=False):
+    folder = os.path.join(base_dir, name)
+    if os.path.exists(os.path.join(folder, f"{name}.cif")) and not overwrite:
+        print(f"✔ Exists: {name}")
+        return False
+    os.makedirs(folder, exist_ok=True)
+
+    write(os.path.join(folder, f"{name}.cif"), atoms)
+    write(os.path.join(folder, f"{name}.xyz"), atoms)
+    write(os.path.join(folder, f"{name}.traj"), atoms)
+
+    print(f"Saved: {name} (.cif / .xyz / .traj)")
+    return True
+
+
+def main():
+    p = argparse.ArgumentParser(description="Enumerate symmetry-unique h-BN defect complexes.")
+    p.add_argument("--supercell", type=int, default=SUPERCELL)
+    p.add_argument("--max-sites", type=int, default=MAX_SITES)
+    p.add_argument("--max-sep", type=float, default=MAX_SEP, help="Å")
+    p.add_argument("--substituents", nargs="+", default=list(SUBSTITUENTS))
+    p.add_argument("--max-vacancies", type=int, default=MAX_VACANCIES)
+    p.add_argument("--base-dir", default=BASE_DIR)
+    p.add_argument("--overwrite", action="store_true")
+    p.add_argument("--dry-run", action="store_true", help="only print the enumeration")
+    args = p.parse_args()
+
+    n = args.supercell
+    prefix = f"hBN_{n}x{n}"
+    slab = build_supercell(n)
+
+    configs, raw = enumerate_configs(n, args.max_sites, args.max_sep,
+                                     args.substituents, args.max_vacancies)
+    total = sum(c["multiplicity"] for _, c in configs)
+
+    # Single-site defects keep the plain names (CB, VN, ...); larger complexes
+    # get a short canonical-hash suffix because one label covers several
+    # separations/orientations.
+    configs = sorted(configs, key=lambda kc: (kc[1]["n_sites"], kc[1]["label"], kc[0]))
+    rows = []
+    for key, c in configs:
+        suffix = c["label"] if c["n_sites"] == 1 else f"{c['label']}_{key[:8]}"
+        rows.append({
+            "Name": f"{prefix}_{suffix}",
+            "Label": c["label"],
+            "N_sites": c["n_sites"],
+            "Sites": ";".join(f"{s}@{x},{y}" for (x, y), s in c["config"]),
+            "Multiplicity": c["multiplicity"],
+            "Canonical_hash": key,
+        })
+
+    print(f"{n}x{n} supercell: {raw} anchored configurations → "
+          f"{len(rows)} symmetry-unique ({total} total placements)")
+
+    if args.dry_run:
+        for r in rows:
+            print(f"  {r['Name']:<32} x{r['Multiplicity']:<4} {r['Sites']}")
+        return
+
+    save_variant(slab, f"{prefix}_pristine", args.base_dir, args.overwrite)
+    for r, (_, c) in zip(rows, configs):
+        save_variant(apply_config(slab, c["config"], n), r["Name"], args.base_dir, args.overwrite)
+
+    manifest = os.path.join(args.base_dir, f"{prefix}_{MANIFEST}")
+    with open(manifest, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        w.writeheader()
+        w.writerows(rows)
+
+    print(f"\nManifest saved → {manifest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# ============================================================
+# STREAMED FIELD EXPORT OF THE CAVITY RUNS (CHUNKED, COMPRESSED HDF5)
+# - FieldExport: time-domain snapshots of a region of interest every
+#   EVERY time units, sub-sampled by STRIDE, appended to chunked gzip
+#   datasets during the run (one snapshot in memory at a time)
+# - DFT fields at the resonance (complex64) + ε on the same grid
+# - nanobeam_harminv_2d.py (focused run + mode DFT) and
+#   nanobeam_purcell_2d.py (device run + DFT at the cavity mode) export
+#   when NANOBEAM_FIELDS=1; NANOBEAM_FIELDS_STRIDE, NANOBEAM_FIELDS_ROI
+#   ("sx,sy" um, centered), NANOBEAM_FIELDS_EVERY, NANOBEAM_FIELDS_COMPONENTS
+# - FieldFile: lazy reader (datasets are sliced on access)
+# Usage:  python field_export.py cavity_mode_fields.h5 [--plot Ez] [--index -1] [--dft]
+# Layout:
+#   /x, /y[, /z]          grid coordinates (um) after sub-sampling
+#   /eps                  ε on the same grid
+#   /time/t               snapshot times
+#   /time/<comp>          float32 (nt, nx, ny[, nz])
+#   /dft/<comp>           complex64 (nfreq, nx, ny[, nz]), attrs["freqs"]
+# ============================================================
+import os
+import argparse
+
+import h5py
+import numpy as np
+
+# =========================
+# USER SETTINGS
+# =========================
+STRIDE = 2                     # keep every STRIDE-th grid point per axis
+EVERY = 2.0                    # MEEP time units between snapshots
+COMPONENTS = ("Ez",)
+COMPRESSION = 4                # gzip level (+ shuffle filter)
+CHUNK_PX = 256                 # spatial chunk edge (points)
+# =========================
+
+
+class FieldExport:
+    """Streams snapshots and DFT fields of one mp.Simulation into an HDF5 file (master rank writes)."""
+
+    def __init__(self, sim, path, region=None, stride=STRIDE, components=COMPONENTS, every=EVERY):
+        import meep as mp
+
+        self.mp = mp
+        self.sim = sim
+        self.path = path
+        self.region = region or mp.Volume(center=mp.Vector3(), size=sim.cell_size)
+        self.stride = stride
+        self.components = list(components)
+        self.every = every
+        self.dft = None
+        self.file = h5py.File(path, "w") if mp.am_master() else None
+        self.grid_written = False
+
+    def _sub(self, a):
+        a = np.asarray(a)
+        return a[tuple(slice(None, None, self.stride) for _ in range(a.ndim))]
+
+    def _dataset(self, name, shape, dtype):
+        chunks = (1,) + tuple(min(s, CHUNK_PX) for s in shape)
+        return self.file.create_dataset(name, shape=(0,) + shape, maxshape=(None,) + shape, dtype=dtype,
+                                        chunks=chunks, compression="gzip",
+                                        compression_opts=COMPRESSION, shuffle=True)
+
+    def _write_grid(self):
+        """Coordinates and ε of the (sub-sampled) region; get_array is collective."""
+        xs, ys, zs, _ = self.sim.get_array_metadata(vol=self.region)
+        eps = self._sub(self.sim.get_array(vol=self.region, component=self.mp.Dielectric))
+        if self.file is not None:
+            for name, c in zip("xyz", (xs, ys, zs)):
+                if len(c) > 1:
+                    self.file[name] = self._sub(c)
+            self.file.create_dataset("eps", data=eps.astype(np.float32), compression="gzip",
+                                     compression_opts=COMPRESSION)
+            self.file.attrs.update(stride=self.stride, resolution=self.sim.resolution)
+        self.grid_written = True
+
+    def snapshot(self, sim):
+        """Step function: append one snapshot of every component."""
+        if not self.grid_written:
+            self._write_grid()
+        for name in self.components:
+            a = self._sub(sim.get_array(vol=self.region, component=getattr(self.mp, name))).real
+            if self.file is None:
+                continue
+            key = f"time/{name}"
+            ds = self.file[key] if key in self.file else self._dataset(key, a.shape, np.float32)
+            ds.resize(ds.shape[0] + 1, axis=0)
+            ds[-1] = a
+        if self.file is not None:
+            t = self.file["time/t"] if "time/t" in self.file else self.file.create_dataset(
+                "time/t", shape=(0,), maxshape=(None,), dtype=np.float64, chunks=(256,))
+            t.resize(t.shape[0] + 1, axis=0)
+            t[-1] = sim.meep_time()
+            self.file.flush()
+
+    def step(self):
+        return self.mp.at_every(self.every, self.snapshot)
+
+    def add_dft(self, freqs):
+        """Register DFT fields of the region (call before the run that accumulates them)."""
+        self.dft_freqs = np.atleast_1d(np.asarray(freqs, float))
+        self.dft = self.sim.add_dft_fields([getattr(self.mp, c) for c in self.components],
+                                           self.dft_freqs, where=self.region)
+        return self.dft
+
+    def write_dft(self):
+        """Write the accumulated DFT fields, one frequency at a time."""
+        if not self.grid_written:
+            self._write_grid()
+        for name in self.components:
+            comp = getattr(self.mp, name)
+            ds = None
+            for i in range(len(self.dft_freqs)):
+                a = self._sub(self.sim.get_dft_array(self.dft, comp, i)).astype(np.complex64)
+                if self.file is None:
+                    continue
+                if ds is None:
+                    ds = self._dataset(f"dft/{name}", a.shape, np.complex64)
+                ds.resize(i + 1, axis=0)
+                ds[i] = a
+            if ds is not None:
+                ds.attrs["freqs"] = self.dft_freqs
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            print(f"Fields: {self.path} ({os.path.getsize(self.path) / 1e6:.1f} MB)")
+
+
+def from_env(sim, tag, region=None):
+    """FieldExport to <tag>_fields.h5 if NANOBEAM_FIELDS is set (settings from NANOBEAM_FIELDS_*), else None."""
+    if not os.environ.get("NANOBEAM_FIELDS"):
+        return None
+    import meep as mp
+
+    roi = os.environ.get("NANOBEAM_FIELDS_ROI")
+    if roi:
+        size = [float(v) for v in roi.split(",")] + [0.0]
+        region = mp.Volume(center=mp.Vector3(), size=mp.Vector3(*size[:3]))
+    comps = os.environ.get("NANOBEAM_FIELDS_COMPONENTS")
+    return FieldExport(sim, f"{tag}_fields.h5", region,
+                       stride=int(os.environ.get("NANOBEAM_FIELDS_STRIDE", STRIDE)),
+                       components=comps.split(",") if comps else COMPONENTS,
+                       every=float(os.environ.get("NANOBEAM_FIELDS_EVERY", EVERY)))
+
+
+# ============================================================
+# LAZY READER
+# ============================================================
+class FieldFile:
+    """Read-only view of an exported field file; datasets are h5py objects sliced on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = h5py.File(path, "r")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+    @property
+    def coords(self):
+        return {k: self.file[k][:] for k in "xyz" if k in self.file}
+
+    @property
+    def times(self):
+        return self.file["time/t"][:] if "time/t" in self.file else np.array([])
+
+    def components(self, kind="time"):
+        return sorted(k for k in self.file.get(kind, {}) if k != "t")
+
+    def snapshots(self, comp):
+        return self.file[f"time/{comp}"]
+
+    def dft(self, comp):
+        return self.file[f"dft/{comp}"]
+
+    def freqs(self, comp):
+        return self.file[f"dft/{comp}"].attrs["freqs"]
+
+    def slice(self, comp, index=-1, dft=False, z=0.0):
+        """2D (x, y) array of one snapshot / DFT frequency (3D: plane nearest z), with ε and extent."""
+        ds = self.dft(comp) if dft else self.snapshots(comp)
+        sel = (index, slice(None), slice(None))
+        eps_sel = (slice(None), slice(None))
+        if ds.ndim == 4:
+            k = int(np.argmin(np.abs(self.file["z"][:] - z)))
+            sel += (k,)
+            eps_sel += (k,)
+        a = ds[sel]
+        eps = self.file["eps"][eps_sel]
+        nx, ny = min(a.shape[0], eps.shape[0]), min(a.shape[1], eps.shape[1])
+        x, y = self.file["x"][:nx], self.file["y"][:ny]
+        return a[:nx, :ny], eps[:nx, :ny], (x[0], x[-1], y[0], y[-1])
+
+    def summary(self):
+        lines = []
+
+        def visit(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                raw = obj.size * obj.dtype.itemsize
+                stored = obj.id.get_storage_size()
+                lines.append(f"  {name:14s} {str(obj.shape):22s} {obj.dtype}  "
+                             f"{stored / 1e6:8.2f} MB ({raw / max(stored, 1):.1f}× compressed)")
+        self.file.visititems(visit)
+        return "\n".join(lines)
+
+
+def plot_slice(ff, comp, index=-1, dft=False, out=None):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    a, eps, (x0, x1, y0, y1) = ff.slice(comp, index, dft)
+    val = np.abs(a) ** 2 if dft else a
+    fig, ax = plt.subplots(figsize=(8, 3))
+    vmax = np.max(np.abs(val)) or 1.0
+    im = ax.imshow(val.T, origin="lower", extent=(x0, x1, y0, y1), aspect="equal",
+                   cmap="inferno" if dft else "RdBu", vmin=0 if dft else -vmax, vmax=vmax)
+    ax.contour(eps.T, levels=[0.5 * (eps.min() + eps.max())], colors="w", linewidths=0.5,
+               extent=(x0, x1, y0, y1))
+    if dft:
+        title = f"|{comp}|² at f={ff.freqs(comp)[index]:.4f} 1/um"
+    else:
+        title = f"{comp} at t={ff.times[index]:.1f}"
+    ax.set_title(title)
+    ax.set_xlabel("x (um)")
+    ax.set_ylabel("y (um)")
+    fig.colorbar(im, ax=ax)
+    fig.tight_layout()
+    out = out or f"{os.path.splitext(ff.path)[0]}_{comp}_{'dft' if dft else 't'}{index}.png"
+    fig.savefig(out, dpi=200)
+    plt.close(fig)
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser(description="Inspect / plot exported cavity fields.")
+    p.add_argument("path")
+    p.add_argument("--plot", default=None, metavar="COMP", help="e.g. Ez")
+    p.add_argument("--index", type=int, default=-1, help="snapshot or DFT frequency index")
+    p.add_argument("--dft", action="store_true", help="plot |DFT|² instead of a snapshot")
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    with FieldFile(args.path) as ff:
+        print(f"{args.path}: {len(ff.times)} snapshots, DFT components {ff.components('dft')}")
+        print(ff.summary())
+        if args.plot:
+            print(f"Saved → {plot_slice(ff, args.plot, args.index, args.dft, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# ============================================================
+# HEADLESS PARALLEL FIGURE RENDERING WITH A CONTENT-HASH CACHE
+# - Every figure job = plotting script + its input files + its PNGs;
+#   per-defect PDOS figures are one job per defect folder
+# - Scripts run in separate processes (N_WORKERS at a time) with the
+#   Agg backend, so plt.show() never blocks
+# - Job hash = script source + input contents + style (matplotlib
+#   version, rcParams overrides); jobs whose hash matches the manifest
+#   and whose PNGs exist are skipped
+# Note: plot_pdos_bcn.py and plot_pdos_bcn_with_zpl.py write the same
+#       pdos_BCN_<defect>.png; only the ZPL version is registered.
+# Usage:  python figures.py [--force] [--only NAME ...] [--workers N]
+# Output: figures_manifest.json
+# ============================================================
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib
+
+from lremit2meep.profiling import ENV as PROFILE_ENV, wrap_command
+
+# =========================
+# USER SETTINGS
+# =========================
+BASE = "."
+MANIFEST = "figures_manifest.json"
+N_WORKERS = os.cpu_count() or 2
+STYLE = {}                     # rcParams applied to every figure (part of the hash)
+HASH_FULL_MB = 64              # larger inputs (gpw): size, mtime and head/tail blocks only
+LOG_DIR = os.path.join("logs", "figures")
+# =========================
+
+# name → (script, input globs, outputs)
+STATIC_FIGURES = {
+    "purcell_spectrum": ("plot.py", ["purcell_spectrum.csv", "zpl_purcell_matching_with_lifetime.csv"],
+                         ["purcell_spectrum.png", "design_tolerance_windowed.png"]),
+    "electronic_properties": ("plot_defect_electronic_properties.py", ["electronic_defect_metrics.csv"],
+                              ["bandgap_comparison.png", "magnetic_moment.png", "ipr_localization.png"]),
+    "defect_dos_and_levels": ("plot_defect_dos_and_levels.py",
+                              ["hBN_5x5_C-VN/hBN_5x5_C-VN_fd.gpw", "electronic_defect_metrics.csv"],
+                              ["dos_hBN_5x5_C-VN.png", "spin_dos_hBN_5x5_C-VN.png", "defect_levels_rel_vbm.png"]),
+    "all_defect_dos": ("plot_all_defect_dos.py", ["*/*_fd.gpw"],
+                       ["all_defects_total_dos.png", "all_defects_spin_dos.png"]),
+}
+
+
+def figure_jobs(base=BASE):
+    """Static jobs + one PDOS job per defect folder with an FD ground state."""
+    jobs = {name: {"script": s, "inputs": i, "outputs": o, "env": {}}
+            for name, (s, i, o) in STATIC_FIGURES.items()}
+    for gpw in sorted(glob.glob(os.path.join(base, "*", "*_fd.gpw"))):
+        defect = os.path.basename(gpw)[:-len("_fd.gpw")]
+        jobs[f"pdos_{defect}"] = {
+            "script": "plot_pdos_bcn_with_zpl.py",
+            "inputs": [os.path.relpath(gpw, base)],
+            "outputs": [f"pdos_BCN_{defect}.png"],
+            "env": {"FIGURE_DEFECTS": defect},
+        }
+    return jobs
+
+
+def file_digest(path, h):
+    st = os.stat(path)
+    h.update(f"{path}:{st.st_size}".encode())
+    if st.st_size <= HASH_FULL_MB * 2**20:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                h.update(block)
+    else:
+        h.update(str(st.st_mtime_ns).encode())
+        with open(path, "rb") as f:
+            h.update(f.read(2**20))
+            f.seek(-2**20, os.SEEK_END)
+            h.update(f.read())
+
+
+def job_hash(job, base=BASE):
+    h = hashlib.sha256()
+    with open(os.path.join(base, job["script"]), "rb") as f:
+        h.update(f.read())
+    h.update(json.dumps({"style": STYLE, "env": job["env"], "mpl": matplotlib.__version__},
+                        sort_keys=True).encode())
+    for pattern in job["inputs"]:
+        for path in sorted(glob.glob(os.path.join(base, pattern))):
+            file_digest(path, h)
+    return h.hexdigest()
+
+
+def render(name, job, base=BASE):
+    """Run one plotting script headless in its own process."""
+    env = dict(os.environ, MPLBACKEND="Agg", **job["env"])
+    if STYLE:
+        # rcParams through a temporary matplotlibrc in the job's config dir
+        cfg = os.path.join(base, LOG_DIR, f"mplconfig_{name}")
+        os.makedirs(cfg, exist_ok=True)
+        with open(os.path.join(cfg, "matplotlibrc"), "w") as f:
+            f.writelines(f"{k}: {v}\n" for k, v in STYLE.items())
+        env["MPLCONFIGDIR"] = os.path.abspath(cfg)
+
+    t0 = time.time()
+    with open(os.path.join(base, LOG_DIR, f"{name}.log"), "w") as log:
+        code = subprocess.run(wrap_command([sys.executable, job["script"]], name), cwd=base, env=env,
+                              stdout=log, stderr=subprocess.STDOUT).returncode
+    ok = code == 0 and all(os.path.exists(os.path.join(base, o)) for o in job["outputs"])
+    print(f"  {'✔' if ok else '⚠'} {name} ({time.time() - t0:.1f} s)", flush=True)
+    return ok
+
+
+def main():
+    p = argparse.ArgumentParser(description="Render all figures headless, skipping unchanged ones.")
+    p.add_argument("--base", default=BASE)
+    p.add_argument("--workers", type=int, default=N_WORKERS)
+    p.add_argument("--only", nargs="+", default=None, help="job names (see --list)")
+    p.add_argument("--force", action="store_true", help="ignore the manifest")
+    p.add_argument("--list", action="store_true")
+    p.add_argument("--profile", action="store_true",
+                   help="profile each rendered script → <base>/profiles/ (add --force for cached ones)")
+    args = p.parse_args()
+    if args.profile:
+        os.environ[PROFILE_ENV] = "1"
+
+    jobs = figure_jobs(args.base)
+    if args.only:
+        jobs = {k: v for k, v in jobs.items() if k in args.only}
+    if args.list:
+        for name, job in jobs.items():
+            print(f"{name:32s} {job['script']:40s} → {', '.join(job['outputs'])}")
+        return
+
+    os.makedirs(os.path.join(args.base, LOG_DIR), exist_ok=True)
+    manifest_path = os.path.join(args.base, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    missing = [name for name, job in jobs.items()
+               if not all(glob.glob(os.path.join(args.base, pat)) for pat in job["inputs"])]
+    for name in missing:
+        print(f"  - {name}: inputs not found, skipped")
+        jobs.pop(name)
+
+    t0 = time.time()
+    hashes = {name: job_hash(job, args.base) for name, job in jobs.items()}
+    todo = [name for name, job in jobs.items()
+            if args.force or manifest.get(name, {}).get("hash") != hashes[name]
+            or not all(os.path.exists(os.path.join(args.base, o)) for o in job["outputs"])]
+    print(f"{len(jobs)} figure jobs, {len(jobs) - len(todo)} up to date "
+          f"(hashed in {time.time() - t0:.2f} s), rendering {len(todo)} on {args.workers} workers", flush=True)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = dict(zip(todo, pool.map(lambda n: render(n, jobs[n], args.base), todo)))
+
+    for name, ok in results.items():
+        if ok:
+            manifest[name] = {"hash": hashes[name], "outputs": jobs[name]["outputs"]}
+        else:
+            manifest.pop(name, None)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    failed = [n for n, ok in results.items() if not ok]
+    print(f"\nDone in {time.time() - t0:.1f} s"
+          + (f"; failed: {', '.join(failed)} (see {LOG_DIR}/)" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# ============================================================
+# FINITE-SIZE SCALING ACROSS SUPERCELLS (5×5, 6×6, 7×7, ...)
+# - Builds each defect in every supercell with enumerate_defects.py
+#   (folders hBN_<n>x<n>_<defect>, existing results are reused)
+# - Runs tddft_pipeline.py per folder as independent jobs, cheapest
+#   (smallest) cells first, N_PARALLEL at a time; the pristine cell of a
+#   size runs before its defects (screening / level reference); each job
+#   logs to logs/fss_<folder>.log
+# - One spectrum backend (BACKEND) for every size: "auto" would switch to
+#   RT-TDDFT above RT_MIN_ATOMS and mix two methods on one 1/n curve
+# - Fits E(n) = E∞ + b·n^-p to the ZPL and the in-gap defect levels
+#   and only adds the next size for defects whose E∞ has not converged
+# Outputs:
+#   finite_size_scaling.csv        per defect and size
+#   finite_size_extrapolation.csv  E∞, b, p per defect and quantity
+#   finite_size_scaling.png
+# ============================================================
+import os
+import sys
+import json
+import argparse
+import itertools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from enumerate_defects import (
+    build_supercell, enumerate_configs, apply_config, save_variant, site_distance,
+)
+from zpl_purcell_table_and_tolerance import zpl_from_transitions
+
+# =========================
+# USER SETTINGS
+# =========================
+BASE_DIR = os.getcwd()
+DEFECTS = {                      # folder suffix → enumeration label
+    "CB": "CB",
+    "CN": "CN",
+    "VB": "VB",
+    "VN": "VN",
+    "C-VN": "CB-VN",
+}
+SIZES = [5, 6, 7, 8, 9, 10, 11]
+MIN_POINTS = 3                   # sizes computed before the first fit
+CONV_TOL_EV = 0.02               # |ΔE∞| on adding a size, and |E(n_max) − E∞|
+P_GRID = np.arange(0.5, 4.01, 0.05)
+P_DEFAULT = 3.0                  # exponent used with only two sizes (dipole-like)
+N_PARALLEL = 2                   # concurrent pipeline jobs
+BACKEND = "lr"                   # same method for the whole series ("lr" or "rt")
+PIPELINE_CMD = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "tddft_pipeline.py")]
+OUT_CSV = "finite_size_scaling.csv"
+OUT_FIT = "finite_size_extrapolation.csv"
+OUT_PNG = "finite_size_scaling.png"
+# =========================
+
+QUANTITIES = ["ZPL_eV", "Occ_level_eV", "Empty_level_eV"]
+
+
+def folder_name(n, defect):
+    return f"hBN_{n}x{n}_{defect}"
+
+
+# =========================
+# STRUCTURES
+# =========================
+def build_series(sizes, defects, base_dir=BASE_DIR):
+    """Write the pristine cell and every defect for each supercell size."""
+    for n in sizes:
+        slab = build_supercell(n)
+        save_variant(slab, folder_name(n, "pristine"), base_dir)
+
+        configs, _ = enumerate_configs(n)
+        by_label = {}
+        for _, c in configs:
+            sep = max((site_distance(p, q, n) for (p, _), (q, _) in
+                       itertools.combinations(c["config"], 2)), default=0.0)
+            # complexes: the most compact arrangement (e.g. nearest-neighbor C–VN)
+            if c["label"] not in by_label or sep < by_label[c["label"]][0]:
+                by_label[c["label"]] = (sep, c["config"])
+
+        for defect in defects:
+            label = DEFECTS[defect]
+            if label not in by_label:
+                raise KeyError(f"{label} is not produced by enumerate_defects settings")
+            save_variant(apply_config(slab, by_label[label][1], n),
+                         folder_name(n, defect), base_dir)
+
+
+# =========================
+# JOBS
+# =========================
+def has_result(base_dir, name):
+    folder = os.path.join(base_dir, name)
+    if os.path.exists(os.path.join(folder, f"{name}_spectrum.csv")):
+        return True
+    screen = os.path.join(folder, f"{name}_screen.json")
+    if os.path.exists(screen):
+        with open(screen) as f:
+            return not json.load(f)["Passed"]
+    return False
+
+
+def run_job(base_dir, name, backend=BACKEND):
+    folder = os.path.join(base_dir, name)
+    cmd = PIPELINE_CMD + ["--jobs", name, "--workdir", base_dir, "--backend", backend,
+                          "--log", f"fss_{name}.log"]
+    with open(os.path.join(folder, f"{name}_fss.log"), "w") as log:
+        code = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT).returncode
+    print(f"  {'✔' if code == 0 else '⚠'} {name}", flush=True)
+    return code
+
+
+def run_wave(base_dir, sizes, defects, n_parallel=N_PARALLEL, dry_run=False, backend=BACKEND):
+    """Pristine cells first, then defects; each group smallest cell first."""
+    for group in ([("pristine", n) for n in sizes],
+                  [(d, n) for n in sizes for d in defects]):
+        names = [folder_name(n, d) for d, n in sorted(group, key=lambda g: g[1])]
+        names = [nm for nm in names if not has_result(base_dir, nm)]
+        if not names:
+            continue
+        print(f"→ {len(names)} jobs: {', '.join(names)}", flush=True)
+        if dry_run:
+            continue
+        with ThreadPoolExecutor(max_workers=n_parallel) as pool:
+            list(pool.map(lambda nm: run_job(base_dir, nm, backend), names))
+
+
+# =========================
+# OBSERVABLES
+# =========================
+def observables(base_dir, n, defect):
+    """ZPL (lowest bright transition) and the in-gap KS levels vs. host VBM."""
+    name = folder_name(n, defect)
+    folder = os.path.join(base_dir, name)
+    row = {"Defect": defect, "Size": n, "N_atoms": np.nan,
+           "ZPL_eV": np.nan, "Occ_level_eV": np.nan, "Empty_level_eV": np.nan}
+
+    cif = os.path.join(folder, f"{name}.cif")
+    if os.path.exists(cif):
+        from ase.io import read
+        row["N_atoms"] = len(read(cif))
+
+    csv = os.path.join(folder, f"{name}_spectrum.csv")
+    if os.path.exists(csv):
+        df = pd.read_csv(csv)
+        df["Molecule"] = name
+        row["ZPL_eV"] = zpl_from_transitions(df, name)[0]
+
+    screen = os.path.join(folder, f"{name}_screen.json")
+    host = os.path.join(base_dir, folder_name(n, "pristine"),
+                        f"{folder_name(n, 'pristine')}_screen.json")
+    if os.path.exists(screen) and os.path.exists(host):
+        with open(screen) as f:
+            levels = json.load(f)["In_gap_levels"]
+        with open(host) as f:
+            vbm = json.load(f)["VBM_eV"]
+        occ = [e for _, e, f in levels if f > 0.5]
+        emp = [e for _, e, f in levels if f <= 0.5]
+        if occ:
+            row["Occ_level_eV"] = max(occ) - vbm
+        if emp:
+            row["Empty_level_eV"] = min(emp) - vbm
+    return row
+
+
+def fit_dilute_limit(n, E):
+    """E(n) = E∞ + b·n^-p; p from P_GRID (least squares), P_DEFAULT for two points."""
+    n, E = np.asarray(n, float), np.asarray(E, float)
+    ok = np.isfinite(E)
+    n, E = n[ok], E[ok]
+    if len(n) < 2:
+        return None
+
+    best = None
+    for p in (P_GRID if len(n) >= 3 else [P_DEFAULT]):
+        A = np.column_stack([np.ones_like(n), n ** -p])
+        coef, *_ = np.linalg.lstsq(A, E, rcond=None)
+        res = float(np.sum((A @ coef - E) ** 2))
+        if best is None or res < best[0] - 1e-14:
+            best = (res, coef[0], coef[1], p)
+    _, e_inf, b, p = best
+    return {"E_inf": float(e_inf), "b": float(b), "p": float(p), "n_points": int(len(n))}
+
+
+def is_converged(n, E, tol=CONV_TOL_EV):
+    """E∞ stable against dropping the largest size, and the largest size close to E∞."""
+    n, E = np.asarray(n, float), np.asarray(E, float)
+    ok = np.isfinite(E)
+    n, E = n[ok], E[ok]
+    if len(n) < MIN_POINTS:
+        return False
+    order = np.argsort(n)
+    n, E = n[order], E[order]
+    full, prev = fit_dilute_limit(n, E), fit_dilute_limit(n[:-1], E[:-1])
+    return abs(full["E_inf"] - prev["E_inf"]) < tol and abs(E[-1] - full["E_inf"]) < tol
+
+
+def defect_converged(df, defect, tol=CONV_TOL_EV):
+    g = df[df["Defect"] == defect]
+    checks = [is_converged(g["Size"], g[q], tol) for q in QUANTITIES if g[q].notna().sum() >= 2]
+    return bool(checks) and all(checks)
+
+
+# =========================
+# PLOT
+# =========================
+def plot_scaling(df, fits, out_png=OUT_PNG):
+    fig, axes = plt.subplots(1, 2, figsize=(10, 3.8))
+    for defect, g in df.groupby("Defect"):
+        g = g.sort_values("Size")
+        for ax, q in zip(axes, ["ZPL_eV", "Occ_level_eV"]):
+            if g[q].notna().sum() == 0:
+                continue
+            line, = ax.plot(g["Size"], g[q], "o", label=defect)
+            fit = fits.get((defect, q))
+            if fit is not None:
+                x = np.linspace(g["Size"].min(), g["Size"].max() * 1.5, 100)
+                ax.plot(x, fit["E_inf"] + fit["b"] * x ** -fit["p"], "-", color=line.get_color(), lw=1)
+                ax.axhline(fit["E_inf"], color=line.get_color(), ls=":", lw=1)
+
+    axes[0].set_ylabel("ZPL (eV)")
+    axes[1].set_ylabel("Highest occupied in-gap level − VBM (eV)")
+    for ax in axes:
+        ax.set_xlabel("Supercell n (n×n)")
+    axes[0].legend(frameon=False, fontsize=8)
+    fig.tight_layout()
+    fig.savefig(out_png, dpi=300)
+    plt.close(fig)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Finite-size scaling of ZPLs and defect levels.")
+    p.add_argument("--defects", nargs="+", default=list(DEFECTS), choices=list(DEFECTS))
+    p.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    p.add_argument("--parallel", type=int, default=N_PARALLEL)
+    p.add_argument("--tol", type=float, default=CONV_TOL_EV, help="eV")
+    p.add_argument("--base-dir", default=BASE_DIR)
+    p.add_argument("--backend", choices=["lr", "rt"], default=BACKEND,
+                   help="spectrum backend for every size of the series")
+    p.add_argument("--dry-run", action="store_true", help="build structures, print the jobs")
+    args = p.parse_args()
+
+    sizes = sorted(args.sizes)
+    active = list(args.defects)
+    done_sizes = sizes[:MIN_POINTS]
+    build_series(done_sizes, active, args.base_dir)
+    run_wave(args.base_dir, done_sizes, active, args.parallel, args.dry_run, args.backend)
+
+    rows = [observables(args.base_dir, n, d) for n in done_sizes for d in active]
+    df = pd.DataFrame(rows)
+
+    # --- add one size at a time, only for unconverged defects ---
+    for n in sizes[MIN_POINTS:]:
+        active = [d for d in active if not defect_converged(df, d, args.tol)]
+        if not active or args.dry_run:
+            break
+        print(f"\n{n}x{n}: not yet converged → {', '.join(active)}", flush=True)
+        build_series([n], active, args.base_dir)
+        run_wave(args.base_dir, [n], active, args.parallel, backend=args.backend)
+        df = pd.concat([df, pd.DataFrame([observables(args.base_dir, n, d) for d in active])],
+                       ignore_index=True)
+
+    df = df.sort_values(["Defect", "Size"]).reset_index(drop=True)
+    df.to_csv(os.path.join(args.base_dir, OUT_CSV), index=False)
+
+    fits, fit_rows = {}, []
+    for defect, g in df.groupby("Defect"):
+        for q in QUANTITIES:
+            fit = fit_dilute_limit(g["Size"], g[q])
+            if fit is None:
+                continue
+            fits[(defect, q)] = fit
+            fit_rows.append({"Defect": defect, "Quantity": q, **fit,
+                             "Sizes": " ".join(str(int(s)) for s in g.loc[g[q].notna(), "Size"]),
+                             "Converged": is_converged(g["Size"], g[q], args.tol)})
+
+    fit_df = pd.DataFrame(fit_rows)
+    fit_df.to_csv(os.path.join(args.base_dir, OUT_FIT), index=False)
+    plot_scaling(df, fits, os.path.join(args.base_dir, OUT_PNG))
+
+    print("\n" + (fit_df.to_string(index=False, float_format=lambda v: f"{v:.3f}")
+                  if len(fit_df) else "No fits (fewer than two sizes with results)."))
+    print(f"\nSaved → {OUT_CSV}, {OUT_FIT}, {OUT_PNG}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# ============================================================
+# HUANG–RHYS PHONON-SIDEBAND LINESHAPES
+# - Starts from the relaxed structure in each defect folder
+# - Excited state: ΔSCF (GPAW LCAO + maximum-overlap method, one electron
+#   promoted HOMO→LUMO in EXCITED_SPIN) forces at the ground-state geometry
+# - Phonons of the region around the defect (partial Hessian):
+#     inner atoms (< INNER_RADIUS of a defect atom): finite-difference
+#       ground-state forces of the defect supercell
+#     outer atoms (< OUTER_RADIUS): force constants of the pristine
+#       supercell, translated to the atom's lattice site (embedding)
+#     further atoms are frozen
+# - Displacement ΔR = H⁻¹ΔF, partial Huang–Rhys factors S_k, relaxation
+#   energy E_rel = Σ S_k ħω_k, E_ZPL = E_vert(LR-TDDFT) − E_rel
+# - Emission lineshape from the generating function G(t) = exp(S(t) − S)
+#   (FFT), Lorentzian ZPL, ω³ luminescence factor
+# - Force cache: one file per (structure, electronic state, displacement)
+#   in FORCE_CACHE; reruns reuse every evaluation, all defects on the same
+#   host share the pristine force constants, only missing calls run
+# Usage:  python huang_rhys.py [--defects ...] [--dry-run]
+# Outputs:
+#   <defect>/<defect>_lineshape.csv   wavelength_nm, intensity (spectral_overlap.py)
+#   <defect>/<defect>_huang_rhys.csv  hw_meV, S_k per mode
+#   huang_rhys_summary.csv
+# ============================================================
+import os
+import json
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+from ase.io import read
+
+from lremit2meep.geometry import (
+    SITE_TOL, find_relaxed_structure, supercell_size, load_pristine_references, find_defect_sites,
+)
+from lremit2meep.profiling import profile_stage
+from lremit2meep.spectra import HC, zpl_from_transitions
+
+# =========================
+# USER SETTINGS
+# =========================
+BASE = "."
+SPECTRA_CSV = "all_spectra_merged.csv"      # vertical excitation energies (LR-TDDFT)
+FORCE_CACHE = "force_cache"
+SUMMARY_CSV = "huang_rhys_summary.csv"
+DELTA = 0.01                   # finite-difference displacement (Å)
+INNER_RADIUS = 3.0             # Å: force-constant columns from the defect supercell
+OUTER_RADIUS = 6.0             # Å: columns from the pristine host
+OMEGA_MIN_MEV = 5.0            # drop soft / frozen-boundary modes
+CALC = {"mode": "lcao", "basis": "dzp", "xc": "PBE", "smearing": 0.01}   # spin-polarized, Γ only
+EXCITED_SPIN = 0
+EXCITATION = {}                # defect → (spin, from band, to band); default HOMO→LUMO in EXCITED_SPIN
+# Lineshape
+DE_EV = 0.0005                 # phonon-energy grid
+E_MAX_EV = 1.0                 # sideband range (FFT length ≥ 2·E_MAX/DE)
+SIGMA_PH_EV = 0.003            # Gaussian broadening of each phonon line
+ZPL_FWHM_EV = 0.011            # ≈ 3 nm at 570 nm (PLD h-BN)
+# =========================
+
+E_CHARGE = 1.602176634e-19
+AMU = 1.66053906660e-27
+HBAR = 1.054571817e-34
+
+
+# ============================================================
+# FORCE CACHE
+# ============================================================
+def structure_hash(atoms, state):
+    """Key of an (undisplaced) structure + electronic state + calculator settings."""
+    desc = {
+        "numbers": atoms.numbers.tolist(),
+        "positions": np.round(atoms.positions, 5).tolist(),
+        "cell": np.round(np.asarray(atoms.cell), 5).tolist(),
+        "pbc": atoms.pbc.tolist(),
+        "calc": CALC,
+        "state": state,
+    }
+    return hashlib.sha1(json.dumps(desc, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def displacement_label(i=None, axis=None, sign=None):
+    return "eq" if i is None else f"{i}{'xyz'[axis]}{'+' if sign > 0 else '-'}{DELTA:g}"
+
+
+def is_master():
+    try:
+        from gpaw.mpi import world
+    except ImportError:
+        return True
+    return world.rank == 0
+
+
+def gpaw_forces(atoms, state):
+    """(forces, energy) of the ground state ("gs") or a ΔSCF/MOM excited state."""
+    from gpaw import GPAW, FermiDirac
+
+    atoms = atoms.copy()
+    atoms.calc = GPAW(mode=CALC["mode"], basis=CALC["basis"], xc=CALC["xc"],
+                      occupations=FermiDirac(CALC["smearing"]), kpts=(1, 1, 1),
+                      symmetry="off", spinpol=True, txt=None)
+    energy = atoms.get_potential_energy()
+    if state != "gs":
+        from gpaw.mom import prepare_mom_calculation
+
+        f_sn = [np.round(atoms.calc.get_occupation_numbers(spin=s)) for s in range(2)]
+        f_n = f_sn[state["spin"]]
+        homo = int(np.nonzero(f_n > 0.5)[0][-1])
+        i = homo if state["from"] == "homo" else state["from"]
+        a = homo + 1 if state["to"] == "lumo" else state["to"]
+        f_n[i] -= 1.0
+        f_n[a] += 1.0
+        prepare_mom_calculation(atoms.calc, atoms, f_sn)
+        energy = atoms.get_potential_energy()
+    return atoms.get_forces(), energy
+
+
+class ForceCache:
+    """Forces per (structure, state, displacement) as .npz files; counts reused and new calls."""
+
+    def __init__(self, root=FORCE_CACHE, dry_run=False, compute=gpaw_forces):
+        self.root = root
+        self.dry_run = dry_run
+        self.compute = compute
+        self.hits = 0
+        self.computed = 0
+
+    def forces(self, atoms, state, i=None, axis=None, sign=None):
+        """Forces of atoms with atom i displaced by sign·DELTA along axis (None: equilibrium)."""
+        path = os.path.join(self.root, structure_hash(atoms, state), f"{displacement_label(i, axis, sign)}.npz")
+        if os.path.exists(path):
+            self.hits += 1
+            with np.load(path) as data:
+                return data["forces"], float(data["energy"])
+
+        self.computed += 1
+        if self.dry_run:
+            return np.zeros((len(atoms), 3)), 0.0
+
+        disp = atoms.copy()
+        if i is not None:
+            disp.positions[i, axis] += sign * DELTA
+        forces, energy = self.compute(disp, state)
+
+        if is_master():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path[:-4]}.tmp.npz"
+            np.savez(tmp, forces=forces, energy=energy)
+            os.replace(tmp, path)    # atomic: concurrent runs never see a partial file
+        return forces, energy
+
+    def column(self, atoms, j):
+        """Force constants H[:, :, j] = −∂F/∂u_j (N, 3, 3) by central differences."""
+        col = np.empty((len(atoms), 3, 3))
+        for axis in range(3):
+            fp, _ = self.forces(atoms, "gs", j, axis, +1)
+            fm, _ = self.forces(atoms, "gs", j, axis, -1)
+            col[:, :, axis] = -(fp - fm) / (2 * DELTA)
+        return col
+
+
+# ============================================================
+# PARTIAL HESSIAN (defect columns + embedded pristine columns)
+# ============================================================
+def min_image(atoms, d):
+    """Minimum-image Cartesian vectors for periodic directions."""
+    frac = np.linalg.solve(np.asarray(atoms.cell).T, d.T).T
+    frac[:, atoms.pbc] -= np.round(frac[:, atoms.pbc])
+    return frac @ np.asarray(atoms.cell)
+
+
+def pristine_columns(pristine, cache):
+    """One force-constant column per host species (atom closest to the cell center)."""
+    center = np.asarray(pristine.cell).sum(axis=0) / 2
+    cols = {}
+    for sym in sorted(set(pristine.get_chemical_symbols())):
+        idx = [k for k, s in enumerate(pristine.get_chemical_symbols()) if s == sym]
+        p0 = idx[int(np.argmin(np.linalg.norm(min_image(pristine, pristine.positions[idx] - center), axis=1)))]
+        cols[sym] = (p0, cache.column(pristine, p0))
+    return cols
+
+
+def embedded_column(atoms, j, pristine, p0, col):
+    """Pristine column of site p0 translated to atom j: H[k, j] = H_host[q, p0], q ≅ k − j + p0."""
+    d = min_image(atoms, atoms.positions - atoms.positions[j])
+    target = pristine.positions[p0] + d
+    out = np.zeros((len(atoms), 3, 3))
+    for k, t in enumerate(target):
+        dist = np.linalg.norm(min_image(pristine, pristine.positions - t), axis=1)
+        q = int(np.argmin(dist))
+        if dist[q] < SITE_TOL:
+            out[k] = col[q]
+    return out
+
+
+def defect_regions(atoms, ref):
+    """Indices of the defect atoms, the inner and the outer phonon region."""
+    defect, labels = find_defect_sites(atoms, *ref)
+    dist = np.min([np.linalg.norm(min_image(atoms, atoms.positions - atoms.positions[c]), axis=1)
+                   for c in defect], axis=0)
+    inner = np.where(dist < INNER_RADIUS)[0]
+    outer = np.where((dist >= INNER_RADIUS) & (dist < OUTER_RADIUS))[0]
+    return defect, labels, inner, outer
+
+
+def region_hessian(atoms, inner, outer, pristine, host_cols, cache):
+    """Symmetrized (3R, 3R) Hessian over inner + outer atoms (eV/Å²)."""
+    region = np.concatenate([inner, outer])
+    symbols = atoms.get_chemical_symbols()
+    H = np.empty((3 * len(region), 3 * len(region)))
+    for c, j in enumerate(region):
+        if j in inner or symbols[j] not in host_cols:
+            col = cache.column(atoms, j)
+        else:
+            col = embedded_column(atoms, j, pristine, *host_cols[symbols[j]])
+        H[:, 3 * c:3 * c + 3] = col[region].reshape(-1, 3)
+    return region, 0.5 * (H + H.T)
+
+
+def huang_rhys(H, masses, dF):
+    """ħω_k (eV) and partial S_k of the modes of H for the force change dF (region, 3)."""
+    m = np.repeat(masses, 3)
+    lam, vec = np.linalg.eigh(H / np.sqrt(np.outer(m, m)))        # eV/(Å² amu)
+    keep = lam > 0
+    lam, vec = lam[keep], vec[:, keep]
+    omega = np.sqrt(lam * E_CHARGE / (1e-20 * AMU))               # rad/s
+    hw = HBAR * omega / E_CHARGE
+    dQ = vec.T @ (dF.ravel() / np.sqrt(m)) / lam                   # Å·√amu
+    S = omega * dQ ** 2 * 1e-20 * AMU / (2 * HBAR)
+    keep = hw * 1000 > OMEGA_MIN_MEV
+    return hw[keep], S[keep]
+
+
+# ============================================================
+# LINESHAPE (generating function, FFT)
+# ============================================================
+def phonon_sideband(hw, S, de=DE_EV, e_max=E_MAX_EV, sigma=SIGMA_PH_EV, zpl_fwhm=ZPL_FWHM_EV):
+    """
+    A(E) for emission at E_ZPL − E, normalized to Σ A = 1: energy shifts
+    (eV, FFT order: negative above the ZPL) and A.
+    """
+    n = 1 << int(np.ceil(np.log2(2 * e_max / de)))
+    E = np.arange(n) * de
+    g = np.exp(-0.5 * ((E[:, None] - hw[None, :]) / sigma) ** 2)
+    s = (g / g.sum(axis=0, keepdims=True)) @ S                    # S(ħω) dE on the grid
+    t = 2 * np.pi * np.minimum(np.arange(n), n - np.arange(n)) / (n * de)   # |t| (1/eV, ħ = 1)
+    G = np.exp(np.fft.fft(s) - S.sum()) * np.exp(-0.5 * zpl_fwhm * t)
+    return np.fft.fftfreq(n, 1.0 / (n * de)), np.fft.ifft(G).real
+
+
+def emission_lineshape(e_zpl, shift, A):
+    """Luminescence ∝ E³·A(E_ZPL − E) per nm: (wavelength_nm, intensity normalized to max 1)."""
+    E = e_zpl - shift
+    ok = E > 0.1
+    I = np.clip(A[ok], 0, None) * E[ok] ** 3 * E[ok] ** 2 / HC
+    lam = HC / E[ok]
+    order = np.argsort(lam)
+    return lam[order], I[order] / I.max()
+
+
+# ============================================================
+# PIPELINE
+# ============================================================
+def pristine_structures(base):
+    """Relaxed pristine atoms keyed by supercell size."""
+    out = {}
+    for d in sorted(os.listdir(base)):
+        path = os.path.join(base, d)
+        if os.path.isdir(path) and "pristine" in d:
+            f = find_relaxed_structure(path)
+            if f is not None:
+                atoms = read(f)
+                out[supercell_size(atoms.cell)] = atoms
+    return out
+
+
+def analyse_defect(name, folder, spectra, pristine, refs, cache):
+    atoms = read(find_relaxed_structure(folder))
+    key = supercell_size(atoms.cell)
+    if key not in pristine:
+        raise RuntimeError(f"no relaxed pristine {key[0]}x{key[1]} supercell for the host force constants")
+    defect, labels, inner, outer = defect_regions(atoms, refs[key])
+    host_cols = pristine_columns(pristine[key], cache)
+
+    if name in EXCITATION:
+        s, i, a = EXCITATION[name]
+        state = {"spin": s, "from": i, "to": a}
+    else:
+        state = {"spin": EXCITED_SPIN, "from": "homo", "to": "lumo"}
+    Fg, Eg = cache.forces(atoms, "gs")
+    Fe, Ee = cache.forces(atoms, state)
+    region, H = region_hessian(atoms, inner, outer, pristine[key], host_cols, cache)
+    if cache.dry_run:
+        return None
+
+    hw, S = huang_rhys(H, atoms.get_masses()[region], (Fe - Fg)[region])
+    e_rel = float(np.sum(S * hw))
+    e_vert = zpl_from_transitions(spectra, name)[0] if name in set(spectra["Molecule"]) else Ee - Eg
+    e_zpl = e_vert - e_rel
+
+    pd.DataFrame({"hw_meV": hw * 1000, "S_k": S}).to_csv(
+        os.path.join(folder, f"{name}_huang_rhys.csv"), index=False)
+    shift, A = phonon_sideband(hw, S)
+    lam, I = emission_lineshape(e_zpl, shift, A)
+    pd.DataFrame({"wavelength_nm": lam, "intensity": I}).to_csv(
+        os.path.join(folder, f"{name}_lineshape.csv"), index=False)
+
+    return {"Defect": name, "Defect_sites": ", ".join(labels), "S_total": float(S.sum()),
+            "Debye_Waller": float(np.exp(-S.sum())), "E_rel_eV": e_rel, "E_vert_eV": e_vert,
+            "E_vert_dSCF_eV": Ee - Eg, "E_ZPL_eV": e_zpl, "ZPL_nm": HC / e_zpl,
+            "n_inner": len(inner), "n_outer": len(outer), "n_modes": len(hw)}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Huang–Rhys factors and phonon-sideband lineshapes.")
+    p.add_argument("--base", default=BASE)
+    p.add_argument("--defects", nargs="+", default=None, help="defect folders (default: all but pristine)")
+    p.add_argument("--dry-run", action="store_true", help="only count the missing force calls")
+    args = p.parse_args()
+
+    spectra = (pd.read_csv(os.path.join(args.base, SPECTRA_CSV))
+               if os.path.exists(os.path.join(args.base, SPECTRA_CSV)) else pd.DataFrame(columns=["Molecule"]))
+    pristine = pristine_structures(args.base)
+    refs = load_pristine_references(args.base)
+    cache = ForceCache(os.path.join(args.base, FORCE_CACHE), dry_run=args.dry_run)
+
+    names = args.defects or [d for d in sorted(os.listdir(args.base))
+                             if os.path.isdir(os.path.join(args.base, d)) and "pristine" not in d
+                             and find_relaxed_structure(os.path.join(args.base, d))]
+    rows = []
+    for name in names:
+        hits, computed = cache.hits, cache.computed
+        folder = os.path.join(args.base, name)
+        try:
+            with profile_stage(f"{name}_huang_rhys", folder, stage="huang_rhys"):
+                row = analyse_defect(name, folder, spectra, pristine, refs, cache)
+        except Exception as e:
+            print(f"⚠ {name}: {e}", flush=True)
+            continue
+        reused, new = cache.hits - hits, cache.computed - computed
+        print(f"{name}: {reused} force calls reused, {new} {'missing' if args.dry_run else 'computed'}"
+              + (f" | S={row['S_total']:.2f}, E_rel={row['E_rel_eV']:.3f} eV, ZPL={row['ZPL_nm']:.1f} nm"
+                 if row else ""), flush=True)
+        if row:
+            rows.append(dict(row, force_calls_reused=reused, force_calls_computed=new))
+
+    if rows:
+        pd.DataFrame(rows).to_csv(SUMMARY_CSV, index=False)
+        print(f"\nSaved → {SUMMARY_CSV}, <defect>/<defect>_lineshape.csv")
+
+
+if __name__ == "__main__":
+    main()
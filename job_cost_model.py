@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# ============================================================
+# JOB COST MODEL + LONGEST-FIRST, MEMORY-AWARE SCHEDULER
+# - Training data from finished runs:
+#     *_lcao.log / *_fd.log   atoms, bands, valence electrons, spin,
+#                             "Total:" wall time, "Memory usage"
+#     *_lrtddft.log           KSS transitions, "Total:", "Memory usage"
+#     *_timings.json          rank count of the stage (tddft_pipeline.py)
+# - Per stage: log-linear fit  log y = c0 + Σ c_k log x_k
+#   (y = seconds or GiB), exponents shrunk towards the textbook scaling
+#   (STAGE_FEATURES) since our sizes span little range → median and
+#   P90 prediction per job
+# - Scheduler: jobs (structure, stage) with lcao → fd → tddft
+#   dependencies; ready jobs start in order of longest remaining
+#   chain (critical path) whenever cores and memory of the node allow
+# Outputs:
+#   job_cost_training.csv, job_schedule.csv
+# ============================================================
+import os
+import re
+import glob
+import json
+import sys
+import time
+import argparse
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+# =========================
+# USER SETTINGS
+# =========================
+BASE = "."
+NODE_CORES = 8
+NODE_MEM_GB = 16.0
+RANKS = 1                      # MPI ranks per job (1 = serial pipeline)
+RIDGE = 1e-2                   # shrinkage of the exponents towards the priors
+P90_Z = 1.2816                 # one-sided 90 % quantile of the log residuals
+PIPELINE_CMD = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "tddft_pipeline.py")]
+TRAIN_CSV = "job_cost_training.csv"
+SCHEDULE_CSV = "job_schedule.csv"
+# =========================
+
+STAGES = ["lcao", "fd", "tddft"]
+STAGE_LOG = {"lcao": "_lcao.log", "fd": "_fd.log", "tddft": "_lrtddft.log"}
+# feature → prior exponent of wall time (memory: MEM_PRIOR_SCALE × these)
+STAGE_FEATURES = {
+    "lcao": {"n_electrons": 3.0, "spinpol": np.log(2), "ranks": -1.0},   # dense diagonalization
+    "fd": {"n_atoms": 1.0, "nbands": 2.0, "spinpol": np.log(2), "ranks": -1.0},  # grid × bands²
+    "tddft": {"n_pairs": 2.0, "n_atoms": 1.0, "ranks": -1.0},  # Omega: pairs² × grid
+}
+MEM_PRIOR_SCALE = 2.0 / 3.0
+VALENCE = {"B": 3, "N": 5, "C": 4, "O": 6, "Si": 4, "H": 1}
+VIRT_BUFFER = 10               # fd_restart: nbands = n_e // 2 + VIRT_BUFFER
+
+
+# ============================================================
+# LOG PARSING
+# ============================================================
+def parse_log(path):
+    """Last complete run of a GPAW / LR-TDDFT text log (None if unfinished)."""
+    info = {}
+    with open(path) as f:
+        for line in f:
+            for key, pattern, cast in [
+                ("n_atoms", r"^Number of atoms:\s+(\d+)", int),
+                ("nbands", r"^Number of bands in calculation:\s+(\d+)", int),
+                ("n_electrons", r"^Number of valence electrons:\s+([\d.]+)", float),
+                ("n_kss", r"^KSS (\d+) transitions", int),
+                ("seconds", r"^Total:\s+([\d.]+)", float),
+                ("mem_gb", r"^Memory usage:\s+([\d.]+) GiB", float),
+            ]:
+                m = re.match(pattern, line)
+                if m:
+                    info[key] = cast(m.group(1))
+            if "Spin-polarized calculation" in line:
+                info["spinpol"] = 1
+            elif "Spin-paired calculation" in line:
+                info["spinpol"] = 0
+    return info if "seconds" in info else None
+
+
+def pair_count(n_electrons, nbands, spinpol):
+    """Estimated number of KS singles (occupied → less occupied, per spin)."""
+    b = np.arange(nbands)
+    if spinpol:
+        channels = [np.clip(np.ceil(n_electrons / 2) - b, 0, 1),
+                    np.clip(np.floor(n_electrons / 2) - b, 0, 1)]
+    else:
+        channels = [np.clip(n_electrons / 2 - b, 0, 1)]
+    return int(sum(np.sum(f[:, None] > f[None, :] + 1e-6) for f in channels))
+
+
+def stage_ranks(folder, name, stage):
+    path = os.path.join(folder, f"{name}_timings.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            entry = json.load(f).get(stage)
+        if entry:
+            return entry.get("ranks", 1)
+    return 1
+
+
+def collect_training(base=BASE):
+    """One row per finished (structure, stage) with features and costs."""
+    rows = []
+    for folder in sorted(glob.glob(os.path.join(base, "*"))):
+        if not os.path.isdir(folder):
+            continue
+        name = os.path.basename(folder)
+        gs = {}
+        for stage in STAGES:
+            log = os.path.join(folder, name + STAGE_LOG[stage])
+            if not os.path.exists(log):
+                continue
+            info = parse_log(log)
+            if info is None:
+                continue
+            if stage == "fd":
+                gs = info
+            if stage == "tddft":
+                # the LR-TDDFT log has no system info: take it from the FD restart
+                info = {**{k: gs[k] for k in ("n_atoms", "nbands", "n_electrons", "spinpol") if k in gs},
+                        **info}
+            rows.append({"Structure": name, "Stage": stage,
+                         "ranks": stage_ranks(folder, name, stage), **info})
+
+    df = pd.DataFrame(rows)
+    if len(df):
+        # measured KSS count of finished LR-TDDFT runs, else the estimate
+        df["n_pairs"] = [pair_count(r.n_electrons, r.nbands, r.spinpol)
+                         if np.isfinite(r.nbands) else np.nan for r in df.itertuples()]
+        if "n_kss" in df:
+            df["n_pairs"] = df["n_kss"].fillna(df["n_pairs"])
+    return df
+
+
+# ============================================================
+# MODEL
+# ============================================================
+def design(df, features):
+    cols = []
+    for f in features:
+        x = df[f].to_numpy(dtype=float)
+        cols.append(x if f == "spinpol" else np.log(np.maximum(x, 1.0)))
+    return np.column_stack([np.ones(len(df))] + cols)
+
+
+class CostModel:
+    """Per-stage log-linear ridge models for wall time and peak memory."""
+
+    def __init__(self, ridge=RIDGE):
+        self.ridge = ridge
+        self.coef = {}
+
+    def fit(self, df):
+        for stage, g in df.groupby("Stage"):
+            X = design(g, STAGE_FEATURES[stage])
+            penalty = self.ridge * len(g) * np.eye(X.shape[1])
+            penalty[0, 0] = 0.0                      # intercept is not regularized
+            for target in ("seconds", "mem_gb"):
+                y = np.log(g[target].to_numpy(dtype=float))
+                prior = np.array([0.0] + list(STAGE_FEATURES[stage].values()))
+                if target == "mem_gb":
+                    prior *= MEM_PRIOR_SCALE
+                # ridge towards the prior: minimize |Xc - y|² + λ|c - prior|²
+                c = np.linalg.solve(X.T @ X + penalty, X.T @ y + penalty @ prior)
+                dof = max(len(y) - X.shape[1], 1)
+                sigma = np.sqrt(np.sum((X @ c - y) ** 2) / dof) if len(y) > 1 else 1.0
+                self.coef[(stage, target)] = (c, sigma)
+        return self
+
+    def predict(self, jobs):
+        """Median and P90 seconds / GiB for a DataFrame of jobs."""
+        out = jobs.copy()
+        for col in ["seconds", "seconds_p90", "mem_gb", "mem_gb_p90"]:
+            out[col] = np.nan
+        for stage, g in jobs.groupby("Stage"):
+            X = design(g, STAGE_FEATURES[stage])
+            for target in ("seconds", "mem_gb"):
+                if (stage, target) not in self.coef:
+                    continue
+                c, sigma = self.coef[(stage, target)]
+                mu = X @ c
+                out.loc[g.index, target] = np.exp(mu)
+                out.loc[g.index, f"{target}_p90"] = np.exp(mu + P90_Z * sigma)
+        return out
+
+
+# ============================================================
+# JOBS FROM STRUCTURES
+# ============================================================
+def needs_spinpol(struct_name):
+    # same rule as tddft_pipeline.needs_spinpol
+    key = struct_name.lower()
+    return any(tag in key for tag in ["_vn", "_vb", "c-vn"])
+
+
+def pending_jobs(base=BASE, ranks=RANKS):
+    """(structure, stage) jobs whose outputs do not exist yet, with features."""
+    from ase.io import read
+
+    rows = []
+    for folder in sorted(glob.glob(os.path.join(base, "*"))):
+        name = os.path.basename(folder)
+        inputs = [os.path.join(folder, f"{name}{ext}") for ext in (".cif", ".xyz")]
+        inputs = [p for p in inputs if os.path.exists(p)]
+        if not os.path.isdir(folder) or not inputs:
+            continue
+
+        atoms = read(inputs[0])
+        n_e = float(sum(VALENCE.get(s, 4) for s in atoms.get_chemical_symbols()))
+        spin = int(needs_spinpol(name))
+        nbands = int(n_e // 2 + VIRT_BUFFER)
+        outputs = {"lcao": f"{name}_lcao.gpw", "fd": f"{name}_fd.gpw", "tddft": f"{name}_spectrum.csv"}
+
+        for stage in STAGES:
+            if os.path.exists(os.path.join(folder, outputs[stage])):
+                continue
+            rows.append({"Structure": name, "Stage": stage, "n_atoms": len(atoms),
+                         "n_electrons": n_e, "nbands": nbands, "spinpol": spin,
+                         "n_pairs": pair_count(n_e, nbands, spin), "ranks": ranks})
+    return pd.DataFrame(rows)
+
+
+# ============================================================
+# SCHEDULER
+# ============================================================
+def critical_path(jobs):
+    """Remaining predicted time of each job's lcao → fd → tddft chain (from the job on)."""
+    order = {s: k for k, s in enumerate(STAGES)}
+    rest = np.zeros(len(jobs))
+    for i, r in enumerate(jobs.itertuples()):
+        same = jobs[(jobs["Structure"] == r.Structure)
+                    & (jobs["Stage"].map(order) >= order[r.Stage])]
+        rest[i] = same["seconds"].sum()
+    return rest
+
+
+def schedule(jobs, cores=NODE_CORES, mem_gb=NODE_MEM_GB, longest_first=True):
+    """
+    Event-driven list schedule on one node. Memory is reserved at the P90
+    prediction. Returns the jobs with Start/End (s) and the makespan.
+    """
+    jobs = jobs.reset_index(drop=True).copy()
+    jobs["Priority"] = critical_path(jobs) if longest_first else -np.arange(len(jobs), dtype=float)
+    prev = {}
+    for i, r in jobs.iterrows():
+        earlier = jobs[(jobs["Structure"] == r["Structure"])
+                       & (jobs["Stage"].map(STAGES.index) < STAGES.index(r["Stage"]))]
+        prev[i] = set(earlier.index)
+
+    for i, r in jobs.iterrows():
+        if r["mem_gb_p90"] > mem_gb or r["ranks"] > cores:
+            raise RuntimeError(f"{r['Structure']}/{r['Stage']} needs {r['mem_gb_p90']:.1f} GiB, "
+                               f"{r['ranks']} cores; node has {mem_gb} GiB, {cores} cores")
+
+    start, end = {}, {}
+    running = []                                  # (end time, job)
+    t = 0.0
+    while len(end) < len(jobs):
+        free_c = cores - sum(jobs.at[j, "ranks"] for _, j in running)
+        free_m = mem_gb - sum(jobs.at[j, "mem_gb_p90"] for _, j in running)
+        ready = [i for i in jobs.index if i not in start and prev[i] <= set(end)]
+        for i in sorted(ready, key=lambda i: -jobs.at[i, "Priority"]):
+            if jobs.at[i, "ranks"] <= free_c and jobs.at[i, "mem_gb_p90"] <= free_m:
+                start[i] = t
+                running.append((t + jobs.at[i, "seconds"], i))
+                free_c -= jobs.at[i, "ranks"]
+                free_m -= jobs.at[i, "mem_gb_p90"]
+        running.sort()
+        t, i = running.pop(0)
+        end[i] = t
+
+    jobs["Start (s)"] = jobs.index.map(start)
+    jobs["End (s)"] = jobs.index.map(end)
+    return jobs.sort_values("Start (s)"), max(end.values())
+
+
+def screened_out(base, name):
+    """True if the LCAO stage's <name>_screen.json rejected the structure."""
+    path = os.path.join(base, name, f"{name}_screen.json")
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        return not json.load(f)["Passed"]
+
+
+def run_schedule(plan, cores=NODE_CORES, mem_gb=NODE_MEM_GB, base=BASE, poll=10.0):
+    """Launch pipeline stages in plan order whenever dependencies and resources allow."""
+    waiting = list(plan.itertuples())
+    running, done, failed = [], set(), set()
+    while waiting or running:
+        for p, r in list(running):
+            if p.poll() is not None:
+                running.remove((p, r))
+                (done if p.returncode == 0 else failed).add((r.Structure, r.Stage))
+                print(f"  {'✔' if p.returncode == 0 else '⚠'} {r.Structure}/{r.Stage}", flush=True)
+
+        free_c = cores - sum(r.ranks for _, r in running)
+        free_m = mem_gb - sum(r.mem_gb_p90 for _, r in running)
+        for r in list(waiting):
+            before = STAGES[:STAGES.index(r.Stage)]
+            if any((r.Structure, s) in failed for s in before):
+                print(f"✖ {r.Structure}/{r.Stage}: an earlier stage failed", flush=True)
+                waiting.remove(r)
+                failed.add((r.Structure, r.Stage))
+                continue
+            blocked = any((r.Structure, s) not in done for s in before
+                          if ((plan["Structure"] == r.Structure) & (plan["Stage"] == s)).any())
+            if blocked:
+                continue
+            if r.Stage != "lcao" and screened_out(base, r.Structure):
+                # the pipeline would skip it too (it honours the saved screening)
+                print(f"⏭ {r.Structure}/{r.Stage}: screened out", flush=True)
+                waiting.remove(r)
+                done.add((r.Structure, r.Stage))
+                continue
+            if r.ranks > free_c or r.mem_gb_p90 > free_m:
+                continue
+            cmd = PIPELINE_CMD + ["--only", r.Stage, "--jobs", r.Structure, "--workdir", base]
+            if r.ranks > 1:
+                cmd = ["mpirun", "-np", str(r.ranks), "gpaw", "python"] + PIPELINE_CMD[1:] + \
+                    ["--mpi", "--only", r.Stage, "--jobs", r.Structure, "--workdir", base]
+            print(f"→ {r.Structure}/{r.Stage} (~{r.seconds / 60:.0f} min, "
+                  f"{r.mem_gb_p90:.1f} GiB)", flush=True)
+            running.append((subprocess.Popen(cmd), r))
+            waiting.remove(r)
+            free_c -= r.ranks
+            free_m -= r.mem_gb_p90
+        time.sleep(poll)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Predict job costs from logs and plan a campaign.")
+    p.add_argument("--base", default=BASE)
+    p.add_argument("--cores", type=int, default=NODE_CORES)
+    p.add_argument("--mem-gb", type=float, default=NODE_MEM_GB)
+    p.add_argument("--ranks", type=int, default=RANKS)
+    p.add_argument("--run", action="store_true", help="execute the schedule")
+    args = p.parse_args()
+
+    train = collect_training(args.base)
+    if train.empty:
+        print("No finished runs to train on.")
+        return
+    train.to_csv(TRAIN_CSV, index=False)
+    model = CostModel().fit(train)
+
+    # --- leave-one-out check of the wall-time model ---
+    errors = []
+    for i in train.index:
+        sub = train.drop(i)
+        if (sub["Stage"] == train.at[i, "Stage"]).sum() < 2:
+            continue
+        pred = CostModel().fit(sub).predict(train.loc[[i]])
+        errors.append(abs(np.log(pred["seconds"].iloc[0] / train.at[i, "seconds"])))
+    print(f"Trained on {len(train)} finished stages "
+          f"({', '.join(f'{s}: {n}' for s, n in train['Stage'].value_counts().items())})")
+    if errors:
+        print(f"Leave-one-out wall time: median factor {np.exp(np.median(errors)):.2f}×")
+
+    jobs = pending_jobs(args.base, args.ranks)
+    if jobs.empty:
+        print("No pending jobs.")
+        return
+    jobs = model.predict(jobs)
+
+    plan, makespan = schedule(jobs, args.cores, args.mem_gb, longest_first=True)
+    _, fifo = schedule(jobs, args.cores, args.mem_gb, longest_first=False)
+    plan.to_csv(SCHEDULE_CSV, index=False)
+
+    cols = ["Structure", "Stage", "seconds", "seconds_p90", "mem_gb_p90", "Start (s)", "End (s)"]
+    print("\n" + plan[cols].to_string(index=False, float_format=lambda v: f"{v:.0f}"))
+    print(f"\nPredicted makespan: {makespan / 3600:.1f} h longest-first vs. "
+          f"{fifo / 3600:.1f} h in folder order ({args.cores} cores, {args.mem_gb:.0f} GiB)")
+    print(f"Saved → {SCHEDULE_CSV}")
+
+    if args.run:
+        run_schedule(plan, args.cores, args.mem_gb, args.base)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+LrEmit2meep as an importable package.
+
+Broadening, ZPL extraction and Purcell matching need only NumPy/pandas;
+ASE, GPAW and MEEP are imported inside the functions that use them, so
+analyses of the CSV outputs start quickly and can run in-process:
+
+    import lremit2meep as lm
+    spectra = pd.read_csv("all_spectra_merged.csv")
+    tab = lm.matching_table(spectra, lm.load_purcell_csv("purcell_spectrum.csv"))
+
+Submodules and their public names are loaded on first attribute access.
+CLI:  python -m lremit2meep {zpl,broaden,match,geometry,pipeline,cavity} ...
+"""
+import importlib
+
+__version__ = "0.1.0"
+
+_EXPORTS = {
+    "spectra": ["HC", "ev_to_nm", "broaden", "broadened_peak", "zpl_from_transitions",
+                "zpl_table", "peak_zpl_table"],
+    "purcell": ["load_purcell_csv", "fp_at_lambda", "matching_table", "peak_matching_table",
+                "write_matching_tex"],
+    "geometry": ["find_relaxed_structure", "ideal_reference", "match_sites", "find_defect_sites",
+                 "bond_geometry", "analyse_structure", "geometry_table"],
+    "drivers": ["run_pipeline", "run_cavity"],
+}
+_NAMES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_EXPORTS) + sorted(_NAMES)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return importlib.import_module(f".{name}", __name__)
+    if name in _NAMES:
+        value = getattr(importlib.import_module(f".{_NAMES[name]}", __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
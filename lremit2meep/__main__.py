@@ -0,0 +1,147 @@
+"""
+python -m lremit2meep <command>
+
+  zpl       ZPL per defect from all_spectra_merged.csv          (pandas)
+  broaden   broadened absorption spectrum of one defect         (pandas)
+  match     ZPL–Purcell matching table with lifetimes           (pandas)
+  geometry  defect sites and bond geometry of relaxed models    (ASE)
+  pipeline  LCAO → FD → LR-TDDFT over the defect folders        (GPAW)
+  cavity    Harminv + Purcell for one nanobeam design           (MEEP)
+  hotspots  campaign profile report from profiles/ folders
+
+Each command imports only what it needs. --profile (or LREMIT_PROFILE=1)
+writes cProfile stats and sampled stacks of the command to profiles/;
+pipeline and cavity profile each stage / MEEP run in its own folder.
+"""
+import os
+import sys
+import argparse
+
+
+def cmd_zpl(args):
+    import pandas as pd
+    from .spectra import zpl_table, peak_zpl_table
+
+    df = pd.read_csv(args.spectra)
+    tab = peak_zpl_table(df, sigma_ev=args.sigma) if args.method == "peak" else zpl_table(df)
+    if args.out:
+        tab.to_csv(args.out, index=False)
+    print(tab.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+
+
+def cmd_broaden(args):
+    import numpy as np
+    import pandas as pd
+    from .spectra import EGRID, broaden
+
+    df = pd.read_csv(args.spectra)
+    g = df[df["Molecule"] == args.defect]
+    if g.empty:
+        raise SystemExit(f"{args.defect} not in {args.spectra}")
+    y = broaden(g["Energy(eV)"], g["Osc"], EGRID, args.sigma)
+    out = args.out or f"{args.defect}_broadened.csv"
+    np.savetxt(out, np.column_stack([EGRID, y]), delimiter=",", header="Energy(eV),Intensity", comments="")
+    print(f"Saved → {out}")
+
+
+def cmd_match(args):
+    import pandas as pd
+    from .purcell import load_purcell_csv, matching_table, write_matching_tex
+
+    tab = matching_table(pd.read_csv(args.spectra), load_purcell_csv(args.purcell), tau0_ns=args.tau0)
+    tab.to_csv(f"{args.out}.csv", index=False)
+    write_matching_tex(tab, f"{args.out}.tex")
+    print(tab.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    print(f"\nSaved → {args.out}.csv, {args.out}.tex")
+
+
+def cmd_geometry(args):
+    from .geometry import geometry_table
+
+    df = geometry_table(args.base, args.workers)
+    df.to_csv(args.out, index=False)
+    print(df.to_string(index=False))
+
+
+def cmd_pipeline(args):
+    from .drivers import run_pipeline
+
+    run_pipeline(args.args)
+
+
+def cmd_cavity(args):
+    from .drivers import run_cavity
+
+    if not run_cavity(args.params, args.fidelity, args.results):
+        raise SystemExit(1)
+
+
+def cmd_hotspots(args):
+    from .profiling import report
+
+    report(args.roots, args.out, args.top)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m lremit2meep", description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--profile", action="store_true", help="profile the command → profiles/")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    s = sub.add_parser("zpl", help="ZPL per defect")
+    s.add_argument("--spectra", default="all_spectra_merged.csv")
+    s.add_argument("--method", choices=["bright", "peak"], default="bright",
+                   help="lowest bright transition, or peak of the broadened spectrum")
+    s.add_argument("--sigma", type=float, default=0.10, help="broadening for --method peak (eV)")
+    s.add_argument("--out", default=None)
+    s.set_defaults(func=cmd_zpl)
+
+    s = sub.add_parser("broaden", help="broadened absorption spectrum of one defect")
+    s.add_argument("defect")
+    s.add_argument("--spectra", default="all_spectra_merged.csv")
+    s.add_argument("--sigma", type=float, default=0.10, help="eV")
+    s.add_argument("--out", default=None, help="default: <defect>_broadened.csv")
+    s.set_defaults(func=cmd_broaden)
+
+    s = sub.add_parser("match", help="ZPL–Purcell matching with lifetimes")
+    s.add_argument("--spectra", default="all_spectra_merged.csv")
+    s.add_argument("--purcell", default="purcell_spectrum.csv")
+    s.add_argument("--tau0", type=float, default=1.0, help="free-space lifetime (ns)")
+    s.add_argument("--out", default="zpl_purcell_matching_with_lifetime", help="output prefix (.csv, .tex)")
+    s.set_defaults(func=cmd_match)
+
+    s = sub.add_parser("geometry", help="defect sites and bond geometry (ASE)")
+    s.add_argument("--base", default=".")
+    s.add_argument("--workers", type=int, default=int(os.environ.get("N_WORKERS", os.cpu_count() or 1)))
+    s.add_argument("--out", default="atomic_models_summary_with_geometry.csv")
+    s.set_defaults(func=cmd_geometry)
+
+    s = sub.add_parser("pipeline", help="LCAO → FD → LR-TDDFT (GPAW); arguments go to tddft_pipeline.py")
+    s.add_argument("args", nargs=argparse.REMAINDER)
+    s.set_defaults(func=cmd_pipeline)
+
+    s = sub.add_parser("cavity", help="Harminv + Purcell for one design (MEEP)")
+    s.add_argument("params", nargs="*", metavar="PARAM=VALUE", help="e.g. r=0.08 w=0.5")
+    s.add_argument("--fidelity", choices=["coarse", "fine"], default=None)
+    s.add_argument("--results", default=None, help="results CSV (default: cavity_results.csv)")
+    s.set_defaults(func=cmd_cavity)
+
+    s = sub.add_parser("hotspots", help="aggregate profiles/ folders into a hotspot report")
+    s.add_argument("roots", nargs="*", default=["."])
+    s.add_argument("--top", type=int, default=25)
+    s.add_argument("--out", default="profile_hotspots", help="output prefix (.md, .csv)")
+    s.set_defaults(func=cmd_hotspots)
+
+    args = p.parse_args(argv)
+    from .profiling import ENV, profile_stage
+
+    if args.profile:
+        os.environ[ENV] = "1"
+    if args.command in ("pipeline", "cavity", "hotspots"):
+        return args.func(args)      # stages / MEEP runs profile themselves
+    with profile_stage(f"lremit2meep_{args.command}", stage=args.command):
+        args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""
+GPAW and MEEP drivers. The backends (and the repository scripts that wrap
+them) are imported only when a driver is called.
+"""
+import os
+import sys
+import importlib
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _script(name):
+    """Import one of the top-level repository scripts as a module."""
+    if REPO not in sys.path:
+        sys.path.insert(0, REPO)
+    return importlib.import_module(name)
+
+
+def run_pipeline(argv=None):
+    """LCAO → FD → LR-TDDFT over the defect folders (tddft_pipeline.py; imports GPAW)."""
+    return _script("tddft_pipeline").main(argv)
+
+
+def run_cavity(params=(), fidelity=None, results_csv=None):
+    """
+    Harminv + Purcell (MEEP) for one nanobeam design in cavity_runs/.
+
+    params: ["r=0.08", "w=0.5", ...] on top of the baseline design;
+    fidelity: None (script defaults), "coarse", "fine" or a dict with
+    resolution, run_time and decay.
+    """
+    surrogate = _script("cavity_surrogate")
+    if isinstance(fidelity, str):
+        fidelity = getattr(_script("cavity_multifidelity"), fidelity.upper())
+    design = surrogate.parse_design(list(params))
+    return surrogate.run_design(design, results_csv or surrogate.RESULTS_CSV, fidelity)
@@ -0,0 +1,212 @@
+"""
+Atomic models of the defect supercells: defect sites against the pristine
+h-BN lattice and the bond geometry around them. ASE is imported only by
+the functions that read structures or build neighbour lists.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+# Ideal h-BN lattice (same as the structure generator in LrEmit2meep.ipynb)
+A_LAT = 2.50       # lattice constant (Å)
+SITE_TOL = 0.60    # max in-plane distance (Å) for an atom to occupy a lattice site
+
+# Covalent radii (Å) – used to build neighbor list
+COV_RADII = {
+    "B": 0.84,
+    "N": 0.71,
+    "C": 0.76,
+}
+
+
+def find_relaxed_structure(path):
+    """Return the relaxed structure file inside a defect folder (or None)."""
+    for fn in sorted(os.listdir(path)):
+        if "relaxed" in fn and fn.endswith((".xyz", ".cif", ".traj")):
+            return os.path.join(path, fn)
+    return None
+
+
+def supercell_size(cell, a_lat=A_LAT):
+    """In-plane supercell multiplicity (n1, n2) inferred from the cell vectors."""
+    lengths = cell.lengths()
+    return int(round(lengths[0] / a_lat)), int(round(lengths[1] / a_lat))
+
+
+def ideal_reference(cell, a_lat=A_LAT):
+    """Ideal honeycomb sites for an NxM supercell: (fractional xy, symbols)."""
+    n1, n2 = supercell_size(cell, a_lat)
+    i, j = np.meshgrid(np.arange(n1), np.arange(n2), indexing="ij")
+    i = i.ravel()
+    j = j.ravel()
+
+    frac_b = np.column_stack([i / n1, j / n2])
+    frac_n = np.column_stack([(i + 1 / 3) / n1, (j + 2 / 3) / n2])
+
+    frac = np.vstack([frac_b, frac_n]) % 1.0
+    symbols = np.array(["B"] * len(i) + ["N"] * len(i))
+    return frac, symbols
+
+
+def load_pristine_references(base):
+    """Relaxed pristine structures keyed by supercell size (n1, n2)."""
+    from ase.io import read
+
+    refs = {}
+    for d in sorted(os.listdir(base)):
+        path = os.path.join(base, d)
+        if not os.path.isdir(path) or "pristine" not in d:
+            continue
+        struct_file = find_relaxed_structure(path)
+        if struct_file is None:
+            continue
+        atoms = read(struct_file)
+        frac = atoms.get_scaled_positions(wrap=True)[:, :2]
+        refs[supercell_size(atoms.cell)] = (frac, np.array(atoms.get_chemical_symbols()))
+    return refs
+
+
+def inplane_distances(frac_a, frac_b, cell):
+    """Minimum-image in-plane distances between two sets of fractional sites."""
+    d = frac_a[:, None, :] - frac_b[None, :, :]
+    d -= np.round(d)
+    cart = d @ np.asarray(cell)[:2, :2]
+    return np.linalg.norm(cart, axis=-1)
+
+
+def match_sites(atoms, ref_frac, chunk=2048):
+    """Nearest reference site (and distance) for every atom, in chunks of atoms."""
+    frac = atoms.get_scaled_positions(wrap=True)[:, :2]
+    site = np.empty(len(atoms), dtype=int)
+    dist = np.empty(len(atoms))
+    for start in range(0, len(atoms), chunk):
+        dmat = inplane_distances(frac[start:start + chunk], ref_frac, atoms.cell)
+        site[start:start + chunk] = np.argmin(dmat, axis=1)
+        dist[start:start + chunk] = dmat[np.arange(len(dmat)), site[start:start + chunk]]
+    return site, dist
+
+
+def find_defect_sites(atoms, ref_frac, ref_symbols):
+    """
+    Compare a structure against its pristine reference.
+
+    Returns (defect atom indices, site labels). Substituted and off-lattice
+    atoms are defect atoms themselves; for a vacancy the atoms bonded to the
+    empty site are used.
+    """
+    symbols = np.array(atoms.get_chemical_symbols())
+    site, dist = match_sites(atoms, ref_frac)
+
+    on_site = dist < SITE_TOL
+    defect = set(np.where(~on_site)[0])
+    labels = [f"{symbols[i]}_i" for i in np.where(~on_site)[0]]
+
+    subst = np.where(on_site & (symbols != ref_symbols[site]))[0]
+    defect.update(subst)
+    labels += [f"{symbols[i]}_{ref_symbols[site[i]]}" for i in subst]
+
+    occupied = np.zeros(len(ref_frac), dtype=bool)
+    occupied[site[on_site]] = True
+    vacancies = np.where(~occupied)[0]
+    if len(vacancies):
+        bond_cut = 1.2 * A_LAT / np.sqrt(3)
+        dmat = inplane_distances(ref_frac[vacancies], ref_frac[site], atoms.cell)
+        defect.update(np.where((dmat < bond_cut).any(axis=0) & on_site)[0])
+        labels += [f"V_{ref_symbols[v]}" for v in vacancies]
+
+    return sorted(int(i) for i in defect), sorted(labels)
+
+
+def bond_geometry(atoms, centers):
+    """All bond lengths and j–i–k bond angles around the given center atoms."""
+    from ase.neighborlist import neighbor_list
+
+    cutoffs = [1.2 * COV_RADII.get(s, 0.8) for s in atoms.get_chemical_symbols()]
+    i, D = neighbor_list("iD", atoms, cutoffs, self_interaction=False)
+
+    keep = np.isin(i, centers)
+    i, D = i[keep], D[keep]
+    bond_lengths = np.linalg.norm(D, axis=1)
+    if len(i) == 0:
+        return bond_lengths, np.array([])
+
+    # Pad bond vectors per center: (n_centers, max_neighbors, 3)
+    order = np.argsort(i, kind="stable")
+    i, D = i[order], D[order]
+    _, start, counts = np.unique(i, return_index=True, return_counts=True)
+    slot = np.arange(len(i)) - np.repeat(start, counts)
+    row = np.repeat(np.arange(len(counts)), counts)
+
+    V = np.zeros((len(counts), counts.max(), 3))
+    mask = np.zeros(V.shape[:2], dtype=bool)
+    V[row, slot] = D / bond_lengths[order][:, None]
+    mask[row, slot] = True
+
+    cosang = np.einsum("cjx,ckx->cjk", V, V)
+    pairs = mask[:, :, None] & mask[:, None, :] & np.triu(np.ones(cosang.shape[1:], dtype=bool), k=1)
+    bond_angles = np.degrees(np.arccos(np.clip(cosang[pairs], -1, 1)))
+
+    return bond_lengths, bond_angles
+
+
+def analyse_structure(job, pristine_refs):
+    """Summary row (composition, defect sites, bond statistics) for one (name, file) job."""
+    from ase.io import read
+
+    d, struct_file = job
+
+    atoms = read(struct_file)
+    symbols = atoms.get_chemical_symbols()
+    cell = atoms.cell
+
+    # Composition
+    unique, counts = np.unique(symbols, return_counts=True)
+    composition = dict(zip(unique, counts))
+
+    # Pristine reference of the same supercell size (ideal lattice as fallback)
+    ref_frac, ref_symbols = pristine_refs.get(supercell_size(cell)) or ideal_reference(cell)
+
+    defect_indices, defect_sites = find_defect_sites(atoms, ref_frac, ref_symbols)
+    if not defect_indices:
+        # pristine: use center atom
+        defect_indices = [len(atoms) // 2]
+
+    bond_lengths, bond_angles = bond_geometry(atoms, defect_indices)
+
+    return {
+        "Defect": d,
+        "Total_atoms": len(atoms),
+        "Cell_x (Å)": round(cell.lengths()[0], 2),
+        "Cell_y (Å)": round(cell.lengths()[1], 2),
+        "Vacuum_z (Å)": round(cell.lengths()[2], 1),
+        "Composition": ", ".join([f"{k}{v}" for k, v in composition.items()]),
+        "Defect_sites": ", ".join(defect_sites) if defect_sites else "none",
+        "⟨Bond length⟩ (Å)": f"{np.mean(bond_lengths):.2f} ± {np.std(bond_lengths):.2f}",
+        "⟨Bond angle⟩ (deg)": f"{np.mean(bond_angles):.1f} ± {np.std(bond_angles):.1f}",
+    }
+
+
+def geometry_table(base=".", n_workers=1):
+    """analyse_structure() for every defect folder with a relaxed structure."""
+    jobs = []
+    for d in sorted(os.listdir(base)):
+        path = os.path.join(base, d)
+        if not os.path.isdir(path):
+            continue
+        struct_file = find_relaxed_structure(path)
+        if struct_file is not None:
+            jobs.append((d, struct_file))
+
+    pristine_refs = load_pristine_references(base)
+    work = partial(analyse_structure, pristine_refs=pristine_refs)
+
+    if n_workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            rows = list(pool.map(work, jobs, chunksize=max(1, len(jobs) // (4 * n_workers))))
+    else:
+        rows = [work(job) for job in jobs]
+
+    return pd.DataFrame(rows)
@@ -0,0 +1,274 @@
+"""
+Profiling hooks for pipeline and analysis stages (standard library only).
+
+Enabled by LREMIT_PROFILE=1 (or a --profile flag that sets it):
+
+    with profile_stage("hBN_5x5_CB_tddft", folder):    # any stage
+        ...
+    python -m lremit2meep.profiling run nanobeam_harminv_2d.py   # any script
+
+Per job, <outdir>/profiles/ receives
+    <job>.prof    cProfile stats (pstats / snakeviz)
+    <job>.folded  sampled call stacks, "frame;frame;... count" (flamegraph.pl, speedscope)
+    <job>.json    wall time, sample count, top functions
+
+    python -m lremit2meep.profiling report [dirs ...]
+
+aggregates every profiles/ folder below the given directories into a
+campaign hotspot report (profile_hotspots.md, profile_hotspots.csv,
+profile_campaign.folded).
+"""
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import argparse
+import threading
+import contextlib
+from collections import Counter
+
+ENV = "LREMIT_PROFILE"             # "1" / "all", or a subset: "cprofile", "sample"
+INTERVAL_ENV = "LREMIT_PROFILE_INTERVAL"
+INTERVAL = 0.005                   # stack sampling period (s)
+PROFILE_DIR = "profiles"
+TOP = 25
+
+_active = []                       # one profiler at a time: nested stages run unprofiled
+
+
+def enabled(kind=None):
+    mode = os.environ.get(ENV, "").lower()
+    if mode in ("", "0", "no", "off"):
+        return False
+    return kind is None or mode in ("1", "all", "yes", "on") or kind in mode.split(",")
+
+
+def rank_suffix():
+    """_r<rank> under MPI (every rank profiles itself), else ''."""
+    for var in ("OMPI_COMM_WORLD_RANK", "PMI_RANK", "SLURM_PROCID"):
+        if var in os.environ and int(os.environ.get("OMPI_COMM_WORLD_SIZE", os.environ.get("PMI_SIZE", 2))) > 1:
+            return f"_r{os.environ[var]}"
+    return ""
+
+
+class StackSampler(threading.Thread):
+    """Samples the call stack of one thread every `interval` seconds into folded-stack counts."""
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def top_functions(stats, n=TOP):
+    """[(function, calls, tottime, cumtime)] sorted by tottime."""
+    rows = [(f"{os.path.basename(f)}:{line}({name})", cc, tt, ct)
+            for (f, line, name), (cc, nc, tt, ct, _) in stats.stats.items()]
+    return sorted(rows, key=lambda r: r[2], reverse=True)[:n]
+
+
+@contextlib.contextmanager
+def profile_stage(name, outdir=".", stage=None):
+    """Profile the enclosed block as job `name` (no-op unless LREMIT_PROFILE is set)."""
+    if not enabled() or _active:
+        yield
+        return
+
+    prof = cProfile.Profile() if enabled("cprofile") else None
+    sampler = None
+    if enabled("sample"):
+        sampler = StackSampler(threading.get_ident(), float(os.environ.get(INTERVAL_ENV, INTERVAL)))
+        sampler.start()
+    _active.append(name)
+    t0 = time.perf_counter()
+    if prof:
+        prof.enable()
+    try:
+        yield
+    finally:
+        if prof:
+            prof.disable()
+        wall = time.perf_counter() - t0
+        if sampler:
+            sampler.stop()
+        _active.pop()
+        write_artifacts(f"{name}{rank_suffix()}", stage or name, outdir, wall, prof, sampler)
+
+
+def write_artifacts(job, stage, outdir, wall, prof, sampler):
+    folder = os.path.join(outdir, PROFILE_DIR)
+    os.makedirs(folder, exist_ok=True)
+    base = os.path.join(folder, job)
+    summary = {"job": job, "stage": stage, "wall_s": wall, "cwd": os.getcwd(), "argv": sys.argv}
+    if prof:
+        prof.dump_stats(f"{base}.prof")
+        summary["top"] = top_functions(pstats.Stats(prof), 10)
+    if sampler:
+        with open(f"{base}.folded", "w") as f:
+            f.writelines(f"{s} {c}\n" for s, c in sampler.stacks.most_common())
+        summary["samples"] = sum(sampler.stacks.values())
+    with open(f"{base}.json", "w") as f:
+        json.dump(summary, f, indent=1)
+    print(f"[profile] {job}: {wall:.2f} s → {folder}/", file=sys.stderr, flush=True)
+
+
+def profiled(name=None):
+    """Decorator form of profile_stage (artifacts in the working directory)."""
+    def wrap(func):
+        def inner(*args, **kwargs):
+            with profile_stage(name or func.__name__):
+                return func(*args, **kwargs)
+        inner.__name__, inner.__doc__ = func.__name__, func.__doc__
+        return inner
+    return wrap
+
+
+def wrap_command(argv, name=None):
+    """[python, script, ...] → the same script run under the profiler when profiling is enabled."""
+    if not enabled():
+        return argv
+    script = argv[1]
+    name = name or os.path.splitext(os.path.basename(script))[0]
+    return [argv[0], os.path.abspath(__file__), "run", "--name", name, script] + list(argv[2:])
+
+
+def run_script(script, args, name=None):
+    """Run a top-level script as __main__ inside profile_stage (for MEEP / plotting scripts)."""
+    import runpy
+
+    os.environ.setdefault(ENV, "1")
+    stem = os.path.splitext(os.path.basename(script))[0]
+    sys.argv = [script] + list(args)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    with profile_stage(name or stem, stage=stem):
+        runpy.run_path(script, run_name="__main__")
+
+
+# ============================================================
+# CAMPAIGN REPORT
+# ============================================================
+def find_artifacts(roots):
+    out = []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            if os.path.basename(dirpath) == PROFILE_DIR:
+                out += [os.path.join(dirpath, f[:-5]) for f in sorted(filenames) if f.endswith(".json")]
+    return out
+
+
+def report(roots, out_prefix="profile_hotspots", top=TOP):
+    jobs = find_artifacts(roots)
+    if not jobs:
+        print("No profile artifacts found.")
+        return None
+
+    stats = None
+    seen_in = Counter()
+    folded = Counter()
+    self_samples = Counter()
+    rows = []
+    for base in jobs:
+        with open(f"{base}.json") as f:
+            summary = json.load(f)
+        rows.append({"job": summary["job"], "stage": summary["stage"], "wall_s": summary["wall_s"],
+                     "samples": summary.get("samples", 0), "path": os.path.dirname(base)})
+        if os.path.exists(f"{base}.prof"):
+            s = pstats.Stats(f"{base}.prof")
+            seen_in.update(s.stats.keys())
+            stats = s if stats is None else stats.add(s)
+        if os.path.exists(f"{base}.folded"):
+            with open(f"{base}.folded") as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    folded[stack] += int(count)
+                    self_samples[stack.rsplit(";", 1)[-1]] += int(count)
+
+    total_wall = sum(r["wall_s"] for r in rows)
+    by_stage = Counter()
+    for r in rows:
+        by_stage[r["stage"]] += r["wall_s"]
+
+    lines = [f"# Profile hotspots ({len(rows)} jobs, {total_wall:.1f} s profiled)", "",
+             "## Wall time by stage", "", "| stage | jobs | wall (s) | share |", "|---|---|---|---|"]
+    for stage, wall in by_stage.most_common():
+        n = sum(r["stage"] == stage for r in rows)
+        lines.append(f"| {stage} | {n} | {wall:.1f} | {wall / total_wall:.1%} |")
+
+    csv_rows = []
+    if stats is not None:
+        total_tt = sum(v[2] for v in stats.stats.values()) or 1.0
+        lines += ["", "## Functions by self time (all jobs)", "",
+                  "| function | calls | self (s) | share | cumulative (s) | jobs |", "|---|---|---|---|---|---|"]
+        for (f, line, name), (cc, nc, tt, ct, _) in sorted(stats.stats.items(), key=lambda kv: kv[1][2],
+                                                           reverse=True)[:top]:
+            label = f"{os.path.basename(f)}:{line}({name})"
+            lines.append(f"| `{label}` | {nc} | {tt:.2f} | {tt / total_tt:.1%} | {ct:.2f} | {seen_in[(f, line, name)]} |")
+            csv_rows.append(f'"{label}",{nc},{tt:.6f},{ct:.6f},{seen_in[(f, line, name)]}')
+
+    if folded:
+        n = sum(folded.values())
+        lines += ["", f"## Sampled hot frames ({n} samples)", "", "| frame | samples | share |", "|---|---|---|"]
+        for frame, c in self_samples.most_common(top):
+            lines.append(f"| `{frame}` | {c} | {c / n:.1%} |")
+        lines += ["", "## Hottest sampled stacks", ""]
+        for stack, c in folded.most_common(5):
+            lines.append(f"- {c / n:.1%}: `{' → '.join(stack.split(';')[-6:])}`")
+        with open("profile_campaign.folded", "w") as f:
+            f.writelines(f"{s} {c}\n" for s, c in folded.most_common())
+
+    n_summary = len(lines)
+    lines += ["", "## Jobs", "", "| job | wall (s) | path |", "|---|---|---|"]
+    for r in sorted(rows, key=lambda r: r["wall_s"], reverse=True):
+        lines.append(f"| {r['job']} | {r['wall_s']:.1f} | {r['path']} |")
+
+    with open(f"{out_prefix}.md", "w") as f:
+        f.write("\n".join(lines) + "\n")
+    with open(f"{out_prefix}.csv", "w") as f:
+        f.write("function,calls,self_s,cumulative_s,jobs\n" + "\n".join(csv_rows) + "\n")
+    print("\n".join(lines[:n_summary]))
+    print(f"\nSaved → {out_prefix}.md, {out_prefix}.csv" + (", profile_campaign.folded" if folded else ""))
+    return rows
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m lremit2meep.profiling", description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = p.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("run", help="run a script under the profiler")
+    s.add_argument("--name", default=None, help="job name (default: script name)")
+    s.add_argument("script")
+    s.add_argument("args", nargs=argparse.REMAINDER)
+    s = sub.add_parser("report", help="campaign hotspot report")
+    s.add_argument("roots", nargs="*", default=["."])
+    s.add_argument("--top", type=int, default=TOP)
+    s.add_argument("--out", default="profile_hotspots", help="output prefix (.md, .csv)")
+    args = p.parse_args(argv)
+
+    if args.command == "run":
+        run_script(args.script, args.args, args.name)
+    else:
+        report(args.roots, args.out, args.top)
+
+
+if __name__ == "__main__":
+    main()
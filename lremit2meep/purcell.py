@@ -0,0 +1,140 @@
+"""
+Purcell spectra of the nanobeam (MEEP CSV output) and their matching to
+the defect ZPLs.
+"""
+import numpy as np
+import pandas as pd
+
+from .spectra import TARGET_NM, zpl_from_transitions
+
+TAU0_NS = 1.0                  # assumed free-space lifetime (ns)
+CLIP_NEGATIVE_FP = True        # Purcell should be >=0 physically; negatives come from numerical noise
+
+
+def load_purcell_csv(path="purcell_spectrum.csv", clip_negative=CLIP_NEGATIVE_FP):
+    """Purcell spectrum as freq_1_per_um, Fp, wavelength_nm (sorted by wavelength)."""
+    pur = pd.read_csv(path)
+
+    # find freq column
+    freq_col = None
+    for c in pur.columns:
+        if "freq" in c.lower():
+            freq_col = c
+            break
+    if freq_col is None:
+        raise RuntimeError(f"Cannot find freq column in {path} columns={pur.columns.tolist()}")
+
+    # find Fp column
+    fp_col = None
+    for c in pur.columns:
+        cl = c.strip().lower()
+        if cl == "fp" or "purcell" in cl:
+            fp_col = c
+            break
+    if fp_col is None:
+        # fallback: any col containing 'fp'
+        for c in pur.columns:
+            if "fp" in c.lower():
+                fp_col = c
+                break
+    if fp_col is None:
+        raise RuntimeError(f"Cannot find Purcell column in {path} columns={pur.columns.tolist()}")
+
+    pur = pur.rename(columns={freq_col: "freq_1_per_um", fp_col: "Fp"}).copy()
+    pur["freq_1_per_um"] = pd.to_numeric(pur["freq_1_per_um"], errors="coerce")
+    pur["Fp"] = pd.to_numeric(pur["Fp"], errors="coerce")
+
+    # wavelength in nm: freq is 1/um => lambda(um)=1/freq => lambda(nm)=1000/freq
+    pur["wavelength_nm"] = 1000.0 / pur["freq_1_per_um"]
+
+    pur = pur.replace([np.inf, -np.inf], np.nan).dropna(subset=["wavelength_nm", "Fp"])
+    pur = pur[pur["wavelength_nm"] > 0].copy()
+
+    if clip_negative:
+        pur.loc[pur["Fp"] < 0, "Fp"] = 0.0
+
+    return pur.sort_values("wavelength_nm").reset_index(drop=True)
+
+
+def fp_at_lambda(pur, lam_nm):
+    """Nearest-neighbour Fp at lam_nm: (Fp, wavelength used)."""
+    idx = int(np.argmin(np.abs(pur["wavelength_nm"].to_numpy() - lam_nm)))
+    return float(pur.iloc[idx]["Fp"]), float(pur.iloc[idx]["wavelength_nm"])
+
+
+def matching_table(df, pur, tau0_ns=TAU0_NS, **zpl_kwargs):
+    """
+    Per defect: ZPL, Fp read at the ZPL wavelength, lifetime shortening
+    τ_cav = τ0/Fp and detuning to the global Purcell peak (sorted by detuning).
+    """
+    idx_peak = int(np.argmax(pur["Fp"].to_numpy()))
+    lam_p = float(pur.iloc[idx_peak]["wavelength_nm"])
+    Fp_max = float(pur.iloc[idx_peak]["Fp"])
+
+    rows = []
+    for mol in sorted(df["Molecule"].unique()):
+        Ezpl, lam_zpl, _ = zpl_from_transitions(df, mol, **zpl_kwargs)
+        Fp_zpl, _ = fp_at_lambda(pur, lam_zpl)
+
+        if Fp_zpl > 0:
+            tau_factor = 1.0 / Fp_zpl         # tau_cav / tau0
+            tau_ns = tau0_ns / Fp_zpl
+        else:
+            tau_factor = np.inf
+            tau_ns = np.inf
+
+        rows.append({
+            "Defect": mol,
+            "ZPL_eV": Ezpl,
+            "ZPL_nm": lam_zpl,
+            "in_560_590": TARGET_NM[0] <= lam_zpl <= TARGET_NM[1],
+            "Fp_at_ZPL": Fp_zpl,
+            "tau_cav_over_tau0": tau_factor,
+            f"tau_cav_ns_assuming_tau0_{tau0_ns}ns": tau_ns,
+            "lambda_p_nm": lam_p,
+            "Fp_max": Fp_max,
+            "delta_lambda_to_peak_nm": abs(lam_zpl - lam_p),
+        })
+
+    return pd.DataFrame(rows).sort_values("delta_lambda_to_peak_nm").reset_index(drop=True)
+
+
+def peak_matching_table(zpl_df, pur):
+    """ZPL table + global Purcell peak (λp, Fp_max) and |Δλ| to it (sorted by |Δλ|)."""
+    idx = int(np.argmax(pur["Fp"].to_numpy()))
+    out = zpl_df.copy()
+    out["lambda_p_nm"] = float(pur.iloc[idx]["wavelength_nm"])
+    out["Fp_max"] = float(pur.iloc[idx]["Fp"])
+    out["Delta_lambda_nm"] = np.abs(out["ZPL_nm"] - out["lambda_p_nm"])
+    return out.sort_values("Delta_lambda_nm")
+
+
+def write_matching_tex(tab, path):
+    """LaTeX table (booktabs) of matching_table()."""
+    def yesno(x): return "Yes" if bool(x) else "No"
+    tex = []
+    tex.append(r"\begin{table}[t]")
+    tex.append(r"\centering")
+    tex.append(r"\caption{ZPL--Purcell matching between defect-induced emitters in h-BN and a 2D nanobeam cavity. "
+               r"$F_p(\lambda_{\mathrm{ZPL}})$ is read from the simulated Purcell spectrum at each ZPL wavelength. "
+               r"Radiative lifetime shortening is estimated as $\tau_{\mathrm{cav}}=\tau_0/F_p$.}")
+    tex.append(r"\label{tab:zpl_purcell}")
+    tex.append(r"\begin{tabular}{lcccccc}")
+    tex.append(r"\toprule")
+    tex.append(r"Defect & ZPL (eV) & ZPL (nm) & 560--590? & $F_p(\lambda_{\mathrm{ZPL}})$ & $\tau_{\mathrm{cav}}/\tau_0$ & $|\Delta\lambda|$ (nm) \\")
+    tex.append(r"\midrule")
+    for _, r in tab.iterrows():
+        defect_tex = r['Defect'].replace('_', r'\\_')
+        tex.append(
+            f"{defect_tex} & "
+            f"{r['ZPL_eV']:.2f} & {r['ZPL_nm']:.1f} & {yesno(r['in_560_590'])} & "
+            f"{r['Fp_at_ZPL']:.2f} & "
+            f"{(r['tau_cav_over_tau0'] if np.isfinite(r['tau_cav_over_tau0']) else 0):.3g} & "
+            f"{r['delta_lambda_to_peak_nm']:.1f} \\\\"
+        )
+    tex.append(r"\bottomrule")
+    tex.append(r"\end{tabular}")
+    tex.append(r"\end{table}")
+
+    with open(path, "w") as f:
+        f.write("\n".join(tex))
@@ -0,0 +1,88 @@
+"""
+Absorption spectra of the defects: Gaussian broadening and ZPL extraction
+from the merged LR-TDDFT table (Molecule, Energy(eV), Osc).
+"""
+import numpy as np
+import pandas as pd
+
+HC = 1239.84193                # eV·nm  (lambda[nm] = HC/E[eV])
+ZPL_WINDOW_EV = (1.0, 4.5)     # where to search for the lowest-energy bright transition
+BRIGHT_THR = 1e-6              # oscillator strength threshold for "bright"
+TARGET_NM = (560.0, 590.0)     # experimental SPE window
+EGRID = np.linspace(0.5, 6.0, 3000)
+SIGMA_EV = 0.10
+
+
+def ev_to_nm(E):
+    return HC / E
+
+
+def gaussian_filter(y, sigma_pts, truncate=4.0):
+    """NumPy equivalent of scipy.ndimage.gaussian_filter1d (mode="reflect") without the scipy import."""
+    r = int(truncate * sigma_pts + 0.5)
+    x = np.arange(-r, r + 1)
+    k = np.exp(-0.5 * (x / sigma_pts) ** 2)
+    return np.convolve(np.pad(y, r, mode="symmetric"), k / k.sum(), mode="valid")
+
+
+def broaden(energies, osc, grid=EGRID, sigma_ev=SIGMA_EV):
+    """Stick spectrum snapped to the (uniform) grid, Gaussian-broadened by sigma_ev."""
+    energies = np.atleast_1d(np.asarray(energies, float))
+    y = np.zeros(len(grid))
+    idx = np.argmin(np.abs(grid[None, :] - energies[:, None]), axis=1)
+    np.add.at(y, idx, np.asarray(osc, float))
+    return gaussian_filter(y, sigma_ev / (grid[1] - grid[0]))
+
+
+def broadened_peak(energies, osc, grid=EGRID, sigma_ev=SIGMA_EV, window=ZPL_WINDOW_EV):
+    """Peak energy of the broadened spectrum inside the window (None if it is empty)."""
+    y = broaden(energies, osc, grid, sigma_ev)
+    if y.max() == 0:
+        return None
+    mask = (grid >= window[0]) & (grid <= window[1])
+    return float(grid[mask][np.argmax(y[mask])])
+
+
+def zpl_from_transitions(df, mol, window=ZPL_WINDOW_EV, bright_thr=BRIGHT_THR):
+    """Lowest-energy bright transition in the window: (E_ZPL eV, λ_ZPL nm, osc)."""
+    g = df[df["Molecule"] == mol].copy()
+    g = g.replace([np.inf, -np.inf], np.nan).dropna(subset=["Energy(eV)", "Osc"])
+
+    gw = g[(g["Energy(eV)"] >= window[0]) & (g["Energy(eV)"] <= window[1])].copy()
+    if len(gw) == 0:
+        gw = g.copy()
+
+    bright = gw[gw["Osc"] > bright_thr].sort_values("Energy(eV)")
+    if len(bright) > 0:
+        Ezpl = float(bright.iloc[0]["Energy(eV)"])
+        Fosc = float(bright.iloc[0]["Osc"])
+    else:
+        # fallback: lowest energy even if dim
+        gw2 = gw.sort_values("Energy(eV)")
+        Ezpl = float(gw2.iloc[0]["Energy(eV)"])
+        Fosc = float(gw2.iloc[0]["Osc"])
+
+    return Ezpl, float(ev_to_nm(Ezpl)), Fosc
+
+
+def zpl_table(df, window=ZPL_WINDOW_EV, bright_thr=BRIGHT_THR):
+    """Defect, ZPL_eV, ZPL_nm, Osc, In_window for every molecule (lowest bright transition)."""
+    rows = []
+    for mol in sorted(df["Molecule"].unique()):
+        Ezpl, lam, osc = zpl_from_transitions(df, mol, window, bright_thr)
+        rows.append({"Defect": mol, "ZPL_eV": Ezpl, "ZPL_nm": lam, "Osc": osc,
+                     "In_window": TARGET_NM[0] <= lam <= TARGET_NM[1]})
+    return pd.DataFrame(rows)
+
+
+def peak_zpl_table(df, sigma_ev=SIGMA_EV, window=ZPL_WINDOW_EV):
+    """Defect, ZPL_eV, ZPL_nm, In_560_590_nm from the broadened-spectrum peak."""
+    rows = []
+    for mol, group in df.groupby("Molecule"):
+        Ezpl = broadened_peak(group["Energy(eV)"], group["Osc"], sigma_ev=sigma_ev, window=window)
+        if Ezpl is None:
+            continue
+        lam = ev_to_nm(Ezpl)
+        rows.append({"Defect": mol, "ZPL_eV": Ezpl, "ZPL_nm": lam,
+                     "In_560_590_nm": TARGET_NM[0] <= lam <= TARGET_NM[1]})
+    return pd.DataFrame(rows)
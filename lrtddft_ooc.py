@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# ============================================================
+# OUT-OF-CORE LR-TDDFT (memory-mapped Omega matrix)
+# - Omega lives in <folder>/<name>_lrtddft/omega.npy (np.memmap),
+#   i.e. the same store layout written by lrtddft_store.py
+# - Filled block by block: KS singles are grouped by their
+#   occupied ("from") band; GPAW builds Omega only for the union of
+#   two groups at a time (restrict={'from': ..., 'to': ...})
+# - Finished blocks are written or recorded at once, so an interrupted
+#   fill resumes (diagonal blocks: diag_<b>.npz until assembled)
+# - Lowest excitations via LOBPCG with streamed row blocks and a
+#   diagonal (KS energy²) preconditioner; dense eigh if it fits
+# ============================================================
+import os
+import json
+import time
+import itertools
+
+import numpy as np
+
+from lrtddft_store import HARTREE_EV, oscillator_strengths
+
+# =========================
+# USER SETTINGS
+# =========================
+MEM_LIMIT_GB = float(os.environ.get("LR_MEM_LIMIT_GB", 8.0))
+DENSE_COPIES = 3          # full matrix + eigh workspace when diagonalizing densely
+LOBPCG_TOL = 1e-8
+LOBPCG_MAXITER = 500
+LOBPCG_BLOCKS = 6         # X, AX, R, AR, P, AP (n x k each)
+GRAM_COPIES = 3           # 3k x 3k Gram matrices and their eigenvectors
+# =========================
+
+
+def max_dense_size(mem_limit_gb=MEM_LIMIT_GB, copies=DENSE_COPIES):
+    """Largest n for which `copies` dense n x n float64 matrices fit."""
+    return int(np.sqrt(mem_limit_gb * 1024**3 / (8.0 * copies)))
+
+
+def band_groups(calc, mem_limit_gb=MEM_LIMIT_GB, eps=1e-3):
+    """
+    Split occupied bands into groups whose pairwise unions stay below the
+    memory limit. Returns (groups of 'from' bands, 'to' bands).
+    """
+    nspins = calc.get_number_of_spins()
+    fmax = 2.0 / nspins
+    occ = np.array([calc.get_occupation_numbers(kpt=0, spin=s) for s in range(nspins)]) / fmax
+
+    from_bands = [int(n) for n in np.where((occ > eps).any(axis=0))[0]]
+    to_bands = [int(n) for n in np.where((occ < 1.0 - eps).any(axis=0))[0]]
+
+    per_band = max(1, nspins * len(to_bands))
+    # A pair of groups is built at once (2g bands); GPAW keeps Omega and a copy
+    g = max(1, max_dense_size(mem_limit_gb, copies=2) // (2 * per_band))
+    groups = [from_bands[k:k + g] for k in range(0, len(from_bands), g)]
+    return groups, to_bands
+
+
+def kss_key(k):
+    return (int(k.i), int(k.j), int(k.pspin))
+
+
+class OutOfCoreOmega:
+    """Omega matrix in a .npy memmap, filled from GPAW block by block."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.state_file = os.path.join(path, "ooc_state.json")
+        self.state = {"groups": None, "done": []}
+        if os.path.exists(self.state_file):
+            with open(self.state_file) as f:
+                self.state = json.load(f)
+
+    def _save_state(self):
+        with open(self.state_file, "w") as f:
+            json.dump(self.state, f)
+
+    def _lr_block(self, calc, from_bands, to_bands, txt):
+        from gpaw.lrtddft import LrTDDFT
+        lr = LrTDDFT(calc, restrict={"from": list(from_bands), "to": list(to_bands)}, txt=txt)
+        kss = getattr(lr.Om, "kss", None) or lr.kss
+        return np.asarray(lr.Om.full), kss
+
+    def fill(self, calc, groups, to_bands, txt=None):
+        """Compute all diagonal and off-diagonal group blocks into the memmap."""
+        if self.state["groups"] not in (None, groups):
+            raise RuntimeError(f"{self.path} was started with different band groups")
+        self.state["groups"] = groups
+
+        # --- diagonal blocks define the global KS ordering ---
+        # each block goes to diag_<b>.npz as soon as it is built (one block
+        # in memory, resumable), then the blocks are copied into the memmap
+        index_file = os.path.join(self.path, "kss_index.npy")
+        if not os.path.exists(index_file):
+            block_files = [os.path.join(self.path, f"diag_{b}.npz") for b in range(len(groups))]
+            for b, g in enumerate(groups):
+                if os.path.exists(block_files[b]):
+                    continue
+                full, kss = self._lr_block(calc, g, to_bands, txt)
+                tmp = f"{block_files[b][:-4]}.tmp.npz"
+                np.savez(tmp, omega=full,
+                         keys=np.array([kss_key(k) for k in kss], dtype=np.int32),
+                         energy=np.array([k.energy for k in kss]),
+                         fij=np.array([k.fij for k in kss]),
+                         me=np.array([np.asarray(k.mur) * np.sqrt(k.fij * k.energy) for k in kss]))
+                os.replace(tmp, block_files[b])
+                del full
+                print(f"    [OOC] diagonal block {b + 1}/{len(groups)}: {len(kss)} KS singles", flush=True)
+
+            sizes = []
+            for f in block_files:
+                with np.load(f) as d:
+                    sizes.append(len(d["keys"]))
+            offsets = np.cumsum([0] + sizes)
+            omega = np.lib.format.open_memmap(os.path.join(self.path, "omega.npy"),
+                                              mode="w+", dtype=np.float64, shape=(int(offsets[-1]),) * 2)
+            parts = {"keys": [], "energy": [], "fij": [], "me": []}
+            for b, f in enumerate(block_files):
+                with np.load(f) as d:
+                    omega[offsets[b]:offsets[b + 1], offsets[b]:offsets[b + 1]] = d["omega"]
+                    for k in parts:
+                        parts[k].append(d[k])
+            omega.flush()
+            del omega
+
+            np.save(os.path.join(self.path, "kss_energy.npy"), np.concatenate(parts["energy"]))
+            np.save(os.path.join(self.path, "kss_fij.npy"), np.concatenate(parts["fij"]))
+            np.save(os.path.join(self.path, "kss_me.npy"), np.concatenate(parts["me"]))
+            np.save(index_file, np.concatenate(parts["keys"]))
+            self.state["offsets"] = [int(o) for o in offsets]
+            self._save_state()
+            for f in block_files:
+                os.remove(f)
+
+        keys = {tuple(k): n for n, k in enumerate(np.load(index_file).tolist())}
+        offsets = self.state["offsets"]
+        omega = np.load(os.path.join(self.path, "omega.npy"), mmap_mode="r+")
+
+        # --- off-diagonal blocks from the union of two groups ---
+        pairs = list(itertools.combinations(range(len(groups)), 2))
+        for a, b in pairs:
+            if [a, b] in self.state["done"]:
+                continue
+            t0 = time.time()
+            full, kss = self._lr_block(calc, groups[a] + groups[b], to_bands, txt)
+            glob = np.array([keys[kss_key(k)] for k in kss])
+            in_a = (glob >= offsets[a]) & (glob < offsets[a + 1])
+            in_b = (glob >= offsets[b]) & (glob < offsets[b + 1])
+
+            block = full[np.ix_(in_a, in_b)]
+            rows, cols = glob[in_a], glob[in_b]
+            omega[np.ix_(rows, cols)] = block
+            omega[np.ix_(cols, rows)] = block.T
+            omega.flush()
+            del full
+
+            self.state["done"].append([a, b])
+            self._save_state()
+            print(f"    [OOC] block ({a},{b}) {len(self.state['done'])}/{len(pairs)} "
+                  f"in {time.time() - t0:.0f} s", flush=True)
+
+        return omega
+
+
+def blocked_operator(omega, mem_limit_gb=MEM_LIMIT_GB):
+    """LinearOperator applying the memmap Omega in row blocks."""
+    from scipy.sparse.linalg import LinearOperator
+
+    n = omega.shape[0]
+    rows = max(1, int(mem_limit_gb * 1024**3 / (4 * 8.0 * n)))
+
+    def matmat(X):
+        X = np.asarray(X).reshape(n, -1)
+        Y = np.empty_like(X)
+        for r0 in range(0, n, rows):
+            Y[r0:r0 + rows] = np.asarray(omega[r0:r0 + rows]) @ X
+        return Y
+
+    return LinearOperator((n, n), matvec=matmat, matmat=matmat, dtype=np.float64)
+
+
+def max_block_size(n, mem_limit_gb=MEM_LIMIT_GB):
+    """
+    Largest LOBPCG block k that fits next to the streamed operator: the
+    X/AX/R/AR/P/AP blocks (n x k each) plus the 3k x 3k Gram matrices.
+    """
+    budget = 0.75 * mem_limit_gb * 1024**3 / 8.0   # blocked_operator streams the other quarter
+    k = int((-LOBPCG_BLOCKS * n + np.sqrt((LOBPCG_BLOCKS * n) ** 2 + 4 * GRAM_COPIES * 9 * budget))
+            / (2 * GRAM_COPIES * 9))
+    return max(1, min(k, n // 5))
+
+
+def lowest_eigenpairs(omega, emax, mem_limit_gb=MEM_LIMIT_GB, k0=32):
+    """
+    Eigenpairs of Omega with excitation energy <= emax (eV).
+    Dense eigh when the matrix fits in memory, otherwise LOBPCG on the
+    memmap with a growing block size until the window is covered or the
+    block reaches max_block_size. Returns (w2, vectors, ceiling_eV,
+    truncated): ceiling_eV < emax when the block cap was hit first.
+    """
+    from scipy.linalg import eigh
+    from scipy.sparse.linalg import LinearOperator, lobpcg
+
+    n = omega.shape[0]
+    w2max = (emax / HARTREE_EV) ** 2
+
+    if n <= max_dense_size(mem_limit_gb):
+        w2, vec = eigh(np.asarray(omega), subset_by_value=(-np.inf, w2max))
+        return w2, vec.T, emax, False
+
+    op = blocked_operator(omega, mem_limit_gb)
+    diag = np.array(np.diagonal(omega))
+
+    def apply_precond(X):
+        X = np.asarray(X)
+        return X / (diag[:, None] if X.ndim == 2 else diag)
+
+    precond = LinearOperator((n, n), matvec=apply_precond, matmat=apply_precond, dtype=np.float64)
+
+    kmax = max_block_size(n, mem_limit_gb)
+    k = min(k0, kmax)
+    vec = np.zeros((n, 0))
+    while True:
+        # Start from the previous eigenvectors, padded with the KS singles
+        # of lowest diagonal entry that they do not already cover
+        X = np.zeros((n, k))
+        X[:, :vec.shape[1]] = vec
+        fresh = np.argsort(diag)[vec.shape[1]:k]
+        X[fresh, np.arange(vec.shape[1], k)] = 1.0
+        w2, vec = lobpcg(op, X, M=precond, largest=False,
+                         tol=LOBPCG_TOL, maxiter=LOBPCG_MAXITER)
+        order = np.argsort(w2)
+        w2, vec = w2[order], vec[:, order]
+        if w2[-1] > w2max or k >= kmax:
+            truncated = bool(w2[-1] <= w2max)
+            ceiling = min(emax, float(np.sqrt(max(w2[-1], 0.0)) * HARTREE_EV)) if truncated else emax
+            if truncated:
+                print(f"    [OOC] block size capped at {k} ({mem_limit_gb:g} GiB): only the lowest "
+                      f"{k} excitations were resolved (up to {ceiling:.2f} eV)", flush=True)
+            keep = w2 <= w2max
+            return w2[keep], vec[:, keep].T, ceiling, truncated
+        k = min(2 * k, kmax)
+
+
+def run_out_of_core(calc, path, struct_name=None, emax=6.0,
+                    mem_limit_gb=MEM_LIMIT_GB, txt=None):
+    """
+    LR-TDDFT with the Omega matrix on disk. Writes the lrtddft_store layout
+    (eigenpairs only up to emax, or up to the resolved ceiling when the
+    LOBPCG block hits the memory cap: meta "emax_eV", "truncated") and
+    returns the store path.
+    """
+    groups, to_bands = band_groups(calc, mem_limit_gb)
+    print(f"    [OOC] {len(groups)} band groups, {len(to_bands)} target bands, "
+          f"limit {mem_limit_gb:.1f} GiB", flush=True)
+
+    ooc = OutOfCoreOmega(path)
+    omega = ooc.fill(calc, groups, to_bands, txt=txt)
+
+    w2, vec, ceiling, truncated = lowest_eigenpairs(omega, emax, mem_limit_gb)
+    me = vec @ np.load(os.path.join(path, "kss_me.npy"))
+
+    np.save(os.path.join(path, "eigenvalues.npy"), w2)
+    np.save(os.path.join(path, "eigenvectors.npy"), vec)
+    np.save(os.path.join(path, "osc.npy"), oscillator_strengths(me))
+
+    meta = {
+        "name": struct_name,
+        "n_kss": int(omega.shape[0]),
+        "n_excitations": int(len(w2)),
+        "energy_unit": "Hartree",
+        "out_of_core": True,
+        "emax_eV": ceiling,
+        "truncated": truncated,
+        "mem_limit_gb": mem_limit_gb,
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=1)
+
+    return path
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# ============================================================
+# LR-TDDFT RESULT STORE
+# - Saves the diagonalized LrTDDFT object as raw .npy arrays:
+#   <folder>/<name>_lrtddft/
+#       omega.npy         Casida Omega matrix (Ha²)
+#       eigenvalues.npy   omega eigenvalues (= excitation energy², Ha²)
+#       eigenvectors.npy  rows = excitations, columns = KS singles
+#       osc.npy           oscillator strengths [avg, x, y, z]
+#       kss_index.npy     KS singles (i, j, spin)
+#       kss_energy.npy    KS pair energies (Ha)
+#       kss_fij.npy       occupation differences
+#       kss_me.npy        weighted dipole matrix elements sqrt(f ε) <i|r|j>
+#       meta.json
+# - Arrays are memory-mapped on load; re-diagonalizing a KS energy
+#   subset reuses the stored Omega matrix (no GPAW needed)
+# ============================================================
+import os
+import json
+import argparse
+
+import numpy as np
+
+HARTREE_EV = 27.2114  # Ha → eV (same factor as run_tddft)
+
+ARRAYS = ["omega", "eigenvalues", "eigenvectors", "osc",
+          "kss_index", "kss_energy", "kss_fij", "kss_me"]
+
+
+def store_path(folder, struct_name):
+    return os.path.join(folder, f"{struct_name}_lrtddft")
+
+
+def oscillator_strengths(me):
+    """[avg, x, y, z] oscillator strengths from transition dipoles (n, 3)."""
+    f_xyz = 2.0 * np.abs(me) ** 2
+    return np.column_stack([f_xyz.mean(axis=1), f_xyz])
+
+
+def save_lrtddft(lr, path, struct_name=None):
+    """Write a diagonalized LrTDDFT object to the store layout."""
+    os.makedirs(path, exist_ok=True)
+
+    om = lr.Om
+    kss = getattr(om, "kss", None) or lr.kss
+    omega = np.asarray(om.full)
+    eigenvalues = np.asarray(om.eigenvalues)
+    eigenvectors = np.asarray(om.eigenvectors)
+
+    # Store eigenvectors as rows regardless of the GPAW version's convention
+    v = eigenvectors[0]
+    if np.linalg.norm(omega @ v - eigenvalues[0] * v) > \
+            np.linalg.norm(omega @ eigenvectors[:, 0] - eigenvalues[0] * eigenvectors[:, 0]):
+        eigenvectors = eigenvectors.T
+
+    kss_index = np.array([[k.i, k.j, k.pspin] for k in kss], dtype=np.int32)
+    kss_energy = np.array([k.energy for k in kss])
+    kss_fij = np.array([k.fij for k in kss])
+    kss_me = np.array([np.asarray(k.mur) * np.sqrt(k.fij * k.energy) for k in kss])
+
+    osc = np.array([np.asarray(exc.get_oscillator_strength()) for exc in lr])
+
+    arrays = {
+        "omega": omega,
+        "eigenvalues": eigenvalues,
+        "eigenvectors": eigenvectors,
+        "osc": osc,
+        "kss_index": kss_index,
+        "kss_energy": kss_energy,
+        "kss_fij": kss_fij,
+        "kss_me": kss_me,
+    }
+    for key, arr in arrays.items():
+        np.save(os.path.join(path, f"{key}.npy"), arr)
+
+    meta = {
+        "name": struct_name,
+        "n_kss": int(len(kss_energy)),
+        "n_excitations": int(len(eigenvalues)),
+        "energy_unit": "Hartree",
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=1)
+
+    return path
+
+
+class LrTDDFTStore:
+    """Lazy, memory-mapped view of a saved LR-TDDFT result."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self._cache = {}
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(os.path.join(path, "meta.json"))
+
+    def __getattr__(self, key):
+        if key not in ARRAYS:
+            raise AttributeError(key)
+        if key not in self._cache:
+            self._cache[key] = np.load(os.path.join(self.path, f"{key}.npy"), mmap_mode="r")
+        return self._cache[key]
+
+    # --------------------------------------------------
+    # Stored (full) solution
+    # --------------------------------------------------
+    def energies_ev(self):
+        return np.sqrt(np.clip(self.eigenvalues, 0, None)) * HARTREE_EV
+
+    def spectrum(self, emax=6.0):
+        """(energies eV, |oscillator strength|) up to emax, as written to *_spectrum.csv."""
+        e = self.energies_ev()
+        keep = e <= emax
+        return e[keep], np.linalg.norm(self.osc[keep], axis=1)
+
+    def transition_character(self, k, top=3, eigenvectors=None, kss=None):
+        """Dominant KS pairs (i, j, spin, weight) of excitation k."""
+        vec = np.asarray((self.eigenvectors if eigenvectors is None else eigenvectors)[k])
+        index = np.asarray(self.kss_index if kss is None else self.kss_index[kss])
+        w = vec ** 2 / np.sum(vec ** 2)
+        order = np.argsort(w)[::-1][:top]
+        return [(int(index[n, 0]), int(index[n, 1]), int(index[n, 2]), float(w[n])) for n in order]
+
+    def polarization(self, k, me=None):
+        """Unit transition-dipole direction of excitation k."""
+        if me is None:
+            me = np.asarray(self.eigenvectors[k]) @ np.asarray(self.kss_me)
+        return np.asarray(me) / (np.linalg.norm(me) + 1e-300)
+
+    # --------------------------------------------------
+    # Re-diagonalization on a KS energy subset
+    # --------------------------------------------------
+    def select_kss(self, kss_emin=None, kss_emax=None):
+        """Indices of KS singles inside [kss_emin, kss_emax] (eV)."""
+        e = np.asarray(self.kss_energy) * HARTREE_EV
+        keep = np.ones(len(e), dtype=bool)
+        if kss_emin is not None:
+            keep &= e >= kss_emin
+        if kss_emax is not None:
+            keep &= e <= kss_emax
+        return np.where(keep)[0]
+
+    def rediagonalize(self, kss_emax=None, kss_emin=None, emax=None):
+        """
+        Diagonalize the stored Omega matrix restricted to KS singles in
+        [kss_emin, kss_emax] eV, keeping only excitations up to emax eV.
+        Returns a dict with energies (eV), eigenvectors, oscillator
+        strengths [avg, x, y, z], transition dipoles and the KS selection.
+        """
+        from scipy.linalg import eigh
+
+        sel = self.select_kss(kss_emin, kss_emax)
+        omega = np.asarray(self.omega[np.ix_(sel, sel)])
+
+        if emax is not None:
+            w2, vec = eigh(omega, subset_by_value=(-np.inf, (emax / HARTREE_EV) ** 2))
+        else:
+            w2, vec = eigh(omega)
+
+        vec = vec.T
+        me = vec @ np.asarray(self.kss_me[sel])
+
+        return {
+            "energies": np.sqrt(np.clip(w2, 0, None)) * HARTREE_EV,
+            "eigenvectors": vec,
+            "osc": oscillator_strengths(me),
+            "me": me,
+            "kss": sel,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description="Re-analyse a saved LR-TDDFT result.")
+    p.add_argument("store", help="<folder>/<name>_lrtddft directory or a defect folder")
+    p.add_argument("--emax", type=float, default=6.0, help="max excitation energy (eV)")
+    p.add_argument("--kss-emax", type=float, default=None, help="restrict KS singles (eV)")
+    p.add_argument("--kss-emin", type=float, default=None, help="restrict KS singles (eV)")
+    p.add_argument("--top", type=int, default=3, help="KS pairs listed per excitation")
+    p.add_argument("--bright", type=float, default=1e-6, help="only list |f| above this")
+    p.add_argument("--csv", default=None, help="write Energy(eV),Osc spectrum here")
+    args = p.parse_args()
+
+    path = args.store
+    if not LrTDDFTStore.exists(path):
+        name = os.path.basename(os.path.normpath(path))
+        path = store_path(path, name)
+    store = LrTDDFTStore(path)
+
+    if args.kss_emax is None and args.kss_emin is None:
+        idx = np.where(store.energies_ev() <= args.emax)[0]
+        energies = store.energies_ev()[idx]
+        osc_norm = np.linalg.norm(store.osc[idx], axis=1)
+        vecs, kss, mes = store.eigenvectors, None, None
+    else:
+        res = store.rediagonalize(args.kss_emax, args.kss_emin, emax=args.emax)
+        idx = np.arange(len(res["energies"]))
+        energies, vecs, kss, mes = res["energies"], res["eigenvectors"], res["kss"], res["me"]
+        osc_norm = np.linalg.norm(res["osc"], axis=1)
+        print(f"Re-diagonalized {len(kss)}/{store.meta['n_kss']} KS singles")
+
+    print(f"\n{'E (eV)':>8} {'|f|':>10}  {'pol (x,y,z)':<20} dominant KS pairs (i→j spin: weight)")
+    for k, e, f in zip(idx, energies, osc_norm):
+        if f < args.bright:
+            continue
+        pol = store.polarization(k, None if mes is None else mes[k])
+        pairs = store.transition_character(k, args.top, vecs, kss)
+        txt = ", ".join(f"{i}→{j} s{s}: {w:.2f}" for i, j, s, w in pairs)
+        print(f"{e:8.3f} {f:10.3e}  ({pol[0]:+.2f},{pol[1]:+.2f},{pol[2]:+.2f})   {txt}")
+
+    if args.csv:
+        np.savetxt(
+            args.csv,
+            np.column_stack([energies, osc_norm]),
+            delimiter=",",
+            header="Energy(eV),Osc",
+            comments="",
+        )
+        print(f"\nSpectrum saved → {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# ============================================================
+# 2D → 3D CALIBRATION OF THE NANOBEAM CAVITY
+# - A few calibration designs run once as a suspended slab
+#   (nanobeam_harminv_3d.py: finite thickness, vertical PML, mirror
+#   symmetries) and a few times in 2D (nanobeam_harminv_2d.py)
+# - Both use Ez sources and probes: the 3D run calibrates the slab mode of
+#   the same family as the 2D model (TM-like, odd in z), not the TE-like
+#   Ey mode of the slab; Q_vert then includes its weaker vertical confinement
+# - Effective index n_eff: the 2D index that reproduces the 3D resonance,
+#   found by secant steps on n_beam (2D runs are cheap)
+# - Out-of-plane loss: 1/Q_vert = 1/Q_3D − 1/Q_2D(n_eff)
+# - n_eff/n and log Q_vert are fitted linearly in FEATURES (constant for
+#   too few designs); leave-one-out errors of λ_3D and Q_3D are reported
+# Use:  NANOBEAM_CALIBRATION=nanobeam_3d_calibration.json python nanobeam_harminv_2d.py
+#       → 2D run at n_eff + cavity_mode_3d_prediction.txt (λ_3D, Q_3D)
+# Outputs:
+#   nanobeam_3d_calibration.csv    per-design 2D/3D results
+#   nanobeam_3d_calibration.json   fitted corrections
+# ============================================================
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from cavity_surrogate import ENV_NAMES, design_key, parse_design
+from lremit2meep.profiling import wrap_command
+
+# =========================
+# USER SETTINGS
+# =========================
+CALIB_JSON = "nanobeam_3d_calibration.json"
+CALIB_CSV = "nanobeam_3d_calibration.csv"
+RUN_DIR = os.path.join("cavity_runs", "calibration_3d")
+THICKNESS = 0.20               # slab thickness (um)
+RES_3D = 40
+RUN_TIME_3D = 300
+RES_2D = 80
+DN_START = -0.10               # second 2D index (n + DN_START) for the first secant step
+SECANT_STEPS = 3               # extra 2D runs at most
+LAM_TOL_NM = 0.5               # stop when the 2D resonance is this close to the 3D one
+Q_VERT_MAX = 1e7               # cap when the 2D and 3D Q agree within noise
+FEATURES = ["w", "r"]          # n_eff/n and log Q_vert are linear in these
+CALIBRATION_DESIGNS = [        # PARAM=VALUE on top of the baseline design
+    [], ["w=0.40"], ["w=0.50"], ["r=0.065"], ["r=0.085"],
+]
+# =========================
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_mode(design, folder, dims, n_beam=None):
+    """Harminv (2D or 3D slab) in its own folder → (freq, Q, lambda_nm); reused if present."""
+    best = os.path.join(folder, "cavity_mode_best.txt")
+    if not os.path.exists(best):
+        os.makedirs(folder, exist_ok=True)
+        env = {k: v for k, v in os.environ.items() if k not in ("NANOBEAM_HOLES", "NANOBEAM_CALIBRATION")}
+        env.update({ENV_NAMES[k]: (str(int(design[k])) if k == "Nholes_each_side" else repr(float(design[k])))
+                    for k in ENV_NAMES})
+        if n_beam is not None:
+            env["NANOBEAM_N_BEAM"] = repr(float(n_beam))
+        if dims == 3:
+            env.update({"NANOBEAM_THICKNESS": repr(float(design["thickness"])),
+                        "NANOBEAM_RESOLUTION": str(RES_3D), "NANOBEAM_RUN_TIME": str(RUN_TIME_3D)})
+        else:
+            env["NANOBEAM_RESOLUTION"] = str(RES_2D)
+        env["NANOBEAM_RESULTS"] = os.devnull     # not surrogate training data
+        script = f"nanobeam_harminv_{dims}d.py"
+        with open(os.path.join(folder, script.replace(".py", ".log")), "w") as log:
+            code = subprocess.run(wrap_command([sys.executable, os.path.join(HERE, script)]), cwd=folder,
+                                  env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+        if code != 0:
+            raise RuntimeError(f"{folder}: {script} failed (see the log there)")
+    freq, Q, lam = np.loadtxt(best, ndmin=1)[:3]
+    return float(freq), float(Q), float(lam)
+
+
+def calibration_point(params, thickness=THICKNESS):
+    """3D run + secant search on the 2D index for one design."""
+    design = dict(parse_design(params), thickness=thickness)
+    n = design["n_beam"]
+    folder = os.path.join(RUN_DIR, f"design_{design_key(design)}")
+
+    _, Q3, lam3 = run_mode(design, os.path.join(folder, f"3d_t{thickness:g}_res{RES_3D}"), dims=3)
+    print(f"  3D: lambda={lam3:.1f} nm  Q={Q3:.1f}", flush=True)
+
+    runs = {}
+    for n2 in (n, round(n + DN_START, 4)):
+        runs[n2] = run_mode(design, os.path.join(folder, f"2d_n{n2:.4f}"), dims=2, n_beam=n2)[1:]
+    for _ in range(SECANT_STEPS):
+        (n1, (_, l1)), (n2, (_, l2)) = sorted(runs.items(), key=lambda kv: abs(kv[1][1] - lam3))[:2]
+        if abs(l1 - lam3) < LAM_TOL_NM or l1 == l2:
+            break
+        n_new = round(n1 + (lam3 - l1) * (n2 - n1) / (l2 - l1), 4)
+        if n_new in runs:
+            break
+        runs[n_new] = run_mode(design, os.path.join(folder, f"2d_n{n_new:.4f}"), dims=2, n_beam=n_new)[1:]
+        print(f"  2D: n={n_new:.4f} → lambda={runs[n_new][1]:.1f} nm", flush=True)
+
+    # local slopes from the two 2D runs closest to the 3D resonance
+    (n1, (Q1, l1)), (n2, (Q2, l2)) = sorted(runs.items(), key=lambda kv: abs(kv[1][1] - lam3))[:2]
+    dlam_dn = (l2 - l1) / (n2 - n1)
+    dlogq_dn = (np.log(Q2) - np.log(Q1)) / (n2 - n1)
+    n_eff = n1 + (lam3 - l1) / dlam_dn
+    Q2_eff = float(np.exp(np.log(Q1) + dlogq_dn * (n_eff - n1)))
+    inv = 1.0 / Q3 - 1.0 / Q2_eff
+    Q_vert = 1.0 / inv if inv > 1.0 / Q_VERT_MAX else Q_VERT_MAX
+
+    return {**{k: design[k] for k in ENV_NAMES}, "thickness": thickness,
+            "lambda_3d_nm": lam3, "Q_3d": Q3, "lambda_2d_nm": runs[n][1], "Q_2d": runs[n][0],
+            "n_eff": n_eff, "Q_2d_at_n_eff": Q2_eff, "Q_vert": Q_vert,
+            "dlambda_dn": dlam_dn, "dlogQ_dn": dlogq_dn, "runs_2d": len(runs)}
+
+
+def features(design, n_coef):
+    return np.array([1.0] + [design[f] for f in FEATURES])[:n_coef]
+
+
+def fit(table):
+    """Least squares for n_eff/n and log Q_vert (intercept only with too few designs)."""
+    n_coef = len(FEATURES) + 1 if len(table) >= len(FEATURES) + 2 else 1
+    X = np.array([features(row, n_coef) for _, row in table.iterrows()])
+    coef_n = np.linalg.lstsq(X, table["n_eff"] / table["n_beam"], rcond=None)[0]
+    coef_q = np.linalg.lstsq(X, np.log(table["Q_vert"]), rcond=None)[0]
+    return {"features": FEATURES[:n_coef - 1], "thickness": float(table["thickness"].iloc[0]),
+            "n_ratio": coef_n.tolist(), "log_Q_vert": coef_q.tolist(), "n_designs": len(table)}
+
+
+def load_calibration(path=CALIB_JSON):
+    with open(path) as f:
+        return json.load(f)
+
+
+def effective_index(design, calib):
+    """(n_eff, Q_vert) of a 2D run standing in for the slab of calib['thickness']."""
+    if abs(design.get("thickness", calib["thickness"]) - calib["thickness"]) > 1e-9:
+        print(f"⚠ calibration is for t={calib['thickness']} um, design has t={design['thickness']} um")
+    x = features(design, len(calib["n_ratio"]))
+    return float(design["n_beam"] * x @ calib["n_ratio"]), float(np.exp(x @ calib["log_Q_vert"]))
+
+
+def leave_one_out(table):
+    """λ_3D, Q_3D of each design predicted from a fit to the others (2D response linearized)."""
+    rows = []
+    for i in range(len(table)):
+        row = table.iloc[i]
+        n_eff, Q_vert = effective_index(row, fit(table.drop(table.index[i])))
+        dn = n_eff - row["n_eff"]
+        lam = row["lambda_3d_nm"] + row["dlambda_dn"] * dn
+        Q2 = row["Q_2d_at_n_eff"] * np.exp(row["dlogQ_dn"] * dn)
+        Q3 = 1.0 / (1.0 / Q2 + 1.0 / Q_vert)
+        rows.append({"lambda_err_nm": lam - row["lambda_3d_nm"], "Q_rel_err": Q3 / row["Q_3d"] - 1})
+    return pd.DataFrame(rows)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Fit 2D effective-index corrections from a few 3D slab runs.")
+    p.add_argument("--designs", nargs="+", default=None, metavar="PARAM=VALUE,...",
+                   help="calibration designs, e.g. w=0.40 r=0.08,w=0.5 ('' = baseline)")
+    p.add_argument("--thickness", type=float, default=THICKNESS, help="slab thickness (um)")
+    p.add_argument("--fit-only", action="store_true", help=f"refit from {CALIB_CSV}")
+    args = p.parse_args()
+
+    if args.fit_only:
+        table = pd.read_csv(CALIB_CSV)
+    else:
+        designs = ([[x for x in d.split(",") if x] for d in args.designs]
+                   if args.designs else CALIBRATION_DESIGNS)
+        rows = []
+        for params in designs:
+            print(f"Calibration design: {' '.join(params) or 'baseline'}", flush=True)
+            rows.append(calibration_point(params, args.thickness))
+        table = pd.DataFrame(rows)
+        table.to_csv(CALIB_CSV, index=False)
+
+    calib = fit(table)
+    with open(CALIB_JSON, "w") as f:
+        json.dump(calib, f, indent=1)
+
+    print(table[["w", "r", "lambda_3d_nm", "Q_3d", "lambda_2d_nm", "Q_2d", "n_eff", "Q_vert"]]
+          .to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    print(f"\nn_eff/n = {calib['n_ratio']}  log Q_vert = {calib['log_Q_vert']}  "
+          f"(features: {', '.join(calib['features']) or 'constant'})")
+    if len(table) >= 2:
+        err = leave_one_out(table)
+        print(f"Leave-one-out: |Δλ| rms {np.sqrt(np.mean(err['lambda_err_nm'] ** 2)):.2f} nm, "
+              f"Q rel. error rms {np.sqrt(np.mean(err['Q_rel_err'] ** 2)):.1%}")
+    print(f"Saved → {CALIB_CSV}, {CALIB_JSON}")
+
+
+if __name__ == "__main__":
+    main()
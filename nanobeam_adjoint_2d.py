@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# ============================================================
+# ADJOINT INVERSE DESIGN OF THE 2D NANOBEAM (target ZPL)
+# - Parameters: position shift and radius of each mirror hole
+#   (mirror-symmetric, holes at ±x_k), bounded through tanh
+# - Holes → smoothed density on an mp.MaterialGrid (autograd mapping)
+# - Objective: LDOS of the Ez emitter at the cavity center at the
+#   target wavelength (∝ emitted power) via meep.adjoint
+# - One forward + one adjoint run per iteration give dLDOS/dρ;
+#   the chain rule to all hole parameters is an autograd VJP
+# - Adam ascent; the final hole list is verified with the existing
+#   Harminv / Purcell scripts (NANOBEAM_HOLES=... in adjoint_check/)
+# Outputs:
+#   nanobeam_adjoint_holes.csv    x(um), r(um) per hole
+#   nanobeam_adjoint_history.csv  LDOS per iteration
+# ============================================================
+import os
+import sys
+import subprocess
+
+import meep as mp
+import meep.adjoint as mpa
+import numpy as np
+from autograd import numpy as npa
+from autograd import tensor_jacobian_product
+
+# =========================
+# USER SETTINGS
+# =========================
+TARGET_NM = 571.6          # C_B ZPL
+N_ITER = 30
+LEARNING_RATE = 0.05       # Adam step in (tanh) parameter space
+DX_MAX = 0.04              # max hole shift (um)
+DR_MAX = 0.03              # max radius change (um)
+R_MIN_WALL = 0.03          # min air-hole distance to the beam edge (um)
+SMOOTH = 0.01              # hole edge smoothing length (um)
+VERIFY = True              # run Harminv + Purcell on the result
+OUT_HOLES = "nanobeam_adjoint_holes.csv"
+OUT_HISTORY = "nanobeam_adjoint_history.csv"
+# =========================
+
+# =========================
+# Units: um (same nanobeam as nanobeam_harminv_2d.py)
+# =========================
+resolution = 80
+dpml = 1.0
+
+n_bg = 1.0
+n_beam = 2.0
+beam_mat = mp.Medium(index=n_beam)
+
+a = 0.25
+r = 0.075
+w = 0.45
+Nholes_each_side = 12
+
+sx = 2*dpml + (2*Nholes_each_side + 6)*a
+sy = 2*dpml + 4.0
+cell = mp.Vector3(sx, sy, 0)
+
+f_target = 1000.0 / TARGET_NM    # 1/um
+dip_pos = mp.Vector3(0.0, 0.0)
+comp = mp.Ez
+
+# =========================
+# Design region: the hole array inside the beam
+# =========================
+design_x = 2 * (Nholes_each_side * a + a / 2)
+design_y = w
+Nx = int(round(design_x * resolution)) + 1
+Ny = int(round(design_y * resolution)) + 1
+
+xs = np.linspace(-design_x / 2, design_x / 2, Nx)
+ys = np.linspace(-design_y / 2, design_y / 2, Ny)
+X, Y = np.meshgrid(xs, ys, indexing="ij")
+
+x0 = a * np.arange(1, Nholes_each_side + 1)     # nominal hole centers (x > 0)
+r_max = min(w / 2 - R_MIN_WALL, r + DR_MAX)
+
+
+def hole_geometry(params):
+    """(x_k, r_k) of the holes on the +x side from the unbounded parameters."""
+    n = Nholes_each_side
+    xk = x0 + DX_MAX * npa.tanh(params[:n])
+    rk = r + DR_MAX * npa.tanh(params[n:])
+    return xk, npa.minimum(rk, r_max)
+
+
+def density(params):
+    """Beam density in [0, 1] on the design grid (flattened, x-major)."""
+    xk, rk = hole_geometry(params)
+    rho = npa.ones(X.shape)
+    for sign in (1.0, -1.0):
+        for k in range(Nholes_each_side):
+            d = npa.sqrt((X - sign * xk[k]) ** 2 + Y ** 2)
+            hole = 1.0 / (1.0 + npa.exp(-(rk[k] - d) / SMOOTH))
+            rho = rho * (1.0 - hole)
+    return rho.flatten()
+
+
+def holes_table(params):
+    xk, rk = hole_geometry(np.asarray(params))
+    x = np.concatenate([-xk[::-1], xk])
+    rr = np.concatenate([rk[::-1], rk])
+    return np.column_stack([x, rr])
+
+
+# =========================
+# Adjoint problem
+# =========================
+design_variables = mp.MaterialGrid(mp.Vector3(Nx, Ny), mp.air, beam_mat, grid_type="U_MEAN")
+design_region = mpa.DesignRegion(
+    design_variables,
+    volume=mp.Volume(center=mp.Vector3(), size=mp.Vector3(design_x, design_y, 0)),
+)
+
+geometry = [
+    mp.Block(material=beam_mat, center=mp.Vector3(0, 0), size=mp.Vector3(mp.inf, w, mp.inf)),
+    mp.Block(material=design_variables, center=design_region.center, size=design_region.size),
+]
+
+sources = [mp.Source(
+    src=mp.GaussianSource(frequency=f_target, fwidth=f_target / 8.0),
+    center=dip_pos,
+    component=comp,
+    amplitude=1.0,
+)]
+
+sim = mp.Simulation(
+    cell_size=cell,
+    boundary_layers=[mp.PML(dpml)],
+    geometry=geometry,
+    sources=sources,
+    default_material=mp.Medium(index=n_bg),
+    resolution=resolution,
+)
+
+ldos = mpa.LDOS(sim)
+
+
+def J(ldos_val):
+    return npa.real(ldos_val)
+
+
+opt = mpa.OptimizationProblem(
+    simulation=sim,
+    objective_functions=[J],
+    objective_arguments=[ldos],
+    design_regions=[design_region],
+    frequencies=[f_target],
+)
+
+
+def verify(holes_csv):
+    """Existing Harminv + Purcell workflow on the optimized holes (in adjoint_check/)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    rundir = os.path.join(os.getcwd(), "adjoint_check")
+    os.makedirs(rundir, exist_ok=True)
+    env = dict(os.environ, NANOBEAM_HOLES=os.path.abspath(holes_csv))
+    for script in ("nanobeam_harminv_2d.py", "nanobeam_purcell_2d.py"):
+        subprocess.run([sys.executable, os.path.join(here, script)], cwd=rundir, env=env, check=True)
+
+    f_mode, Q, lam_nm = np.loadtxt(os.path.join(rundir, "cavity_mode_best.txt"))
+    pur = np.loadtxt(os.path.join(rundir, "purcell_spectrum.csv"), delimiter=",", skiprows=1)
+    lam = 1000.0 / pur[:, 0]
+    order = np.argsort(lam)
+    fp_target = np.interp(TARGET_NM, lam[order], pur[order, 1])
+    print(f"\nVerified: mode {lam_nm:.1f} nm, Q={Q:.1f}; "
+          f"Fp={pur[:, 1].max():.2f} peak, Fp={fp_target:.2f} at {TARGET_NM:.1f} nm")
+
+
+def main():
+    n_par = 2 * Nholes_each_side
+    params = np.zeros(n_par)            # start from the uniform hand design
+    m = np.zeros(n_par)
+    v = np.zeros(n_par)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    history = []
+
+    for it in range(1, N_ITER + 1):
+        f0, dJ_du = opt([density(params)])
+        f0 = float(np.real(np.squeeze(f0)))
+        dJ_du = np.real(np.squeeze(dJ_du))
+
+        # chain rule ρ(params): one VJP through the smoothed hole mapping
+        grad = tensor_jacobian_product(density, 0)(params, dJ_du)
+        history.append((it, f0, np.linalg.norm(grad)))
+        print(f"[adjoint] iter {it:3d}  LDOS={f0:.5e}  |grad|={np.linalg.norm(grad):.3e}", flush=True)
+
+        # Adam ascent
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad ** 2
+        m_hat = m / (1 - beta1 ** it)
+        v_hat = v / (1 - beta2 ** it)
+        params = params + LEARNING_RATE * m_hat / (np.sqrt(v_hat) + eps)
+
+    np.savetxt(OUT_HOLES, holes_table(params), delimiter=",", header="x(um),r(um)", comments="")
+    np.savetxt(OUT_HISTORY, np.array(history), delimiter=",",
+               header="iteration,LDOS,grad_norm", comments="")
+
+    print(f"\nLDOS at {TARGET_NM:.1f} nm: {history[0][1]:.4e} → {history[-1][1]:.4e} "
+          f"(×{history[-1][1] / history[0][1]:.2f})")
+    print(f"Saved → {OUT_HOLES}, {OUT_HISTORY}")
+
+    if VERIFY:
+        verify(OUT_HOLES)
+
+
+if __name__ == "__main__":
+    main()
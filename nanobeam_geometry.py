@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# ============================================================
+# SHARED NANOBEAM GEOMETRY (2D / 3D SLAB) + STRUCTURE CACHE
+# - nanobeam_design(): design parameters (baseline nanobeam, NANOBEAM_*
+#   environment overrides, optional NANOBEAM_HOLES hole list)
+# - dims=2: infinite-height beam, n_beam = effective index (optionally
+#   from the 2D → 3D calibration, NANOBEAM_CALIBRATION)
+# - dims=3: suspended slab of finite thickness, holes through the slab,
+#   PML on all sides (incl. vertical), n_beam = material index
+# - build_geometry(): beam block + air holes (central defect)
+# - slab_symmetries(): x/y/z mirrors of the Ez cavity mode (the 2D
+#   scripts' polarization, TM-like in the slab)
+# - make_simulation(): mp.Simulation whose discretized ε (subpixel
+#   averaged) is dumped once per (geometry, resolution, cell, ranks) to
+#   STRUCTURE_CACHE and loaded by every later run (Harminv, Purcell,
+#   source sweeps) instead of re-voxelizing
+# Usage:  python nanobeam_geometry.py   (list / --clear the cache)
+# ============================================================
+import os
+import json
+import glob
+import hashlib
+import argparse
+
+import meep as mp
+import numpy as np
+
+# =========================
+# USER SETTINGS
+# =========================
+DPML = 1.0
+N_BG = 1.0
+BASELINE = {"a": 0.25, "r": 0.075, "w": 0.45, "Nholes_each_side": 12, "n_beam": 2.0, "resolution": 80,
+            "thickness": 0.20}
+SLAB_3D = {"resolution": 40}   # 3D defaults replacing BASELINE entries (env overrides still apply)
+PAD_3D = 1.0                   # air between the slab and the PML in y and z (3D)
+DIMS = int(os.environ.get("NANOBEAM_DIMS", 2))
+CALIBRATION = os.environ.get("NANOBEAM_CALIBRATION")   # json from nanobeam_3d_calibration.py
+STRUCTURE_CACHE = os.environ.get(
+    "NANOBEAM_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nanobeam_structure_cache"))
+USE_CACHE = os.environ.get("NANOBEAM_NO_CACHE") is None
+# =========================
+
+ENV = {"a": "NANOBEAM_A", "r": "NANOBEAM_R", "w": "NANOBEAM_W",
+       "Nholes_each_side": "NANOBEAM_NHOLES", "n_beam": "NANOBEAM_N_BEAM",
+       "resolution": "NANOBEAM_RESOLUTION", "thickness": "NANOBEAM_THICKNESS"}
+
+
+def nanobeam_design(dims=DIMS):
+    """Baseline design with NANOBEAM_* overrides; holes as (x, r) rows (um)."""
+    design = {"dims": dims}
+    for k, v in dict(BASELINE, **(SLAB_3D if dims == 3 else {})).items():
+        cast = int if isinstance(v, int) else float
+        design[k] = cast(os.environ.get(ENV[k], v))
+
+    # Optional hole list (x(um), r(um) per hole), e.g. nanobeam_adjoint_holes.csv
+    # from nanobeam_adjoint_2d.py; default: uniform holes with a central defect
+    design["holes_file"] = os.environ.get("NANOBEAM_HOLES")
+    if design["holes_file"]:
+        design["holes"] = np.loadtxt(design["holes_file"], delimiter=",", skiprows=1, ndmin=2)
+    else:
+        N, a = design["Nholes_each_side"], design["a"]
+        design["holes"] = np.array([(m * a, design["r"]) for m in range(-N, N + 1) if m != 0])
+
+    # 2D run standing in for the slab: calibrated effective index + out-of-plane loss
+    if dims == 2 and CALIBRATION:
+        from nanobeam_3d_calibration import load_calibration, effective_index
+        design["n_material"] = design["n_beam"]
+        design["n_beam"], design["Q_vert"] = effective_index(design, load_calibration(CALIBRATION))
+    return design
+
+
+def cell_size(design):
+    sx = 2*DPML + (2*design["Nholes_each_side"] + 6)*design["a"]
+    if design["dims"] == 3:
+        return mp.Vector3(sx, 2*DPML + design["w"] + 2*PAD_3D, 2*DPML + design["thickness"] + 2*PAD_3D)
+    sy = 2*DPML + 4.0
+    return mp.Vector3(sx, sy, 0)
+
+
+def build_geometry(design):
+    """Beam block + air holes along x (defect = no hole at x=0)."""
+    height = design["thickness"] if design["dims"] == 3 else mp.inf
+    geometry = [mp.Block(material=mp.Medium(index=design["n_beam"]),
+                         center=mp.Vector3(0, 0),
+                         size=mp.Vector3(mp.inf, design["w"], height))]
+    for x, rh in design["holes"]:
+        geometry.append(mp.Cylinder(radius=rh, height=height, center=mp.Vector3(x, 0), material=mp.air))
+    return geometry
+
+
+def slab_symmetries(design):
+    """
+    Mirror planes of the mode excited by an Ez dipole at the center, the
+    polarization of the 2D scripts (TM-like in the slab): even in x and y,
+    odd in z (Ez normal to the mid-plane). Only valid for mirror-symmetric
+    hole lists and a centered Ez source.
+    """
+    syms = [mp.Mirror(mp.X, phase=+1), mp.Mirror(mp.Y, phase=+1)]
+    if design["dims"] == 3:
+        syms.append(mp.Mirror(mp.Z, phase=-1))
+    return syms
+
+
+def structure_key(design, empty=False, symmetries=()):
+    """Hash of everything that enters the discretized ε (and the chunk layout)."""
+    desc = {
+        "dims": design["dims"],
+        "symmetries": [(s.direction, str(s.phase)) for s in symmetries],
+        "resolution": design["resolution"],
+        "cell": list(cell_size(design)),
+        "dpml": DPML,
+        "n_bg": N_BG,
+        "ranks": mp.count_processors(),
+        "meep": mp.__version__,
+    }
+    if not empty:
+        desc.update(n_beam=design["n_beam"], w=design["w"],
+                    thickness=design["thickness"] if design["dims"] == 3 else None,
+                    holes=np.round(np.asarray(design["holes"], float), 9).tolist())
+    return hashlib.sha1(json.dumps(desc, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def make_simulation(design, sources, empty=False, use_cache=USE_CACHE, symmetries=()):
+    """
+    mp.Simulation of the nanobeam (or the homogeneous reference if empty),
+    initialized from the structure cache when the same ε grid was built before.
+    """
+    geometry = [] if empty else build_geometry(design)
+    kwargs = dict(
+        cell_size=cell_size(design),
+        boundary_layers=[mp.PML(DPML)],     # all directions: vertical PML in 3D
+        geometry=geometry,
+        sources=sources,
+        symmetries=list(symmetries),
+        default_material=mp.Medium(index=N_BG),
+        resolution=design["resolution"],
+    )
+    if not use_cache:
+        return mp.Simulation(**kwargs)
+
+    path = os.path.join(STRUCTURE_CACHE, f"{structure_key(design, empty, symmetries)}.h5")
+    if os.path.exists(path):
+        print(f"Structure cache: loading {path}")
+        return mp.Simulation(load_structure=path, **kwargs)
+
+    sim = mp.Simulation(**kwargs)
+    sim.init_sim()
+    if mp.am_master():
+        os.makedirs(STRUCTURE_CACHE, exist_ok=True)
+    mp.all_wait()
+    tmp = f"{path[:-3]}.tmp.h5"
+    sim.dump_structure(tmp)
+    if mp.am_master():
+        os.replace(tmp, path)     # atomic: concurrent runs never see a partial file
+    print(f"Structure cache: saved {path}")
+    return sim
+
+
+def main():
+    p = argparse.ArgumentParser(description="Nanobeam structure cache.")
+    p.add_argument("--clear", action="store_true", help="delete all cached structures")
+    args = p.parse_args()
+
+    files = sorted(glob.glob(os.path.join(STRUCTURE_CACHE, "*.h5")))
+    size = sum(os.path.getsize(f) for f in files)
+    print(f"{STRUCTURE_CACHE}: {len(files)} structures, {size / 1e6:.1f} MB")
+    if args.clear:
+        for f in files:
+            os.remove(f)
+        print("Cleared.")
+
+
+if __name__ == "__main__":
+    main()
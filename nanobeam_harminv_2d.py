@@ -1,87 +1,128 @@
+import os
+
 import meep as mp
 import numpy as np
 
+from nanobeam_geometry import DPML, nanobeam_design, make_simulation
+from field_export import from_env as field_export
+
 # =========================
 # Units: um
 # =========================
-resolution = 80  # px/um (increase later: 100-150)
-dpml = 1.0
-
-# Background + beam
-n_bg = 1.0                 # air background
-n_beam = 2.0               # e.g., SiN-ish effective index (2D)
-beam_mat = mp.Medium(index=n_beam)
-
-# Nanobeam / PhC parameters (2D)
-a = 0.25                   # lattice period (um) ~ 250 nm
-r = 0.075                  # hole radius (um) ~ 75 nm
-w = 0.45                   # beam width (um) ~ 450 nm
-Nholes_each_side = 12      # total holes = 2*N + (defect region)
-
-# Cell
-sx = 2*dpml + (2*Nholes_each_side + 6)*a
-sy = 2*dpml + 4.0
-cell = mp.Vector3(sx, sy, 0)
-
-# Build geometry: beam block + periodic holes with central defect
-geometry = []
-geometry.append(
-    mp.Block(material=beam_mat,
-             center=mp.Vector3(0, 0),
-             size=mp.Vector3(mp.inf, w, mp.inf))
-)
-
-# Holes along x. Defect = skip hole at x=0
-for m in range(-Nholes_each_side, Nholes_each_side + 1):
-    x = m * a
-    if m == 0:
-        continue  # defect (missing hole)
-    geometry.append(
-        mp.Cylinder(radius=r,
-                    height=mp.inf,
-                    center=mp.Vector3(x, 0),
-                    material=mp.air)
-    )
+# Design: a=0.25, r=0.075, w=0.45, 12 holes per side, n_beam=2.0 (2D, SiN-ish),
+# resolution 80 px/um (increase later: 100-150); NANOBEAM_* overrides are used
+# by cavity_surrogate.py / cavity_multifidelity.py, NANOBEAM_HOLES by
+# nanobeam_adjoint_2d.py. Beam block + periodic holes with central defect.
+design = nanobeam_design(dims=2)
+resolution = design["resolution"]
 
 # =========================
-# Source (broadband pulse)
+# Automatic mode search: wideband run, then a focused run
 # =========================
 # Center frequency guess (1/um). For visible ~ 550–650 nm:
 # lam = 0.55 um => f ~ 1.818 1/um ; lam = 0.65 => f ~ 1.538
 f0_guess = 1.75
 df = 0.6  # wide to find modes
+search_time = 100          # wideband run after the sources (short)
+search_retries = 2         # widen df by 1.5× if nothing is found
+q_min_search = 20.0        # ignore lossy (non-cavity) resonances
+dedupe_tol = 1e-3          # |Δf|/f of modes merged across probes
+focus_q_widths = 20        # focused window = ±focus_q_widths · f/Q (min. focus_min_df)
+focus_min_df = 0.02
+t_eff_per_thickness = 1.25   # out-of-plane mode extent / slab thickness (3D Purcell estimate)
+
+a = design["a"]
+dip_pos = mp.Vector3(0, 0)   # emitter position (mode-volume estimate below)
+
+# Off-center probes + H components catch modes with a node of Ez at the center
+probe_points = [mp.Vector3(0, 0), mp.Vector3(a / 4, 0), mp.Vector3(a / 2, 0), mp.Vector3(a / 3, design["w"] / 5)]
+probe_components = [mp.Ez, mp.Hx, mp.Hy]
+
+
+def make_sources(fcen, fwidth):
+    """Center + off-center Ez dipoles (TE-like in 2D), so anti-symmetric modes are excited too."""
+    return [mp.Source(src=mp.GaussianSource(frequency=fcen, fwidth=fwidth),
+                      center=pos, component=mp.Ez, amplitude=1.0)
+            for pos in (mp.Vector3(0, 0), mp.Vector3(a / 3, 0))]
+
+
+def run_harminv(fcen, fwidth, until_after, fields=False, dft_freqs=None):
+    """
+    One run with all probes; modes merged over probes (duplicates → largest |amp|).
+    dft_freqs: Ez DFT of the interior accumulated over the whole run (pulse + ringdown).
+    Returns (sim, modes, field export or None, DFT or None).
+    """
+    # ε grid from the structure cache when this geometry was built before
+    sim = make_simulation(design, make_sources(fcen, fwidth))
+    hars = [mp.Harminv(c, p, fcen, fwidth) for p in probe_points for c in probe_components]
+    steps = [mp.after_sources(h) for h in hars]
+
+    # NANOBEAM_FIELDS=1: stream ringdown snapshots to cavity_mode_fields.h5 (field_export.py)
+    cell = sim.cell_size
+    interior = mp.Volume(center=mp.Vector3(), size=mp.Vector3(cell.x - 2*DPML, cell.y - 2*DPML))
+    export = field_export(sim, "cavity_mode", interior) if fields else None
+    if export:
+        steps.append(export.step())
+    dft = None
+    if dft_freqs is not None:
+        dft = sim.add_dft_fields([mp.Ez], dft_freqs, where=interior)
+        if export:
+            export.add_dft(dft_freqs)
+    sim.run(*steps, until_after_sources=until_after)
+
+    modes = []
+    for m in sorted((m for h in hars for m in h.modes if m.Q > q_min_search),
+                    key=lambda m: abs(m.amp), reverse=True):
+        if all(abs(m.freq - k.freq) > dedupe_tol * m.freq for k in modes):
+            modes.append(m)
+    return sim, sorted(modes, key=lambda m: m.Q, reverse=True), export, dft
+
+
+# 1) short wideband search (widened if empty)
+width = df
+for attempt in range(search_retries + 1):
+    _, found, _, _ = run_harminv(f0_guess, width, search_time)
+    if found:
+        break
+    print(f"No modes in f0={f0_guess}±{width / 2:.3f}; widening the search window", flush=True)
+    width *= 1.5
+
+if len(found) == 0:
+    raise RuntimeError("No cavity modes found in the wideband search. Check the geometry.")
+
+# 2) focused run around the highest-Q candidate (full ringdown)
+f_focus = found[0].freq
+df_focus = max(2 * focus_q_widths * f_focus / found[0].Q, focus_min_df)
+print(f"Focused search: f={f_focus:.4f} ± {df_focus / 2:.4f} (1/um)", flush=True)
+
+# Run: pulse + ringdown (shorter in coarse screening, see cavity_multifidelity.py).
+# The mode-profile DFT integrates this ringdown: registered before the run at
+# the wideband candidates (found[0] = f_focus), evaluated at the bin nearest
+# the refined mode below (rerun at the refined frequency if none lies within
+# its linewidth)
+run_time = float(os.environ.get("NANOBEAM_RUN_TIME", 400))
+dft_freqs = [m.freq for m in found[:4]]
+sim, modes, fields, dft = run_harminv(f_focus, df_focus, run_time, fields=True, dft_freqs=dft_freqs)
+if len(modes) == 0:
+    modes = found   # fall back to the wideband estimate
 
-src = mp.Source(
-    src=mp.GaussianSource(frequency=f0_guess, fwidth=df),
-    center=mp.Vector3(0, 0),
-    component=mp.Ez,     # TE-like in 2D
-    amplitude=1.0
-)
-
-sim = mp.Simulation(
-    cell_size=cell,
-    boundary_layers=[mp.PML(dpml)],
-    geometry=geometry,
-    sources=[src],
-    default_material=mp.Medium(index=n_bg),
-    resolution=resolution
-)
-
-# Harminv monitor at cavity center
-har = mp.Harminv(mp.Ez, mp.Vector3(0, 0), f0_guess, df)
-
-# Run: pulse + ringdown
-sim.run(mp.after_sources(har), until_after_sources=400)
+# Out-of-plane extent for the 3D estimate (design["thickness"]: the calibrated slab)
+t_eff = t_eff_per_thickness * design["thickness"]   # um
 
-# Print + save the best mode
-modes = sorted(har.modes, key=lambda m: m.Q, reverse=True)
+# Print + save all (merged) modes and the best one
 print("\n=== Harminv Modes (sorted by Q) ===")
 for m in modes[:8]:
     lam_nm = (1.0 / m.freq) * 1000.0
     print(f"freq={m.freq:.6f}  Q={m.Q:.1f}  lambda={lam_nm:.1f} nm  decay={m.decay:.3e}")
 
-if len(modes) == 0:
-    raise RuntimeError("No cavity modes found. Adjust f0_guess/df or geometry.")
+np.savetxt(
+    "cavity_modes.csv",
+    np.array([[m.freq, m.Q, 1000.0 / m.freq, abs(m.amp), stage]
+              for stage, ms in ((2, modes), (1, found)) for m in ms]),
+    delimiter=",",
+    header="freq(1/um),Q,lambda(nm),amp,stage",   # stage 1: wideband search, 2: focused run
+    comments=""
+)
 
 best = modes[0]
 lam_nm = (1.0 / best.freq) * 1000.0
@@ -92,4 +133,75 @@ np.savetxt(
     header="freq(1/um)  Q  lambda(nm)"
 )
 
-print("\nSaved best mode to cavity_mode_best.txt")
\ No newline at end of file
+print("\nSaved best mode to cavity_mode_best.txt")
+
+# 3D prediction (NANOBEAM_CALIBRATION): this run used the calibrated effective index,
+# so λ carries over; the slab adds out-of-plane loss 1/Q_3D = 1/Q_2D + 1/Q_vert
+if "Q_vert" in design:
+    Q_3d = 1.0 / (1.0 / best.Q + 1.0 / design["Q_vert"])
+    print(f"3D prediction: lambda={lam_nm:.1f} nm  Q={Q_3d:.1f}  "
+          f"(n_eff={design['n_beam']:.4f} for n={design['n_material']}, Q_vert={design['Q_vert']:.0f})")
+    np.savetxt(
+        "cavity_mode_3d_prediction.txt",
+        np.array([[best.freq, lam_nm, best.Q, Q_3d, design["n_beam"], design["Q_vert"]]]),
+        header="freq(1/um)  lambda(nm)  Q_2D  Q_3D  n_eff  Q_vert"
+    )
+
+# =========================
+# Mode-volume Purcell estimate (screening; flux runs only for final candidates)
+# =========================
+# DFT of the focused run's ringdown nearest the Harminv frequency → mode profile Ez(x, y)
+cell = sim.cell_size
+interior = mp.Volume(center=mp.Vector3(), size=mp.Vector3(cell.x - 2*DPML, cell.y - 2*DPML))
+if fields:
+    fields.write_dft()
+    fields.close()
+
+i_bin = int(np.argmin(np.abs(np.asarray(dft_freqs) - best.freq)))
+if abs(dft_freqs[i_bin] - best.freq) >= best.freq / best.Q:
+    # the refined mode is none of the wideband candidates: the nearest bin
+    # would be another mode's (or an off-resonance) field
+    print(f"⚠ no DFT bin within the linewidth of f={best.freq:.6f} (nearest {dft_freqs[i_bin]:.6f}); "
+          f"repeating the run for the mode profile", flush=True)
+    dft_freqs, i_bin = [best.freq], 0
+    sim, _, _, dft = run_harminv(f_focus, df_focus, run_time, dft_freqs=dft_freqs)
+Ez = sim.get_dft_array(dft, mp.Ez, i_bin)
+eps = sim.get_array(vol=interior, component=mp.Dielectric)
+xs, ys, _, wts = sim.get_array_metadata(vol=interior)
+nx, ny = (min(p, q) for p, q in zip(Ez.shape, eps.shape))
+Ez, eps, wts = Ez[:nx, :ny], eps[:nx, :ny], np.asarray(wts)[:nx, :ny]
+xs, ys = np.asarray(xs)[:nx], np.asarray(ys)[:ny]
+
+# V = ∫ε|E|² dA / max(ε|E|²)  (2D: area, um²)
+U = eps * np.abs(Ez)**2
+i_max = np.unravel_index(np.argmax(U), U.shape)
+V_2d = float(np.sum(U * wts) / U[i_max])
+n_max = float(np.sqrt(eps[i_max]))
+lam_um = 1.0 / best.freq
+
+# Field enhancement at the emitter: |E(r0)|² / |E(r_max)|²
+i_dip = (np.argmin(np.abs(xs - dip_pos.x)), np.argmin(np.abs(ys - dip_pos.y)))
+eta = float(np.abs(Ez[i_dip])**2 / np.abs(Ez[i_max])**2)
+
+# 2D (line dipole, Ez): Fp = Q/π² · (λ/n)² / V_2D
+# 3D: Fp = 3Q/(4π²) · (λ/n)³ / V, with V = V_2D · t_eff (out-of-plane mode extent)
+Fp_2d = best.Q / np.pi**2 * (lam_um / n_max)**2 / V_2d
+Fp_3d = 3 * best.Q / (4 * np.pi**2) * (lam_um / n_max)**3 / (V_2d * t_eff)
+
+print(f"Mode volume: V_2D={V_2d:.4f} um² = {V_2d / (lam_um / n_max)**2:.3f} (λ/n)², "
+      f"|E(r0)|²/|E_max|²={eta:.3f}")
+print(f"Purcell estimate: Fp_2D={Fp_2d:.2f} (at emitter {Fp_2d * eta:.2f}), "
+      f"Fp_3D={Fp_3d:.2f} (t_eff={t_eff} um)")
+
+np.savetxt(
+    "cavity_mode_purcell_estimate.txt",
+    np.array([[best.freq, best.Q, lam_nm, V_2d, n_max, eta, Fp_2d, Fp_2d * eta, Fp_3d]]),
+    header="freq(1/um)  Q  lambda(nm)  V_2D(um^2)  n_max  field_ratio_r0  Fp_2D  Fp_2D_r0  Fp_3D"
+)
+print("Saved Purcell estimate to cavity_mode_purcell_estimate.txt")
+
+# Training data of the cavity surrogate (explicit hole lists are not parametric,
+# calibrated runs use a derived n_beam)
+if not design["holes_file"] and "Q_vert" not in design:
+    from cavity_surrogate import record_result
+    record_result(design, lambda_nm=lam_nm, Q=best.Q, resolution=resolution)
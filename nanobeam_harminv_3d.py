@@ -0,0 +1,59 @@
+import os
+
+import meep as mp
+import numpy as np
+
+from nanobeam_geometry import nanobeam_design, make_simulation, slab_symmetries
+
+# =========================
+# Units: um
+# =========================
+# Suspended slab (same design/overrides as the 2D scripts): thickness 0.20 um
+# (NANOBEAM_THICKNESS), n_beam = material index, holes through the slab, PML on
+# all six faces, resolution 40 px/um unless NANOBEAM_RESOLUTION is set.
+# Used by nanobeam_3d_calibration.py; too slow for sweeps.
+design = nanobeam_design(dims=3)
+resolution = design["resolution"]
+
+# =========================
+# Mode search: one wideband run (3D is expensive; no focused rerun)
+# =========================
+f0_guess = 1.75
+df = 0.6
+q_min = 20.0
+run_time = float(os.environ.get("NANOBEAM_RUN_TIME", 300))
+
+# Ez dipole at the center, the polarization of the 2D scripts: the calibration
+# compares the same (TM-like) mode family in 2D and 3D. x/y/z mirrors cut the
+# cell to 1/8
+sources = [mp.Source(src=mp.GaussianSource(frequency=f0_guess, fwidth=df),
+                     center=mp.Vector3(), component=mp.Ez)]
+symmetries = slab_symmetries(design)
+
+sim = make_simulation(design, sources, symmetries=symmetries)
+har = mp.Harminv(mp.Ez, mp.Vector3(), f0_guess, df)
+sim.run(mp.after_sources(har), until_after_sources=run_time)
+
+modes = sorted((m for m in har.modes if m.Q > q_min), key=lambda m: m.Q, reverse=True)
+if not modes:
+    raise RuntimeError("No cavity modes found in the 3D run. Check the geometry.")
+
+print("\n=== Harminv Modes, 3D slab (sorted by Q) ===")
+for m in modes[:8]:
+    print(f"freq={m.freq:.6f}  Q={m.Q:.1f}  lambda={1000.0 / m.freq:.1f} nm  decay={m.decay:.3e}")
+
+np.savetxt(
+    "cavity_modes.csv",
+    np.array([[m.freq, m.Q, 1000.0 / m.freq, abs(m.amp), 3] for m in modes]),
+    delimiter=",",
+    header="freq(1/um),Q,lambda(nm),amp,stage",   # stage 3: 3D slab
+    comments=""
+)
+
+best = modes[0]
+np.savetxt(
+    "cavity_mode_best.txt",
+    np.array([[best.freq, best.Q, 1000.0 / best.freq]]),
+    header="freq(1/um)  Q  lambda(nm)"
+)
+print(f"\nSaved best mode to cavity_mode_best.txt (t={design['thickness']} um, res={resolution})")
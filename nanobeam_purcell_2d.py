@@ -1,6 +1,11 @@
+import os
+
 import meep as mp
 import numpy as np
 
+from nanobeam_geometry import nanobeam_design, make_simulation
+from field_export import from_env as field_export
+
 # =========================
 # Load best cavity mode
 # =========================
@@ -12,23 +17,10 @@ lam_nm = float(mode[2])
 print(f"Using cavity mode: f={f_mode:.6f}  Q={Q_mode:.1f}  lambda={lam_nm:.1f} nm")
 
 # =========================
-# Common parameters
+# Common parameters (shared nanobeam design, see nanobeam_geometry.py)
 # =========================
-resolution = 80
-dpml = 1.0
-
-n_bg = 1.0
-n_beam = 2.0
-beam_mat = mp.Medium(index=n_beam)
-
-a = 0.25
-r = 0.075
-w = 0.45
-Nholes_each_side = 12
-
-sx = 2*dpml + (2*Nholes_each_side + 6)*a
-sy = 2*dpml + 4.0
-cell = mp.Vector3(sx, sy, 0)
+design = nanobeam_design(dims=2)
+resolution = design["resolution"]
 
 # Dipole (emitter) placement: near cavity center
 dip_pos = mp.Vector3(0.0, 0.0)   # move later to test position sensitivity
@@ -38,6 +30,9 @@ comp = mp.Ez
 df = f_mode / 8.0
 nfreq = 250
 
+# Field decay for the stop condition (looser in coarse screening)
+decay_tol = float(os.environ.get("NANOBEAM_DECAY", 1e-8))
+
 # Flux box around the dipole/cavity region
 box_half = 1.2  # um (increase if needed)
 
@@ -50,28 +45,32 @@ def build_flux_box(sim):
     ]
     return sim.add_flux(f_mode, df, nfreq, *regions)
 
-def run_power_spectrum(geometry, out_prefix):
-    sim = mp.Simulation(
-        cell_size=cell,
-        boundary_layers=[mp.PML(dpml)],
-        geometry=geometry,
-        sources=[mp.Source(
-            src=mp.GaussianSource(frequency=f_mode, fwidth=df),
-            center=dip_pos,
-            component=comp,
-            amplitude=1.0
-        )],
-        default_material=mp.Medium(index=n_bg),
-        resolution=resolution
-    )
+def run_power_spectrum(empty, out_prefix):
+    sim = make_simulation(design, [mp.Source(
+        src=mp.GaussianSource(frequency=f_mode, fwidth=df),
+        center=dip_pos,
+        component=comp,
+        amplitude=1.0
+    )], empty=empty)
 
     flux = build_flux_box(sim)
 
+    # NANOBEAM_FIELDS=1: emitter-driven fields of the device run (snapshots + DFT at
+    # the cavity mode) streamed to purcell_fields.h5 (field_export.py)
+    fields = None if empty else field_export(sim, "purcell")
+    steps = []
+    if fields:
+        fields.add_dft([f_mode])
+        steps.append(fields.step())
+
     # Important: cavity ringdown can be long if Q is high.
     # This stop condition is safer than a fixed time.
-    sim.run(until_after_sources=mp.stop_when_fields_decayed(
-        50, comp, dip_pos, 1e-8
+    sim.run(*steps, until_after_sources=mp.stop_when_fields_decayed(
+        50, comp, dip_pos, decay_tol
     ))
+    if fields:
+        fields.write_dft()
+        fields.close()
 
     freqs = np.array(mp.get_flux_freqs(flux))
     P = np.array(mp.get_fluxes(flux))
@@ -88,26 +87,12 @@ def run_power_spectrum(geometry, out_prefix):
 # =========================
 # Reference geometry (no cavity): homogeneous background
 # =========================
-freq_ref, P_ref = run_power_spectrum(geometry=[], out_prefix="ref")
+freq_ref, P_ref = run_power_spectrum(empty=True, out_prefix="ref")
 
 # =========================
 # Device geometry: nanobeam PhC cavity
 # =========================
-geometry = []
-geometry.append(
-    mp.Block(material=beam_mat,
-             center=mp.Vector3(0, 0),
-             size=mp.Vector3(mp.inf, w, mp.inf))
-)
-for m in range(-Nholes_each_side, Nholes_each_side + 1):
-    x = m * a
-    if m == 0:
-        continue
-    geometry.append(
-        mp.Cylinder(radius=r, height=mp.inf, center=mp.Vector3(x, 0), material=mp.air)
-    )
-
-freq_dev, P_dev = run_power_spectrum(geometry=geometry, out_prefix="device")
+freq_dev, P_dev = run_power_spectrum(empty=False, out_prefix="device")
 
 # Same grid check
 assert np.allclose(freq_ref, freq_dev)
@@ -130,4 +115,10 @@ lam_peak_nm = (1.0 / f_peak) * 1000.0
 Fp_peak = Fp[idx_peak]
 
 print(f"\nPurcell peak: Fp={Fp_peak:.3f} at f={f_peak:.6f} (lambda={lam_peak_nm:.1f} nm)")
-print("Wrote: ref_power.csv, device_power.csv, purcell_spectrum.csv")
\ No newline at end of file
+print("Wrote: ref_power.csv, device_power.csv, purcell_spectrum.csv")
+
+# Training data of the cavity surrogate (explicit hole lists are not parametric,
+# calibrated runs use a derived n_beam)
+if not design["holes_file"] and "Q_vert" not in design:
+    from cavity_surrogate import record_result
+    record_result(design, lambda_nm=lam_nm, Q=Q_mode, Fp_peak=Fp_peak, resolution=resolution)
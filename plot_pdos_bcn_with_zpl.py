@@ -29,6 +29,9 @@ DEFECTS = [
     "hBN_5x5_VN",
     "hBN_5x5_pristine",
 ]
+# figures.py renders one defect per process: FIGURE_DEFECTS=name1,name2
+if os.environ.get("FIGURE_DEFECTS"):
+    DEFECTS = os.environ["FIGURE_DEFECTS"].split(",")
 
 NPTS  = 2000
 WIDTH = 0.10
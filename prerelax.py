@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# ============================================================
+# CHEAP PRE-RELAXATION + WARM-START CACHE (before LCAO LBFGS)
+# 1) Warm start: displacements of the relaxed neighborhood of a defect
+#    with the same site labels (e.g. "C_B, V_N") are copied onto the
+#    new structure, trying the in-plane rotations/mirrors of the lattice
+# 2) Bond-spring model: harmonic 1st/2nd-shell springs whose rest
+#    lengths are tabulated from our DFT-relaxed structures, keyed by
+#    species and coordination; relaxed with LBFGS (no DFT)
+# Cache:   <workdir>/prerelax_cache.json (updated after each LCAO relax)
+# Check:   python prerelax.py   (leave-one-out RMSD vs. DFT geometry)
+# ============================================================
+import os
+import json
+import fcntl
+
+import numpy as np
+from ase.io import read
+from ase.calculators.calculator import Calculator, all_changes
+from ase.constraints import FixAtoms
+from ase.neighborlist import neighbor_list
+from ase.optimize import LBFGS
+
+from extract_atomic_models import (
+    SITE_TOL, find_relaxed_structure, ideal_reference, match_sites, find_defect_sites,
+)
+
+# =========================
+# USER SETTINGS
+# =========================
+BOND_CUT = 1.9          # first-shell (bonded) cutoff (Å)
+SHELL_CUT = 2.7         # second-shell cutoff (Å); 3rd neighbors sit at 2.89 Å
+K_BOND = 20.0           # 1st-shell spring constant (eV/Å²)
+K_SHELL2 = 5.0          # 2nd-shell spring constant (eV/Å²)
+PRE_FMAX = 0.02         # spring-model convergence (eV/Å)
+PRE_STEPS = 500
+ENV_RADIUS = 5.0        # radius of the cached neighborhood around a defect (Å)
+MATCH_TOL = 0.30        # max offset mismatch when mapping a cached environment (Å)
+MIN_COVERAGE = 0.90     # fraction of cached atoms that must map onto the new structure
+CACHE_FILE = "prerelax_cache.json"
+# =========================
+
+
+# ============================================================
+# SPRING TABLE (rest lengths from relaxed structures)
+# ============================================================
+def coordination(atoms):
+    i = neighbor_list("i", atoms, BOND_CUT, self_interaction=False)
+    return np.bincount(i, minlength=len(atoms))
+
+
+def pair_keys(atoms, i, j, d):
+    """Spring keys (species + coordination of both ends, shell), order-independent."""
+    symbols = atoms.get_chemical_symbols()
+    coord = coordination(atoms)
+    keys = []
+    for a, b, r in zip(i, j, d):
+        shell = 1 if r < BOND_CUT else 2
+        ends = sorted([f"{symbols[a]}{coord[a]}", f"{symbols[b]}{coord[b]}"])
+        keys.append(f"{ends[0]}-{ends[1]}:{shell}")
+    return keys
+
+
+def species_key(key):
+    """Coarse key without coordination, e.g. 'B3-N2:1' → 'B-N:1'."""
+    ends, shell = key.split(":")
+    a, b = sorted(e.rstrip("0123456789") for e in ends.split("-"))
+    return f"{a}-{b}:{shell}"
+
+
+def fit_spring_table(base=".", exclude=()):
+    """Median rest length per spring key over all relaxed structures (except folders in exclude)."""
+    samples = {}
+    for d in sorted(os.listdir(base)):
+        path = os.path.join(base, d)
+        if not os.path.isdir(path) or d in exclude:
+            continue
+        struct_file = find_relaxed_structure(path)
+        if struct_file is None:
+            continue
+        atoms = read(struct_file)
+        i, j, r = neighbor_list("ijd", atoms, SHELL_CUT, self_interaction=False)
+        for key, length in zip(pair_keys(atoms, i, j, r), r):
+            samples.setdefault(key, []).append(length)
+            samples.setdefault(species_key(key), []).append(length)
+    return {k: float(np.median(v)) for k, v in samples.items()}
+
+
+class BondSpringCalculator(Calculator):
+    """Harmonic springs on a fixed 1st/2nd-shell topology."""
+
+    implemented_properties = ["energy", "forces"]
+
+    def __init__(self, atoms, table, **kwargs):
+        Calculator.__init__(self, **kwargs)
+        i, j, S, d = neighbor_list("ijSd", atoms, SHELL_CUT, self_interaction=False)
+        keep = i < j
+        self.i, self.j, self.S = i[keep], j[keep], S[keep]
+
+        keys = pair_keys(atoms, self.i, self.j, d[keep])
+        # fall back to species-only lengths, then to the current distance
+        self.r0 = np.array([table.get(k, table.get(species_key(k), r))
+                            for k, r in zip(keys, d[keep])])
+        self.k = np.where(d[keep] < BOND_CUT, K_BOND, K_SHELL2)
+
+    def calculate(self, atoms=None, properties=("energy",), system_changes=all_changes):
+        Calculator.calculate(self, atoms, properties, system_changes)
+        pos = self.atoms.positions
+        D = pos[self.j] - pos[self.i] + self.S @ np.asarray(self.atoms.cell)
+        r = np.linalg.norm(D, axis=1)
+        dr = r - self.r0
+
+        f = (self.k * dr / r)[:, None] * D
+        forces = np.zeros_like(pos)
+        np.add.at(forces, self.i, f)
+        np.add.at(forces, self.j, -f)
+
+        self.results["energy"] = float(0.5 * np.sum(self.k * dr ** 2))
+        self.results["forces"] = forces
+
+
+# ============================================================
+# LOCAL ENVIRONMENTS (warm-start cache)
+# ============================================================
+def symmetry_ops():
+    """In-plane rotations by 60° steps, with and without a mirror (2x2 matrices)."""
+    ops = []
+    for k in range(6):
+        c, s = np.cos(k * np.pi / 3), np.sin(k * np.pi / 3)
+        R = np.array([[c, -s], [s, c]])
+        ops += [R, R @ np.diag([1.0, -1.0])]
+    return ops
+
+
+
+def environment_frame(atoms):
+    """
+    Site labels of a structure and, for every atom, its ideal-site offset
+    from the defect center and its displacement from that site (Å).
+    Returns (label key, offsets (n, 2), displacements (n, 2), dz (n,)),
+    label key None for a pristine cell.
+    """
+    ref_frac, ref_symbols = ideal_reference(atoms.cell)
+    _, labels = find_defect_sites(atoms, ref_frac, ref_symbols)
+    if not labels:
+        return None, None, None, None
+
+    symbols = np.array(atoms.get_chemical_symbols())
+    frac = atoms.get_scaled_positions(wrap=True)[:, :2]
+    site, dist = match_sites(atoms, ref_frac)
+    on_site = dist < SITE_TOL
+
+    # modified sites: substitutions, vacancies and off-lattice atoms
+    occupied = np.zeros(len(ref_frac), dtype=bool)
+    occupied[site[on_site]] = True
+    modified = np.vstack([ref_frac[site[on_site & (symbols != ref_symbols[site])]],
+                          ref_frac[~occupied], frac[~on_site]])
+    d = modified - modified[0]
+    center = modified[0] + np.mean(d - np.round(d), axis=0)
+
+    cell2 = np.asarray(atoms.cell)[:2, :2]
+    ideal = np.where(on_site[:, None], ref_frac[site], frac)
+    off = ideal - center
+    disp = frac - ideal
+    dz = atoms.positions[:, 2] - np.median(atoms.positions[:, 2])
+    return ", ".join(labels), (off - np.round(off)) @ cell2, (disp - np.round(disp)) @ cell2, dz
+
+
+def local_environment(atoms, radius=ENV_RADIUS):
+    """(label key, [[symbol, off_x, off_y, dx, dy, dz], ...]) within `radius` of the defect."""
+    key, off, disp, dz = environment_frame(atoms)
+    if key is None:
+        return None, []
+    symbols = atoms.get_chemical_symbols()
+    near = np.where(np.linalg.norm(off, axis=1) < radius)[0]
+    return key, [[symbols[a], *map(float, off[a]), *map(float, disp[a]), float(dz[a])] for a in near]
+
+
+def load_cache(workdir="."):
+    path = os.path.join(workdir, CACHE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def add_to_cache(struct_name, atoms, workdir="."):
+    """Store the relaxed neighborhood of a defect (one entry per label key)."""
+    from ase.parallel import world
+
+    key, entries = local_environment(atoms)
+    if key is None or world.rank != 0:
+        return key
+    path = os.path.join(workdir, CACHE_FILE)
+    # read-modify-write under a lock: concurrent pipeline jobs share the cache
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        cache = load_cache(workdir)
+        cache[key] = {"source": struct_name, "entries": entries}
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(cache, f, indent=1)
+        os.replace(f"{path}.tmp", path)
+    return key
+
+
+def warm_start(atoms, cache):
+    """
+    Copy a cached relaxed neighborhood onto `atoms` in place. Returns the
+    indices of the moved atoms (empty if no cached environment matches).
+    """
+    key, off, _, _ = environment_frame(atoms)
+    if key is None or key not in cache:
+        return []
+
+    cached = cache[key]["entries"]
+    c_sym = np.array([e[0] for e in cached])
+    c_off = np.array([e[1:3] for e in cached])
+    c_disp = np.array([e[3:5] for e in cached])
+    c_dz = np.array([e[5] for e in cached])
+    symbols = np.array(atoms.get_chemical_symbols())
+
+    # orientation of the cached environment: the op mapping most atoms
+    best = (0, None, None)
+    for R in symmetry_ops():
+        d = np.linalg.norm((c_off @ R.T)[:, None, :] - off[None, :, :], axis=-1)
+        nearest = np.argmin(d, axis=1)
+        ok = (d[np.arange(len(c_off)), nearest] < MATCH_TOL) & (c_sym == symbols[nearest])
+        if ok.sum() > best[0]:
+            best = (int(ok.sum()), R, np.where(ok, nearest, -1))
+
+    hits, R, nearest = best
+    if hits < MIN_COVERAGE * len(cached):
+        return []
+
+    pos = atoms.get_positions()
+    z0 = np.median(pos[:, 2])
+    ok = nearest >= 0
+    moved = nearest[ok]
+    pos[moved, :2] += c_disp[ok] @ R.T
+    pos[moved, 2] = z0 + c_dz[ok]
+    atoms.set_positions(pos)
+    return [int(a) for a in moved]
+
+
+# ============================================================
+# PRE-RELAXATION
+# ============================================================
+def prerelax(atoms, workdir=".", table=None, cache=None, logfile=None):
+    """
+    Warm start from the cache, then relax the remaining atoms with the
+    bond-spring model. Works in place; returns a short summary dict.
+    """
+    table = fit_spring_table(workdir) if table is None else table
+    cache = load_cache(workdir) if cache is None else cache
+
+    x0 = atoms.get_positions()
+    moved = warm_start(atoms, cache)
+
+    constraints = atoms.constraints
+    if moved:
+        atoms.set_constraint(FixAtoms(indices=moved))
+    calc = atoms.calc
+    atoms.calc = BondSpringCalculator(atoms, table)
+    opt = LBFGS(atoms, logfile=logfile)
+    opt.run(fmax=PRE_FMAX, steps=PRE_STEPS)
+    atoms.set_constraint(constraints)
+    atoms.calc = calc
+
+    shift = np.linalg.norm(atoms.get_positions() - x0, axis=1)
+    return {"warm_started": len(moved), "spring_steps": opt.get_number_of_steps(),
+            "max_shift": float(shift.max())}
+
+
+def main():
+    """
+    Leave-one-out check on the existing defects: RMSD to the DFT geometry,
+    with the spring table and the cache built without the held-out defect.
+    """
+    envs = {}
+    jobs = []
+    for d in sorted(os.listdir(".")):
+        relaxed = find_relaxed_structure(d) if os.path.isdir(d) else None
+        start = os.path.join(d, f"{d}.cif")
+        if relaxed is None or not os.path.exists(start):
+            continue
+        jobs.append((d, start, relaxed))
+        key, entries = local_environment(read(relaxed))
+        if key is not None:
+            envs[d] = (key, entries)
+
+    def rmsd(a, b):
+        d = a.get_scaled_positions() - b.get_scaled_positions()
+        d -= np.round(d)
+        return np.sqrt(np.mean(np.sum((d @ np.asarray(a.cell)) ** 2, axis=1)))
+
+    print(f"{len(jobs)} relaxed defects, {len(envs)} cached environments (each held out in turn)\n")
+    print(f"{'Defect':<20} {'ideal':>8} {'springs':>8} {'cache':>8}   RMSD to DFT (Å)")
+    for name, start, relaxed in jobs:
+        table = fit_spring_table(".", exclude={name})
+        cache = {key: {"source": src, "entries": entries}
+                 for src, (key, entries) in envs.items() if src != name}
+
+        ref = read(relaxed)
+        ideal = read(start)
+        ideal.center(axis=2, vacuum=20.0)
+        ref.positions[:, 2] += np.median(ideal.positions[:, 2]) - np.median(ref.positions[:, 2])
+
+        springs = ideal.copy()
+        prerelax(springs, table=table, cache={})
+
+        cached = ideal.copy()
+        prerelax(cached, table=table, cache=cache)
+
+        print(f"{name:<20} {rmsd(ideal, ref):8.3f} {rmsd(springs, ref):8.3f} {rmsd(cached, ref):8.3f}")
+
+
+if __name__ == "__main__":
+    main()
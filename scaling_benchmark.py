@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# ============================================================
+# MPI SCALING BENCHMARK (tddft_pipeline.py --mpi)
+# - Runs one pipeline stage of one defect for several rank counts:
+#       mpirun -np N gpaw python tddft_pipeline.py --mpi --only <stage>
+#   each in its own bench/np<N>/<defect>/ copy (prerequisites symlinked)
+# - Collects <defect>_timings.json → speedup, parallel efficiency
+# Outputs:
+#   scaling_<defect>_<stage>.csv
+#   scaling_<defect>_<stage>.png
+# ============================================================
+import os
+import json
+import shutil
+import argparse
+import subprocess
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+# =========================
+# USER SETTINGS
+# =========================
+DEFECT = "hBN_5x5_CB"
+STAGE = "fd"                      # lcao | fd | tddft
+NPROCS = [1, 2, 4, 8, 16]
+MPIRUN = "mpirun"
+GPAW_PYTHON = ["gpaw", "python"]
+BENCH_DIR = "bench"
+# =========================
+
+PIPELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tddft_pipeline.py")
+
+# Files a stage needs from the earlier stages
+PREREQUISITES = {
+    "lcao": ["{name}.cif", "{name}.xyz"],
+    "fd": ["{name}.cif", "{name}.xyz", "{name}_lcao.gpw"],
+    "tddft": ["{name}.cif", "{name}.xyz", "{name}_lcao.gpw", "{name}_fd.gpw"],
+}
+
+
+def prepare_rundir(defect, stage, nproc, src_root=".", bench_dir=BENCH_DIR):
+    """bench/np<N>/<defect>/ with the stage inputs symlinked from the project."""
+    root = os.path.abspath(os.path.join(bench_dir, f"np{nproc}"))
+    d = os.path.join(root, defect)
+    if os.path.isdir(d):
+        shutil.rmtree(d)        # stage outputs are cached by name; start clean
+    os.makedirs(d)
+
+    for pattern in PREREQUISITES[stage]:
+        src = os.path.abspath(os.path.join(src_root, defect, pattern.format(name=defect)))
+        if os.path.exists(src):
+            os.symlink(src, os.path.join(d, os.path.basename(src)))
+    return root
+
+
+def run_stage(defect, stage, nproc, workdir):
+    cmd = [MPIRUN, "-np", str(nproc)] + GPAW_PYTHON + [
+        PIPELINE, "--mpi", "--only", stage, "--jobs", defect, "--workdir", workdir]
+    print(" ".join(cmd), flush=True)
+    with open(os.path.join(workdir, "bench.log"), "w") as log:
+        subprocess.run(cmd, check=True, stdout=log, stderr=subprocess.STDOUT)
+
+    with open(os.path.join(workdir, defect, f"{defect}_timings.json")) as f:
+        return json.load(f)[stage]["seconds"]
+
+
+def scaling_table(nprocs, seconds):
+    df = pd.DataFrame({"Ranks": nprocs, "Seconds": seconds}).sort_values("Ranks")
+    t_ref = df["Seconds"].iloc[0] * df["Ranks"].iloc[0]
+    df["Speedup"] = t_ref / df["Seconds"]
+    df["Efficiency"] = df["Speedup"] / df["Ranks"]
+    return df
+
+
+def plot_scaling(df, title, out_png):
+    fig, ax = plt.subplots(1, 2, figsize=(9, 3.6))
+
+    ax[0].loglog(df["Ranks"], df["Speedup"], "o-", label="measured")
+    ax[0].loglog(df["Ranks"], df["Ranks"] / df["Ranks"].iloc[0], "k--", lw=1, label="ideal")
+    ax[0].set_xlabel("MPI ranks")
+    ax[0].set_ylabel("Speedup")
+    ax[0].legend(frameon=False)
+
+    ax[1].semilogx(df["Ranks"], df["Efficiency"], "o-")
+    ax[1].axhline(1.0, color="k", ls="--", lw=1)
+    ax[1].set_ylim(0, 1.1)
+    ax[1].set_xlabel("MPI ranks")
+    ax[1].set_ylabel("Parallel efficiency")
+
+    fig.suptitle(title)
+    fig.tight_layout()
+    fig.savefig(out_png, dpi=300)
+    plt.close(fig)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Strong-scaling benchmark of one pipeline stage.")
+    p.add_argument("--defect", default=DEFECT)
+    p.add_argument("--stage", choices=["lcao", "fd", "tddft"], default=STAGE)
+    p.add_argument("--nprocs", type=int, nargs="+", default=NPROCS)
+    p.add_argument("--bench-dir", default=BENCH_DIR)
+    args = p.parse_args()
+
+    seconds = []
+    for n in args.nprocs:
+        workdir = prepare_rundir(args.defect, args.stage, n, bench_dir=args.bench_dir)
+        t = run_stage(args.defect, args.stage, n, workdir)
+        seconds.append(t)
+        print(f"  {n:4d} ranks: {t:9.1f} s", flush=True)
+
+    df = scaling_table(np.array(args.nprocs), np.array(seconds))
+    out = f"scaling_{args.defect}_{args.stage}"
+    df.to_csv(f"{out}.csv", index=False)
+    plot_scaling(df, f"{args.defect}: {args.stage}", f"{out}.png")
+
+    print(df.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"\nSaved → {out}.csv, {out}.png")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# ============================================================
+# LCAO SCREENING TIER (before FD restart + LR-TDDFT)
+# - Reads the relaxed LCAO ground state (<name>_lcao.gpw)
+# - Finds Kohn–Sham levels inside the host gap (pristine reference)
+# - Scores occupied → empty KS pairs against the target ZPL window
+# - Candidates below SCREEN_MIN_SCORE skip the expensive stages
+# Result per defect: <folder>/<name>_screen.json
+# ============================================================
+import os
+import glob
+import json
+
+import numpy as np
+
+HC = 1239.84193  # eV·nm
+
+# =========================
+# USER SETTINGS
+# =========================
+TARGET_NM = (560.0, 590.0)     # experimental SPE window
+SCISSOR_EV = 0.0               # rigid shift added to KS transition energies
+SCREEN_SIGMA_EV = 0.30         # tolerance of KS pair energies vs. LR-TDDFT
+SCREEN_MIN_SCORE = 0.50        # candidates below this skip FD + LR-TDDFT
+EDGE_MARGIN_EV = 0.10          # levels closer than this to a host band edge are not "in gap"
+ALWAYS_RUN = ("pristine",)     # reference structures are never screened out
+# =========================
+
+
+def target_window_ev():
+    return HC / TARGET_NM[1], HC / TARGET_NM[0]
+
+
+def read_ks_levels(gpw):
+    """Eigenvalues/occupations per spin, Fermi level and magnetic moment."""
+    from gpaw import GPAW
+
+    calc = GPAW(gpw, txt=None)
+    try:
+        nspins = calc.get_number_of_spins()
+        fmax = 2.0 / nspins
+        levels = []
+        for s in range(nspins):
+            eps = np.asarray(calc.get_eigenvalues(kpt=0, spin=s))
+            occ = np.asarray(calc.get_occupation_numbers(kpt=0, spin=s)) / fmax
+            levels.append((eps, occ))
+        fermi = float(np.mean(calc.get_fermi_level()))
+        try:
+            magmom = float(calc.get_magnetic_moment())
+        except Exception:
+            magmom = 0.0
+    finally:
+        try:
+            calc.close()
+        except Exception:
+            pass
+    return levels, fermi, magmom
+
+
+def band_edges(levels):
+    """(VBM, CBM) from half-filling of all spin channels."""
+    occ_e = np.concatenate([eps[occ > 0.5] for eps, occ in levels])
+    emp_e = np.concatenate([eps[occ <= 0.5] for eps, occ in levels])
+    return float(occ_e.max()), float(emp_e.min())
+
+
+def find_host_reference(struct_name, folder):
+    """Host band edges from the screened pristine cell of the same supercell."""
+    prefix = "_".join(struct_name.split("_")[:2])          # e.g. hBN_5x5
+    base = os.path.dirname(os.path.abspath(folder))
+    for fn in glob.glob(os.path.join(base, f"{prefix}_pristine*", "*_screen.json")):
+        with open(fn) as f:
+            ref = json.load(f)
+        return ref["VBM_eV"], ref["CBM_eV"]
+    return None
+
+
+def score_transitions(levels, host, scissor=SCISSOR_EV, sigma=SCREEN_SIGMA_EV):
+    """
+    Score occupied → empty KS pairs (same spin) that involve an in-gap level.
+
+    Each pair scores exp(-d²/2σ²), d being the distance of its (scissored)
+    energy to the target window; the candidate score is the best pair.
+    """
+    e_lo, e_hi = target_window_ev()
+    vbm, cbm = host
+    in_gap = []
+    best = (0.0, None)
+
+    for s, (eps, occ) in enumerate(levels):
+        gap = (eps > vbm + EDGE_MARGIN_EV) & (eps < cbm - EDGE_MARGIN_EV)
+        in_gap += [(s, float(e), float(f)) for e, f in zip(eps[gap], occ[gap])]
+
+        occ_i = np.where(occ > 0.5)[0]
+        emp_a = np.where(occ <= 0.5)[0]
+        if len(occ_i) == 0 or len(emp_a) == 0:
+            continue
+
+        dE = eps[emp_a][None, :] - eps[occ_i][:, None] + scissor
+        involved = gap[occ_i][:, None] | gap[emp_a][None, :]
+        d = np.clip(e_lo - dE, 0, None) + np.clip(dE - e_hi, 0, None)
+        score = np.where(involved, np.exp(-0.5 * (d / sigma) ** 2), 0.0)
+
+        k = np.unravel_index(np.argmax(score), score.shape)
+        if score[k] > best[0]:
+            best = (float(score[k]), (s, int(occ_i[k[0]]), int(emp_a[k[1]]), float(dE[k])))
+
+    return best[0], best[1], in_gap
+
+
+def screen_candidate(struct_name, folder, gpw_lcao, min_score=SCREEN_MIN_SCORE):
+    """Screen one relaxed LCAO ground state; writes and returns <name>_screen.json."""
+    levels, fermi, magmom = read_ks_levels(gpw_lcao)
+    vbm, cbm = band_edges(levels)
+
+    result = {
+        "Defect": struct_name,
+        "VBM_eV": vbm,
+        "CBM_eV": cbm,
+        "KS_gap_eV": cbm - vbm,
+        "Fermi_eV": fermi,
+        "Magnetic_moment": magmom,
+        "In_gap_levels": [],
+        "Best_pair": None,
+        "Score": None,
+        "Min_score": min_score,
+    }
+
+    host = find_host_reference(struct_name, folder)
+    if any(tag in struct_name.lower() for tag in ALWAYS_RUN):
+        passed, reason = True, "reference structure"
+    elif host is None:
+        passed, reason = True, "no pristine host reference; not screened"
+    else:
+        score, pair, in_gap = score_transitions(levels, host)
+        result["In_gap_levels"] = in_gap
+        result["Score"] = score
+        if pair is not None:
+            s, i, a, dE = pair
+            result["Best_pair"] = {"spin": s, "from": i, "to": a, "dE_eV": dE}
+
+        passed = score >= min_score
+        if not in_gap:
+            reason = "no Kohn–Sham levels inside the host gap"
+        elif pair is None:
+            reason = "no occupied → empty pair involving an in-gap level"
+        elif passed:
+            reason = f"score {score:.2f} (KS {pair[1]}→{pair[2]} at {pair[3]:.2f} eV)"
+        else:
+            reason = (f"score {score:.2f} < {min_score:.2f}: closest KS pair "
+                      f"{pair[1]}→{pair[2]} at {pair[3]:.2f} eV, target "
+                      f"{target_window_ev()[0]:.2f}–{target_window_ev()[1]:.2f} eV")
+
+    result["Passed"] = passed
+    result["Reason"] = reason
+
+    # paropen: only the master rank writes when run under MPI
+    from ase.parallel import paropen
+    with paropen(os.path.join(folder, f"{struct_name}_screen.json"), "w") as f:
+        json.dump(result, f, indent=1)
+
+    return result
+
+
+def main():
+    import pandas as pd
+
+    jobs = []
+    for gpw in sorted(glob.glob(os.path.join(".", "*", "*_lcao.gpw"))):
+        folder = os.path.dirname(gpw)
+        name = os.path.basename(gpw).replace("_lcao.gpw", "")
+        jobs.append((name, folder, gpw))
+
+    # Pristine first: its band edges are the host reference for the others
+    jobs.sort(key=lambda j: not any(tag in j[0].lower() for tag in ALWAYS_RUN))
+
+    rows = []
+    for name, folder, gpw in jobs:
+        r = screen_candidate(name, folder, gpw)
+        rows.append({k: r[k] for k in ["Defect", "KS_gap_eV", "Magnetic_moment", "Score", "Passed", "Reason"]})
+        print(f"{'✔' if r['Passed'] else '⏭'} {name}: {r['Reason']}")
+
+    df = pd.DataFrame(rows)
+    df.to_csv("screening_summary.csv", index=False)
+    print(f"\n{int(df['Passed'].sum()) if len(df) else 0}/{len(df)} candidates pass → screening_summary.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# ============================================================
+# EMITTER–CAVITY SPECTRAL OVERLAP (all defects × all cavity designs)
+# - Emission lineshape per defect on a common wavelength grid:
+#   Lorentzian ZPL (FWHM ZPL_FWHM_NM, weight DEBYE_WALLER) + Gaussian
+#   phonon sideband PSB_SHIFT_EV below the ZPL (weight 1 − DW), or a
+#   computed <defect>_lineshape.csv if present; normalized over all λ,
+#   so weight outside the grid is lost, not moved into it
+# - Defects whose ZPL lies outside LAM_RANGE_NM are skipped (listed)
+# - Fp_eff = ∫ L(λ) Fp(λ) dλ for every pair as one matrix product
+#   (defects × grid) @ (grid × cavities)
+# - Best cavity detuning within ±MAX_SHIFT_NM for every pair from an
+#   FFT cross-correlation (batched over cavities)
+# Outputs:
+#   spectral_overlap.csv          Fp at ZPL, Fp_eff, lifetime, best shift
+#   spectral_overlap_matrix.png   Fp_eff heatmap
+# ============================================================
+import os
+import glob
+import argparse
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from zpl_purcell_table_and_tolerance import HC, TAU0_NS, load_purcell_csv, zpl_from_transitions
+
+# =========================
+# USER SETTINGS
+# =========================
+SPECTRA_CSV = "all_spectra_merged.csv"
+ZPL_CSV = None                          # optional table with Defect, ZPL_eV
+CAVITY_GLOB = "purcell_spectrum*.csv"   # one file per cavity design
+LINESHAPE_GLOBS = ("*_lineshape.csv",   # optional computed lineshapes (wavelength_nm, intensity),
+                   os.path.join("*", "*_lineshape.csv"))   # e.g. huang_rhys.py: <defect>/<defect>_lineshape.csv
+LAM_RANGE_NM = (400.0, 1000.0)
+DLAM_NM = 0.05
+ZPL_FWHM_NM = 3.0              # experimental ZPL linewidth (PLD h-BN)
+DEBYE_WALLER = 0.8             # fraction of emission in the ZPL
+PSB_SHIFT_EV = 0.165           # phonon sideband center below the ZPL (h-BN optical phonons)
+PSB_SIGMA_EV = 0.05
+FP_OUTSIDE = 0.0               # Fp outside a computed Purcell spectrum
+MAX_SHIFT_NM = 20.0            # cavity tuning range for the best-detuning search
+DEFECT_BATCH = 32              # FFT batches (defects × cavities × FFT length in memory)
+CAVITY_BATCH = 16
+OUT_CSV = "spectral_overlap.csv"
+OUT_PNG = "spectral_overlap_matrix.png"
+# =========================
+
+
+def wavelength_grid():
+    return np.arange(LAM_RANGE_NM[0], LAM_RANGE_NM[1] + DLAM_NM / 2, DLAM_NM)
+
+
+def model_lineshapes(zpl_ev, lam):
+    """ZPL Lorentzian + PSB Gaussian (in energy) per defect, unit area over all λ: (n_def, n_grid)."""
+    E = HC / lam[None, :]
+    lam_zpl = HC / zpl_ev[:, None]
+    hw = ZPL_FWHM_NM / 2
+    zpl = hw / np.pi / ((lam[None, :] - lam_zpl) ** 2 + hw ** 2)
+    # normalized in energy; |dE/dλ| = E²/hc
+    psb = (np.exp(-0.5 * ((E - (zpl_ev[:, None] - PSB_SHIFT_EV)) / PSB_SIGMA_EV) ** 2)
+           / (PSB_SIGMA_EV * np.sqrt(2 * np.pi)) * E ** 2 / HC)
+    return DEBYE_WALLER * zpl + (1 - DEBYE_WALLER) * psb
+
+
+def load_lineshapes(defects, zpl_ev, lam):
+    """Model lineshapes, replaced by <defect>_lineshape.csv where one exists."""
+    L = model_lineshapes(zpl_ev, lam)
+    files = {os.path.basename(f).replace("_lineshape.csv", ""): f
+             for pattern in LINESHAPE_GLOBS for f in glob.glob(pattern)}
+    for d, mol in enumerate(defects):
+        if mol in files:
+            ls = pd.read_csv(files[mol]).sort_values("wavelength_nm")
+            x, y = ls["wavelength_nm"].to_numpy(), ls["intensity"].to_numpy()
+            area = np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2)      # over the file's own range
+            if area > 0:
+                L[d] = np.interp(lam, x, y, left=0.0, right=0.0) / area
+    return L
+
+
+def load_cavities(files, lam):
+    """Purcell spectra interpolated on the grid: (n_cav, n_grid)."""
+    F = np.empty((len(files), len(lam)))
+    for c, path in enumerate(files):
+        pur = load_purcell_csv(path)
+        F[c] = np.interp(lam, pur["wavelength_nm"], pur["Fp"], left=FP_OUTSIDE, right=FP_OUTSIDE)
+    return F
+
+
+def overlap_matrix(L, F):
+    """Fp_eff[d, c] = ∫ L_d(λ) Fp_c(λ) dλ."""
+    return L @ F.T * DLAM_NM
+
+
+def best_detuning(L, F, max_shift_nm=MAX_SHIFT_NM):
+    """
+    max over cavity shifts |s| ≤ max_shift of ∫ L_d(λ) Fp_c(λ − s) dλ and the shift (nm, > 0: red).
+    FFT cross-correlation, batched over defects and cavities.
+    """
+    n = L.shape[1]
+    nfft = 1 << int(np.ceil(np.log2(2 * n)))
+    k_max = int(round(max_shift_nm / DLAM_NM))
+    shifts = np.r_[0:k_max + 1, -k_max:0]            # circular index order
+    lf = np.fft.rfft(L, nfft)                         # (n_def, nfft/2+1)
+    ff = np.conj(np.fft.rfft(F, nfft))                # (n_cav, nfft/2+1)
+
+    best = np.empty((L.shape[0], F.shape[0]))
+    shift = np.empty_like(best)
+    for d0 in range(0, L.shape[0], DEFECT_BATCH):
+        for c0 in range(0, F.shape[0], CAVITY_BATCH):
+            d, c = slice(d0, d0 + DEFECT_BATCH), slice(c0, c0 + CAVITY_BATCH)
+            corr = np.fft.irfft(lf[d, None, :] * ff[None, c, :], nfft)[..., shifts] * DLAM_NM
+            k = np.argmax(corr, axis=-1)
+            best[d, c] = np.take_along_axis(corr, k[..., None], -1)[..., 0]
+            shift[d, c] = shifts[k] * DLAM_NM
+    return best, shift
+
+
+def main():
+    p = argparse.ArgumentParser(description="Emission lineshape × Purcell spectrum overlap matrix.")
+    p.add_argument("--cavities", nargs="+", default=None, help=f"Purcell CSVs (default: {CAVITY_GLOB})")
+    p.add_argument("--zpl-csv", default=ZPL_CSV, help="Defect, ZPL_eV table instead of the spectra")
+    p.add_argument("--max-shift", type=float, default=MAX_SHIFT_NM, help="nm")
+    args = p.parse_args()
+
+    if args.zpl_csv:
+        tab = pd.read_csv(args.zpl_csv).sort_values("Defect")
+        defects = tab["Defect"].tolist()
+        zpl = tab["ZPL_eV"].to_numpy(dtype=float)
+    else:
+        df = pd.read_csv(SPECTRA_CSV)
+        defects = sorted(df["Molecule"].unique())
+        zpl = np.array([zpl_from_transitions(df, mol)[0] for mol in defects])
+
+    lam_zpl = HC / zpl
+    inside = np.isfinite(lam_zpl) & (lam_zpl >= LAM_RANGE_NM[0]) & (lam_zpl <= LAM_RANGE_NM[1])
+    if not inside.all():
+        print("Skipped (ZPL outside {:.0f}–{:.0f} nm): ".format(*LAM_RANGE_NM)
+              + ", ".join(f"{m} ({l:.0f} nm)" for m, l, ok in zip(defects, lam_zpl, inside) if not ok))
+    defects = [m for m, ok in zip(defects, inside) if ok]
+    zpl = zpl[inside]
+
+    files = args.cavities or sorted(glob.glob(CAVITY_GLOB))
+    cavities = [os.path.splitext(os.path.basename(f))[0] for f in files]
+    lam = wavelength_grid()
+
+    L = load_lineshapes(defects, zpl, lam)
+    F = load_cavities(files, lam)
+    fp_eff = overlap_matrix(L, F)
+    fp_best, shift = best_detuning(L, F, args.max_shift)
+    fp_zpl = np.stack([np.interp(HC / zpl, lam, f, left=FP_OUTSIDE, right=FP_OUTSIDE) for f in F], axis=1)
+
+    rows = []
+    for d, mol in enumerate(defects):
+        for c, cav in enumerate(cavities):
+            tau = 1.0 / fp_eff[d, c] if fp_eff[d, c] > 0 else np.inf
+            rows.append({
+                "Defect": mol,
+                "Cavity": cav,
+                "ZPL_nm": HC / zpl[d],
+                "Fp_at_ZPL": fp_zpl[d, c],
+                "Fp_eff": fp_eff[d, c],
+                "tau_cav_over_tau0": tau,
+                f"tau_cav_ns_assuming_tau0_{TAU0_NS}ns": TAU0_NS * tau,
+                "Fp_eff_best_shift": fp_best[d, c],
+                "Best_shift_nm": shift[d, c],
+            })
+    out = pd.DataFrame(rows).sort_values("Fp_eff", ascending=False)
+    out.to_csv(OUT_CSV, index=False)
+
+    fig, ax = plt.subplots(figsize=(1.2 + 0.9 * len(cavities), 0.8 + 0.45 * len(defects)))
+    im = ax.imshow(fp_eff, aspect="auto", cmap="viridis")
+    ax.set_xticks(range(len(cavities)), cavities, rotation=45, ha="right", fontsize=8)
+    ax.set_yticks(range(len(defects)), defects, fontsize=8)
+    fig.colorbar(im, ax=ax, label=r"$F_{p,\mathrm{eff}}$")
+    fig.tight_layout()
+    fig.savefig(OUT_PNG, dpi=300)
+    plt.close(fig)
+
+    print(out.head(20).to_string(index=False, float_format=lambda v: f"{v:.3g}"))
+    print(f"\n{len(defects)} defects × {len(cavities)} cavities; saved → {OUT_CSV}, {OUT_PNG}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,91 +1,27 @@
-import numpy as np
 import pandas as pd
-from scipy.ndimage import gaussian_filter1d
+
+from lremit2meep.spectra import peak_zpl_table
+from lremit2meep.purcell import load_purcell_csv, peak_matching_table
 
 # ==========================
 # Constants
 # ==========================
-HC = 1239.84193  # eV·nm
 SIGMA_EV = 0.10
 EMIN, EMAX = 1.0, 4.5
 
-def eV_to_nm(E):
-    return HC / E
-
 # ==========================
-# Load TDDFT ZPL data
+# ZPL = peak of the broadened TDDFT spectrum in [EMIN, EMAX]
 # ==========================
 df = pd.read_csv("all_spectra_merged.csv")
-
-Egrid = np.linspace(0.5, 6.0, 3000)
-dE = Egrid[1] - Egrid[0]
-sigma_pts = SIGMA_EV / dE
-
-zpl_rows = []
-
-for defect, group in df.groupby("Molecule"):
-    y = np.zeros_like(Egrid)
-
-    for E, f in zip(group["Energy(eV)"], group["Osc"]):
-        idx = np.argmin(np.abs(Egrid - E))
-        y[idx] += f
-
-    y = gaussian_filter1d(y, sigma_pts)
-
-    if y.max() == 0:
-        continue
-
-    y /= y.max()
-
-    mask = (Egrid >= EMIN) & (Egrid <= EMAX)
-    idx = np.argmax(y[mask])
-
-    Ezpl = Egrid[mask][idx]
-    lam_zpl = eV_to_nm(Ezpl)
-
-    zpl_rows.append({
-        "Defect": defect,
-        "ZPL_eV": Ezpl,
-        "ZPL_nm": lam_zpl,
-        "In_560_590_nm": 560 <= lam_zpl <= 590
-    })
-
-zpl_df = pd.DataFrame(zpl_rows)
+zpl_df = peak_zpl_table(df, sigma_ev=SIGMA_EV, window=(EMIN, EMAX))
 
 # ==========================
-# Load Purcell spectrum
+# Merge with the Purcell peak (frequency 1/µm → wavelength nm)
 # ==========================
-purcell = pd.read_csv("purcell_spectrum.csv")
-
-# ---- Detect frequency column robustly
-freq_col = None
-for c in purcell.columns:
-    if "freq" in c.lower():
-        freq_col = c
-        break
-
-if freq_col is None:
-    raise RuntimeError(f"Cannot identify frequency column in purcell_spectrum.csv. Columns = {purcell.columns.tolist()}")
-
-# Convert frequency (1/µm) → wavelength (nm)
-freq_um = purcell[freq_col].values
-lambda_nm = 1000.0 / freq_um
-
-Fp = purcell["Fp"].values
-
-# Peak Purcell mode
-idx_max = np.argmax(Fp)
-Fp_max = Fp[idx_max]
-lambda_p = lambda_nm[idx_max]
-
-# ==========================
-# Merge ZPL–Purcell table
-# ==========================
-zpl_df["lambda_p_nm"] = lambda_p
-zpl_df["Fp_max"] = Fp_max
-zpl_df["Delta_lambda_nm"] = np.abs(zpl_df["ZPL_nm"] - lambda_p)
-
-zpl_df = zpl_df.sort_values("Delta_lambda_nm")
+purcell = load_purcell_csv("purcell_spectrum.csv")
+zpl_df = peak_matching_table(zpl_df, purcell)
+lambda_p = zpl_df["lambda_p_nm"].iloc[0]
+Fp_max = zpl_df["Fp_max"].iloc[0]
 
 # ==========================
 # Save outputs
@@ -0,0 +1,671 @@
+#!/usr/bin/env python3
+# ============================================================
+# TDDFT PIPELINE (DEFECT-FOLDER AWARE)
+# LCAO → FD → LR-TDDFT
+# - Recursively scans defect folders
+# - Prefers CIF inputs, falls back to XYZ
+# - Saves outputs inside each defect folder
+# - Recommends: symmetry="off" for slabs, spinpol for vacancy-like defects
+# - Serial by default (local machine); MPI mode for one large defect:
+#       mpirun -np 16 gpaw python tddft_pipeline.py --mpi
+#   ground state: spin × band × domain decomposition
+#   LR-TDDFT:     electron–hole pairs distributed over rank groups
+#   outputs:      written by rank 0 only
+# Author: Dennis Wayo — Nov 2025 (clean upgraded version)
+# ============================================================
+import os
+import sys
+
+# MPI mode must be known before gpaw is imported
+MPI_MODE = "--mpi" in sys.argv or int(os.environ.get(
+    "OMPI_COMM_WORLD_SIZE", os.environ.get("PMI_SIZE", "1"))) > 1
+
+if not MPI_MODE:
+    os.environ["GPAW_MPI"] = "no"   # MUST be set before importing gpaw
+os.environ["OMP_NUM_THREADS"] = "1"
+os.environ["OPENBLAS_NUM_THREADS"] = "1"
+os.environ["MKL_NUM_THREADS"] = "1"
+
+import glob
+import json
+import time
+import argparse
+import warnings
+import logging
+
+import numpy as np
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from scipy.ndimage import gaussian_filter1d
+
+from ase.io import read, write
+from ase.optimize import LBFGS
+
+from gpaw import GPAW, FermiDirac
+from gpaw.lrtddft import LrTDDFT
+
+from screen_defects import screen_candidate, SCREEN_MIN_SCORE, ALWAYS_RUN
+from lrtddft_store import LrTDDFTStore, save_lrtddft, store_path
+from lrtddft_ooc import run_out_of_core
+from prerelax import prerelax, add_to_cache
+from rt_tddft import run_rt_tddft
+from catalogue import update as update_catalogue
+from lremit2meep.profiling import ENV as PROFILE_ENV, profile_stage
+
+warnings.filterwarnings("ignore")
+
+# ============================================================
+# RANKS: single rank (serial) or GPAW's MPI world
+# ============================================================
+if MPI_MODE:
+    from gpaw.mpi import world
+    rank = world.rank
+    size = world.size
+else:
+    world = None
+    rank = 0
+    size = 1
+
+# ------------------------------------------------------------
+# MPI PARALLELIZATION (ignored in serial mode)
+# - BAND_GROUPS: band parallelization of the FD ground state
+#   (LCAO supports domain decomposition only)
+# - LR_DOMAIN:   ranks sharing one domain-decomposed ground state
+#   in LR-TDDFT; the remaining factor distributes KS transitions
+# ------------------------------------------------------------
+BAND_GROUPS = int(os.environ.get("GPAW_BAND_GROUPS", 1))
+LR_DOMAIN = int(os.environ.get("LR_DOMAIN", 1))
+SCALAPACK = os.environ.get("GPAW_SCALAPACK", "0") == "1"
+
+# ------------------------------------------------------------
+# PRE-RELAXATION (before the LCAO LBFGS)
+# - warm start from relaxed neighborhoods of already computed defects
+#   + bond-spring model fitted to the relaxed structures (prerelax.py)
+# ------------------------------------------------------------
+PRERELAX = True
+
+# ------------------------------------------------------------
+# LCAO SCREENING TIER
+# - candidates whose in-gap KS levels cannot give a transition in
+#   the 560–590 nm window skip FD restart + LR-TDDFT
+# ------------------------------------------------------------
+SCREENING = True
+
+# ------------------------------------------------------------
+# OUT-OF-CORE LR-TDDFT
+# - Omega matrix in a memory-mapped file, built and diagonalized
+#   in blocks so that memory stays under LR_MEM_LIMIT_GB
+#   (use for 7×7 and larger supercells)
+# ------------------------------------------------------------
+OUT_OF_CORE = False
+LR_MEM_LIMIT_GB = 8.0
+
+# ------------------------------------------------------------
+# SPECTRUM BACKEND
+# - "lr":   FD restart + Casida LR-TDDFT (reference, 8+ h at 50 atoms)
+# - "rt":   real-time LCAO-TDDFT from the LCAO ground state (rt_tddft.py)
+# - "auto": "rt" from RT_MIN_ATOMS atoms on (9×9 cells and larger)
+# - BACKEND_OVERRIDES: per job, e.g. {"hBN_9x9_C-VN": "lr"}
+# ------------------------------------------------------------
+SPECTRUM_BACKEND = "lr"
+RT_MIN_ATOMS = 150
+BACKEND_OVERRIDES = {}
+
+# ------------------------------------------------------------
+# RESULTS CATALOGUE
+# - each finished job's folder is indexed in catalogue.sqlite (catalogue.py)
+# ------------------------------------------------------------
+CATALOGUE = True
+
+# ------------------------------------------------------------
+# WORKDIR (AUTO-DETECT PROJECT DIR)
+# ------------------------------------------------------------
+try:
+    WORKDIR = os.path.dirname(os.path.abspath(__file__))  # .py
+except NameError:
+    WORKDIR = os.getcwd()  # Jupyter
+
+logger = logging.getLogger("serial")
+
+
+def say(msg):
+    """Print from rank 0 only."""
+    if rank == 0:
+        print(msg, flush=True)
+
+
+# ------------------------------------------------------------
+# LOGGING SETUP (single log file, rank 0)
+# ------------------------------------------------------------
+def setup_logger(logdir, filename="serial.log") -> logging.Logger:
+    if logger.handlers:
+        return logger
+
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if rank != 0:
+        logger.addHandler(logging.NullHandler())
+        return logger
+
+    os.makedirs(logdir, exist_ok=True)
+    fh = logging.FileHandler(os.path.join(logdir, filename), mode="w")
+    fmt = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    fh.setFormatter(fmt)
+    logger.addHandler(fh)
+    return logger
+
+
+# ============================================================
+# DEFECT FOLDER SCAN
+# - Looks for folders that contain one structure file:
+#   <folder>/<folder>.cif (preferred) or <folder>/<folder>.xyz
+# ============================================================
+def find_defect_jobs(base_dir: str):
+    jobs = []
+    # candidate folders: anything in WORKDIR that is a directory
+    for d in sorted(glob.glob(os.path.join(base_dir, "*"))):
+        if not os.path.isdir(d):
+            continue
+        name = os.path.basename(d)
+
+        cif = os.path.join(d, f"{name}.cif")
+        xyz = os.path.join(d, f"{name}.xyz")
+
+        if os.path.exists(cif):
+            jobs.append((name, d, cif))
+        elif os.path.exists(xyz):
+            jobs.append((name, d, xyz))
+
+    return jobs
+
+
+# ------------------------------------------------------------
+# Spin rules (recommended)
+# - vacancies and C–VN often need spin polarization
+# ------------------------------------------------------------
+def needs_spinpol(struct_name: str) -> bool:
+    key = struct_name.lower()
+    # You can expand this rule if you add more defect types later
+    return any(tag in key for tag in ["_vn", "_vb", "c-vn"])
+
+
+# ------------------------------------------------------------
+# Parallelization keywords
+# ------------------------------------------------------------
+def gs_parallel(mode: str, spinpol: bool) -> dict:
+    """GPAW `parallel` settings for the ground state on `size` ranks."""
+    if size == 1:
+        return {}
+
+    par = {}
+    ranks = size
+    if spinpol and ranks % 2 == 0:
+        par["kpt"] = 2                   # Γ-only: distribute the two spin channels
+        ranks //= 2
+    if mode == "fd" and BAND_GROUPS > 1 and ranks % BAND_GROUPS == 0:
+        par["band"] = BAND_GROUPS
+        ranks //= BAND_GROUPS
+    par["domain"] = ranks
+    if SCALAPACK:
+        par["sl_auto"] = True
+    return par
+
+
+def lr_communicators():
+    """
+    Split the world into LR_DOMAIN-sized domain groups and the orthogonal
+    electron–hole communicator. Returns (domain comm, eh comm).
+    """
+    if size == 1:
+        return None, None
+
+    dd = LR_DOMAIN if size % LR_DOMAIN == 0 else 1
+    dd_comm = eh_comm = None
+    for g in range(size // dd):
+        comm = world.new_communicator(np.arange(g * dd, (g + 1) * dd))
+        if comm is not None:
+            dd_comm = comm
+    for r in range(dd):
+        comm = world.new_communicator(np.arange(r, size, dd))
+        if comm is not None:
+            eh_comm = comm
+    return dd_comm, eh_comm
+
+
+# ============================================================
+# 1 — LCAO RELAXATION
+# ============================================================
+def relax_lcao(struct_name: str, folder: str, inpath: str) -> str:
+    out_gpw = os.path.join(folder, f"{struct_name}_lcao.gpw")
+
+    if os.path.exists(out_gpw):
+        say(f"✔ Cached LCAO: {out_gpw}")
+        return out_gpw
+
+    say(f"LCAO → {struct_name}")
+
+    atoms = read(inpath)
+    atoms.center(axis=2, vacuum=20.0)
+
+    base = os.path.dirname(os.path.abspath(folder))
+    if PRERELAX:
+        info = prerelax(atoms, base, logfile=os.path.join(folder, f"{struct_name}_prerelax.log")
+                        if rank == 0 else None)
+        say(f"    [prerelax] warm-started {info['warm_started']} atoms, "
+            f"{info['spring_steps']} spring steps, max shift {info['max_shift']:.3f} Å")
+
+    spinpol = needs_spinpol(struct_name)
+    calc = GPAW(
+        mode="lcao",
+        basis="dzp",
+        xc="PBE",
+        occupations=FermiDirac(0.05),
+        kpts=(1, 1, 1),
+        symmetry="off",
+        spinpol=spinpol,
+        parallel=gs_parallel("lcao", spinpol),
+        txt=os.path.join(folder, f"{struct_name}_lcao.log"),
+    )
+
+    atoms.calc = calc
+    opt = LBFGS(atoms, logfile=os.path.join(folder, f"{struct_name}_opt.log"))
+    opt.run(fmax=0.10, steps=200)
+
+    calc.write(out_gpw, mode="all")
+
+    # ase.io.write only writes on the master rank
+    write(os.path.join(folder, f"{struct_name}_relaxed.xyz"), atoms)
+    write(os.path.join(folder, f"{struct_name}_relaxed.cif"), atoms)
+
+    # relaxed neighborhood → warm start for similar defects
+    add_to_cache(struct_name, atoms, base)
+
+    return out_gpw
+
+
+# ============================================================
+# 2 — FD RESTART
+# ============================================================
+def fd_restart(struct_name: str, folder: str, gpw_lcao: str,
+               virt_buffer: int = 10) -> str:
+
+    out_fd = os.path.join(folder, f"{struct_name}_fd.gpw")
+
+    if os.path.exists(out_fd):
+        say(f"✔ Cached FD: {out_fd}")
+        return out_fd
+
+    say(f"FD restart → {struct_name}")
+
+    lcao = GPAW(gpw_lcao, txt=None)
+    n_e = lcao.get_number_of_electrons()
+    nbands = int((n_e // 2) + virt_buffer)
+
+    spinpol = needs_spinpol(struct_name)
+    calc = GPAW(
+        gpw_lcao,
+        mode="fd",
+        h=0.25,
+        xc="PBE",
+        nbands=nbands,
+        occupations=FermiDirac(0.1),
+        symmetry="off",
+        spinpol=spinpol,
+        convergence={"density": 5e-3, "energy": 5e-3},
+        parallel=gs_parallel("fd", spinpol),
+        txt=os.path.join(folder, f"{struct_name}_fd.log"),
+    )
+
+    calc.get_potential_energy()
+    calc.write(out_fd, mode="all")
+
+    return out_fd
+
+
+# ============================================================
+# 3 — LR-TDDFT
+# ============================================================
+def run_tddft(struct_name: str, folder: str, gpw_fd: str,
+              emax=6.0, sigma=0.1):
+
+    csv = os.path.join(folder, f"{struct_name}_spectrum.csv")
+    png = os.path.join(folder, f"{struct_name}_spectrum.png")
+    tlog = os.path.join(folder, f"{struct_name}_lrtddft.log")
+
+    if os.path.exists(csv) and os.path.exists(png):
+        say(f"✔ Cached TDDFT: {struct_name}")
+        return csv, png
+
+    # --------------------------------------------------
+    # Saved LR-TDDFT result: rebuild the spectrum without recomputing
+    # --------------------------------------------------
+    store = store_path(folder, struct_name)
+    # out-of-core stores hold eigenpairs only up to their own emax, or up to
+    # a lower ceiling when LOBPCG hit the memory cap ("truncated")
+    meta = LrTDDFTStore(store).meta if LrTDDFTStore.exists(store) else None
+    reuse = False
+    if meta is not None:
+        store_emax = meta.get("emax_eV", np.inf)
+        capped = meta.get("truncated", False) and meta.get("mem_limit_gb", 0.0) >= LR_MEM_LIMIT_GB
+        if store_emax >= emax:
+            reuse = True
+        elif capped:
+            say(f"⚠ LR-TDDFT store {store} is truncated at {store_emax:.2f} eV < emax={emax} eV "
+                f"by LR_MEM_LIMIT_GB={LR_MEM_LIMIT_GB}; reusing it (raise the limit to extend)")
+            reuse = True
+        else:
+            say(f"⚠ LR-TDDFT store {store} covers only {store_emax} eV < emax={emax} eV; recomputing")
+    if reuse:
+        say(f"✔ Cached LR-TDDFT store: {store}")
+        energies, osc = LrTDDFTStore(store).spectrum(emax)
+    else:
+        say(f"TDDFT → {struct_name}")
+
+        # --------------------------------------------------
+        # Ensure TDDFT log file is writable (macOS-safe)
+        # --------------------------------------------------
+        if rank == 0:
+            with open(tlog, "w") as f:
+                f.write(f"LR-TDDFT log for {struct_name}\n")
+
+        # --------------------------------------------------
+        # Reopen ground state (one copy per domain group in MPI mode)
+        # --------------------------------------------------
+        dd_comm, eh_comm = lr_communicators()
+        if dd_comm is None:
+            calc = GPAW(gpw_fd)
+        else:
+            calc = GPAW(gpw_fd, communicator=dd_comm,
+                        parallel={"domain": dd_comm.size}, txt=None)
+
+        nk = len(calc.wfs.kd.bzk_kc)
+        say(f"    [TDDFT check] len(bzk_kc) = {nk}")
+        if nk != 1:
+            raise RuntimeError("LR-TDDFT requires Γ-only ground state")
+
+        if OUT_OF_CORE:
+            # --------------------------------------------------
+            # OUT-OF-CORE LR-TDDFT (memmap Omega, lowest excitations)
+            # --------------------------------------------------
+            if size > 1:
+                raise RuntimeError("OUT_OF_CORE is a single-rank mode")
+            with open(tlog, "a") as ftxt:
+                run_out_of_core(calc, store, struct_name, emax=emax,
+                                mem_limit_gb=LR_MEM_LIMIT_GB, txt=ftxt)
+            meta = LrTDDFTStore(store).meta
+            if meta.get("truncated"):
+                say(f"⚠ OOC LR-TDDFT resolved excitations only up to {meta['emax_eV']:.2f} eV "
+                    f"< emax={emax} eV (LR_MEM_LIMIT_GB={LR_MEM_LIMIT_GB})")
+            energies, osc = LrTDDFTStore(store).spectrum(emax)
+        else:
+            # --------------------------------------------------
+            # LEGACY-COMPATIBLE LR-TDDFT
+            # (transitions distributed over eh_comm in MPI mode)
+            # --------------------------------------------------
+            if eh_comm is None:
+                lr = LrTDDFT(calc, txt=tlog)
+            else:
+                lr = LrTDDFT(calc, txt=tlog if rank == 0 else None, eh_comm=eh_comm)
+            lr.diagonalize()
+
+            # Keep Omega, KS singles, eigenvectors and oscillator vectors
+            if rank == 0:
+                save_lrtddft(lr, store, struct_name)
+
+            # --------------------------------------------------
+            # Extract spectrum
+            # --------------------------------------------------
+            energies, osc = [], []
+            for exc in lr:
+                e_ev = exc.get_energy() * 27.2114  # Ha → eV
+                if e_ev <= emax:
+                    energies.append(e_ev)
+                    osc.append(np.linalg.norm(exc.get_oscillator_strength()))
+
+            energies = np.array(energies)
+            osc = np.array(osc)
+
+    write_spectrum(struct_name, energies, osc, csv, png, emax, sigma, backend="lr")
+    return csv, png
+
+
+# ============================================================
+# 3b — REAL-TIME LCAO-TDDFT (alternative backend)
+# ============================================================
+def run_rt_spectrum(struct_name: str, folder: str, gpw_lcao: str,
+                    emax=6.0, sigma=0.1):
+
+    csv = os.path.join(folder, f"{struct_name}_spectrum.csv")
+    png = os.path.join(folder, f"{struct_name}_spectrum.png")
+
+    if os.path.exists(csv) and os.path.exists(png):
+        say(f"✔ Cached TDDFT: {struct_name}")
+        return csv, png
+
+    say(f"RT-TDDFT → {struct_name}")
+    energies, osc = run_rt_tddft(
+        struct_name, folder, gpw_lcao, emax=emax,
+        txt=os.path.join(folder, f"{struct_name}_rt.log"),
+        parallel=gs_parallel("lcao", needs_spinpol(struct_name)),
+    )
+
+    write_spectrum(struct_name, energies, osc, csv, png, emax, sigma, backend="rt")
+    return csv, png
+
+
+def spectrum_backend(struct_name: str, inpath: str, backend=None) -> str:
+    """'lr' or 'rt' for one job (override > CLI/SPECTRUM_BACKEND > auto by size)."""
+    backend = BACKEND_OVERRIDES.get(struct_name, backend or SPECTRUM_BACKEND)
+    if backend == "auto":
+        backend = "rt" if len(read(inpath)) >= RT_MIN_ATOMS else "lr"
+    return backend
+
+
+def write_spectrum(struct_name, energies, osc, csv, png, emax=6.0, sigma=0.1, backend="lr"):
+    """Energy(eV),Osc table + broadened plot (rank 0); the backend goes to <name>_timings.json."""
+    if rank != 0:
+        return
+    record_timing(struct_name, os.path.dirname(csv), "spectrum", None, backend=backend)
+
+    np.savetxt(
+        csv,
+        np.column_stack([energies, osc]),
+        delimiter=",",
+        header="Energy(eV),Osc",
+        comments="",
+    )
+
+    # --------------------------------------------------
+    # Plot spectrum
+    # --------------------------------------------------
+    x = np.linspace(0.0, emax, 2000)
+    y = np.zeros_like(x)
+    for e, f in zip(energies, osc):
+        y[np.argmin(np.abs(x - e))] += f
+    y = gaussian_filter1d(y, sigma * 80)
+
+    plt.figure()
+    plt.plot(x, y)
+    plt.scatter(energies, osc, s=10)
+    plt.xlabel("Energy (eV)")
+    plt.ylabel("Oscillator Strength")
+    plt.title(struct_name)
+    plt.tight_layout()
+    plt.savefig(png, dpi=300)
+    plt.close()
+
+
+# ============================================================
+# STAGE TIMINGS (<folder>/<name>_timings.json, rank 0)
+# ============================================================
+def record_timing(struct_name: str, folder: str, stage: str, seconds: float, **entry):
+    """timings[stage] = {"seconds", "ranks"}; entry alone (no seconds) for non-timing records."""
+    if rank != 0:
+        return
+    path = os.path.join(folder, f"{struct_name}_timings.json")
+    timings = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            timings = json.load(f)
+    timings[stage] = entry if seconds is None else {"seconds": seconds, "ranks": size, **entry}
+    with open(path, "w") as f:
+        json.dump(timings, f, indent=1)
+
+
+def timed_stage(struct_name, folder, stage, output, func, *args):
+    """Run one stage; time it only if its output did not exist yet (profiled if LREMIT_PROFILE is set)."""
+    fresh = not os.path.exists(output)
+    t0 = time.time()
+    with profile_stage(f"{struct_name}_{stage}", folder, stage=stage):
+        result = func(*args)
+    if fresh:
+        record_timing(struct_name, folder, stage, time.time() - t0)
+    return result
+
+
+def merge_spectra(workdir):
+    merged_csv = os.path.join(workdir, "all_spectra_merged.csv")
+    spectra_files = sorted(glob.glob(os.path.join(workdir, "*", "*_spectrum.csv")))
+
+    # written to a temporary file and renamed: concurrent pipeline jobs on the
+    # same workdir never leave a half-written merge behind
+    tmp = f"{merged_csv}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fout:
+        fout.write("Molecule,Energy(eV),Osc\n")
+        for fcsv in spectra_files:
+            mol = os.path.basename(fcsv).replace("_spectrum.csv", "")
+            try:
+                data = np.loadtxt(fcsv, delimiter=",", skiprows=1)
+                if data.ndim == 1:
+                    data = data[None, :]
+                for E, F in data:
+                    fout.write(f"{mol},{E:.6f},{F:.6f}\n")
+            except Exception as e:
+                print(f"Could not merge {fcsv}: {e}")
+    os.replace(tmp, merged_csv)
+
+    return merged_csv
+
+
+# ============================================================
+# PIPELINE
+# ============================================================
+def main(argv=None):
+    p = argparse.ArgumentParser(description="LCAO → FD → LR-TDDFT defect pipeline")
+    p.add_argument("--mpi", action="store_true", help="run under mpirun / gpaw python")
+    p.add_argument("--workdir", default=WORKDIR)
+    p.add_argument("--jobs", nargs="+", default=None, help="only these defect folders")
+    p.add_argument("--only", choices=["lcao", "fd", "tddft"], default=None,
+                   help="run a single stage (inputs of earlier stages must exist)")
+    p.add_argument("--backend", choices=["lr", "rt", "auto"], default=None,
+                   help=f"spectrum backend (default: {SPECTRUM_BACKEND})")
+    p.add_argument("--log", default="serial.log",
+                   help="log file name in <workdir>/logs (one per job when jobs run concurrently)")
+    p.add_argument("--profile", action="store_true",
+                   help="cProfile + sampled stacks per stage → <defect folder>/profiles/")
+    args, _ = p.parse_known_args(argv)   # tolerate Jupyter's own arguments
+    if args.profile:
+        os.environ[PROFILE_ENV] = "1"
+
+    workdir = os.path.abspath(args.workdir)
+    setup_logger(os.path.join(workdir, "logs"), args.log)
+
+    say(f"\nTDDFT pipeline started ({'MPI, %d ranks' % size if MPI_MODE else 'local machine'})\n")
+    logger.info(f"MPI execution on {size} ranks" if MPI_MODE else "SERIAL execution (MPI disabled)")
+
+    # ------------------------------------------------------------
+    # SET WORKDIR
+    # ------------------------------------------------------------
+    os.chdir(workdir)
+    say(f"Working directory: {workdir}")
+    logger.info(f"Working directory set to {workdir}")
+
+    jobs = find_defect_jobs(workdir)
+    if args.jobs:
+        jobs = [j for j in jobs if j[0] in args.jobs]
+
+    # Pristine first: its LCAO band edges are the host reference for screening
+    jobs.sort(key=lambda j: not any(tag in j[0].lower() for tag in ALWAYS_RUN))
+
+    say(f"Found {len(jobs)} defect folders.")
+    logger.info(f"Found {len(jobs)} defect folders: {[j[0] for j in jobs]}")
+
+    if not jobs:
+        say("No defect folders found. Exiting.")
+        raise SystemExit
+
+    success = 0
+    fail = 0
+    skipped = 0
+    t_start = time.time()
+
+    for i, (name, folder, inpath) in enumerate(jobs, start=1):
+        say(f"\n→ Start {name} ({i}/{len(jobs)}) | folder={os.path.basename(folder)}")
+        gpw_lcao = os.path.join(folder, f"{name}_lcao.gpw")
+        gpw_fd = os.path.join(folder, f"{name}_fd.gpw")
+        try:
+            if args.only in (None, "lcao"):
+                timed_stage(name, folder, "lcao", gpw_lcao, relax_lcao, name, folder, inpath)
+
+            if SCREENING:
+                # single-stage runs (--only fd/tddft, e.g. job_cost_model.py schedules)
+                # honour the screening saved after the LCAO stage
+                screen_json = os.path.join(folder, f"{name}_screen.json")
+                if args.only in (None, "lcao") or not os.path.exists(screen_json):
+                    screen = screen_candidate(name, folder, gpw_lcao, min_score=SCREEN_MIN_SCORE)
+                else:
+                    with open(screen_json) as f:
+                        screen = json.load(f)
+                if not screen["Passed"]:
+                    skipped += 1
+                    logger.info(f"Screened out {name}: {screen['Reason']}")
+                    say(f"⏭ Screened out {name}: {screen['Reason']}")
+                    continue
+                logger.info(f"Screening passed {name}: {screen['Reason']}")
+
+            csv = os.path.join(folder, f"{name}_spectrum.csv")
+            if spectrum_backend(name, inpath, args.backend) == "rt":
+                # real-time propagation starts from the LCAO ground state
+                if args.only in (None, "tddft"):
+                    timed_stage(name, folder, "rt_tddft", csv, run_rt_spectrum, name, folder, gpw_lcao)
+            else:
+                if args.only in (None, "fd"):
+                    timed_stage(name, folder, "fd", gpw_fd, fd_restart, name, folder, gpw_lcao)
+                if args.only in (None, "tddft"):
+                    timed_stage(name, folder, "tddft", csv, run_tddft, name, folder, gpw_fd)
+            success += 1
+        except Exception as e:
+            fail += 1
+            logger.error(f"Error for {name}: {e}")
+            say(f"⚠ Failed {name}: {e}")
+        finally:
+            if CATALOGUE and rank == 0:
+                try:
+                    update_catalogue(workdir, os.path.join(workdir, "catalogue.sqlite"), folders=[folder])
+                except Exception as e:
+                    logger.warning(f"Catalogue update failed for {name}: {e}")
+
+    t_end = time.time()
+
+    # ============================================================
+    # SUMMARY
+    # ============================================================
+    say("\n================ PIPELINE SUMMARY ================")
+    say(f"Ranks                   : {size}")
+    say(f"Total structures        : {len(jobs)}")
+    say(f"Successful spectra      : {success}")
+    say(f"Screened out (LCAO)     : {skipped}")
+    say(f"Failed structures       : {fail}")
+    say(f"Wallclock time          : {(t_end - t_start)/60:.1f} min")
+    say("==================================================\n")
+
+    if rank == 0:
+        merged_csv = merge_spectra(workdir)
+        print("\n TDDFT PIPELINE FINISHED\n", flush=True)
+        print(f"Merged spectra saved → {merged_csv}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# ============================================================
+# MONTE-CARLO FABRICATION TOLERANCE (vectorized)
+# Scenarios, drawn in batches as arrays (common to all defects):
+#   - ZPL shift          δE ~ N(0, SIGMA_ZPL_EV)     (DFT error, strain)
+#   - cavity shift       δλc ~ N(0, SIGMA_CAVITY_NM) (fabrication)
+#   - emitter position   x ~ N(0, SIGMA_POS_NM) along the beam,
+#                        |E|² ∝ cos²(2πx/MODE_PERIOD_NM)·exp(-(x/ENVELOPE_NM)²)
+#   - dipole orientation in-plane angle → cos²θ (if RANDOM_ORIENTATION)
+#   - Q degradation      q = Q'/Q ~ U(Q_MIN_FRAC, 1):
+#                        F'(λ) = q · Fp(λp + q(λ − λp))  (peak ∝ Q, width ∝ 1/Q)
+# Outputs (per cavity design and defect):
+#   tolerance_mc_summary.csv   nominal Fp, quantiles, yield at FP_TARGET
+#   tolerance_mc_yield.csv     P(Fp > threshold)
+#   tolerance_mc_yield.png
+# ============================================================
+import os
+import glob
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from zpl_purcell_table_and_tolerance import HC, load_purcell_csv, zpl_from_transitions
+
+# =========================
+# USER SETTINGS
+# =========================
+SPECTRA_CSV = "all_spectra_merged.csv"
+ZPL_CSV = None                          # optional table with Defect, ZPL_eV (e.g. ZPL_Purcell_matching.csv)
+CAVITY_GLOB = "purcell_spectrum*.csv"   # one file per cavity design
+N_SAMPLES = 2_000_000
+BATCH = 250_000
+SEED = 1
+
+SIGMA_ZPL_EV = 0.05
+SIGMA_CAVITY_NM = 5.0
+SIGMA_POS_NM = 20.0
+MODE_PERIOD_NM = 280.0         # field antinode spacing along the beam (≈ lattice period)
+ENVELOPE_NM = 600.0            # Gaussian mode envelope
+RANDOM_ORIENTATION = True
+Q_MIN_FRAC = 0.5
+
+FP_TARGET = 5.0                # reported yield P(Fp > FP_TARGET)
+N_BINS = 4000                  # resolution of the Fp distribution
+OUT_SUMMARY = "tolerance_mc_summary.csv"
+OUT_YIELD = "tolerance_mc_yield.csv"
+OUT_PNG = "tolerance_mc_yield.png"
+# =========================
+
+
+def draw_scenarios(rng, n):
+    """One batch of fabrication scenarios (arrays of length n)."""
+    dE = rng.normal(0.0, SIGMA_ZPL_EV, n)
+    dlam_c = rng.normal(0.0, SIGMA_CAVITY_NM, n)
+    x = rng.normal(0.0, SIGMA_POS_NM, n)
+    field = np.cos(2 * np.pi * x / MODE_PERIOD_NM) ** 2 * np.exp(-(x / ENVELOPE_NM) ** 2)
+    if RANDOM_ORIENTATION:
+        field *= np.cos(rng.uniform(0.0, np.pi, n)) ** 2
+    q = rng.uniform(Q_MIN_FRAC, 1.0, n)
+    return dE, dlam_c, field, q
+
+
+def effective_fp(zpl_ev, lam, fp, lam_p, dE, dlam_c, field, q):
+    """
+    Fp for every (defect, scenario): shape (n_defects, n).
+    zpl_ev: (n_defects,), lam/fp: sorted Purcell spectrum, lam_p: its peak.
+    """
+    lam_zpl = HC / (zpl_ev[:, None] + dE[None, :])
+    # spectrum shifted by δλc, then Q-degraded about the (shifted) peak
+    peak = lam_p + dlam_c
+    lookup = peak + q * (lam_zpl - peak) - dlam_c
+    F = np.interp(lookup.ravel(), lam, fp, left=0.0, right=0.0).reshape(lookup.shape)
+    return F * q[None, :] * field[None, :]
+
+
+def run_tolerance(zpl, lam, fp, n_samples=N_SAMPLES, seed=SEED, batch=BATCH):
+    """
+    Monte-Carlo over all defects at once. Returns (bin edges, counts per
+    defect (n_defects, N_BINS), mean Fp per defect).
+    """
+    rng = np.random.default_rng(seed)
+    lam_p = lam[np.argmax(fp)]
+    edges = np.linspace(0.0, 1.05 * fp.max(), N_BINS + 1)
+    counts = np.zeros((len(zpl), N_BINS), dtype=np.int64)
+    total = np.zeros(len(zpl))
+
+    for start in range(0, n_samples, batch):
+        n = min(batch, n_samples - start)
+        F = effective_fp(zpl, lam, fp, lam_p, *draw_scenarios(rng, n))
+        total += F.sum(axis=1)
+        idx = np.clip(np.searchsorted(edges, F, side="right") - 1, 0, N_BINS - 1)
+        for d in range(len(zpl)):
+            counts[d] += np.bincount(idx[d], minlength=N_BINS)
+
+    return edges, counts, total / n_samples
+
+
+def yield_curve(edges, counts):
+    """P(Fp > edge) for every lower bin edge."""
+    above = counts[:, ::-1].cumsum(axis=1)[:, ::-1]
+    return above / counts.sum(axis=1, keepdims=True)
+
+
+def quantile(edges, counts, p):
+    cdf = counts.cumsum(axis=1) / counts.sum(axis=1, keepdims=True)
+    return np.array([edges[:-1][np.searchsorted(c, p)] for c in cdf])
+
+
+def main():
+    p = argparse.ArgumentParser(description="Monte-Carlo fabrication tolerance of Fp.")
+    p.add_argument("--samples", type=int, default=N_SAMPLES)
+    p.add_argument("--seed", type=int, default=SEED)
+    p.add_argument("--cavities", nargs="+", default=None, help=f"Purcell CSVs (default: {CAVITY_GLOB})")
+    p.add_argument("--target", type=float, default=FP_TARGET, help="Fp threshold for the yield")
+    p.add_argument("--zpl-csv", default=ZPL_CSV, help="Defect, ZPL_eV table instead of the spectra")
+    args = p.parse_args()
+
+    if args.zpl_csv:
+        tab = pd.read_csv(args.zpl_csv).sort_values("Defect")
+        defects = tab["Defect"].tolist()
+        zpl = tab["ZPL_eV"].to_numpy(dtype=float)
+    else:
+        df = pd.read_csv(SPECTRA_CSV)
+        defects = sorted(df["Molecule"].unique())
+        zpl = np.array([zpl_from_transitions(df, mol)[0] for mol in defects])
+
+    cavities = args.cavities or sorted(glob.glob(CAVITY_GLOB))
+    summary, curves = [], []
+    fig, axes = plt.subplots(1, len(cavities), figsize=(5.5 * len(cavities), 4), squeeze=False)
+
+    for ax, cav_file in zip(axes[0], cavities):
+        cavity = os.path.splitext(os.path.basename(cav_file))[0]
+        pur = load_purcell_csv(cav_file)
+        lam = pur["wavelength_nm"].to_numpy()
+        fp = pur["Fp"].to_numpy()
+
+        t0 = time.time()
+        edges, counts, mean = run_tolerance(zpl, lam, fp, args.samples, args.seed)
+        elapsed = time.time() - t0
+
+        Y = yield_curve(edges, counts)
+        q10, q50, q90 = (quantile(edges, counts, p) for p in (0.1, 0.5, 0.9))
+        k_target = np.searchsorted(edges, args.target) - 1
+        nominal = np.interp(HC / zpl, lam, fp, left=0.0, right=0.0)
+
+        for d, mol in enumerate(defects):
+            summary.append({
+                "Cavity": cavity,
+                "Defect": mol,
+                "ZPL_nm": HC / zpl[d],
+                "Fp_nominal": nominal[d],
+                "Fp_mean": mean[d],
+                "Fp_p10": q10[d],
+                "Fp_p50": q50[d],
+                "Fp_p90": q90[d],
+                f"Yield_Fp_gt_{args.target:g}": Y[d, max(k_target, 0)],
+            })
+            step = max(1, N_BINS // 400)
+            curves.append(pd.DataFrame({"Cavity": cavity, "Defect": mol,
+                                        "Fp_threshold": edges[:-1:step], "Yield": Y[d, ::step]}))
+            ax.plot(edges[:-1], Y[d], label=mol)
+
+        ax.axvline(args.target, color="k", ls="--", lw=1)
+        ax.set_xlabel("Purcell threshold $F_p$")
+        ax.set_ylabel(r"Yield $P(F_p > \mathrm{threshold})$")
+        ax.set_title(cavity)
+        ax.set_ylim(0, 1.02)
+        ax.grid(alpha=0.3)
+        print(f"{cavity}: {args.samples:,} scenarios × {len(defects)} defects in {elapsed:.1f} s")
+
+    axes[0, 0].legend(frameon=False, fontsize=8)
+    fig.tight_layout()
+    fig.savefig(OUT_PNG, dpi=300)
+    plt.close(fig)
+
+    out = pd.DataFrame(summary)
+    out.to_csv(OUT_SUMMARY, index=False)
+    pd.concat(curves, ignore_index=True).to_csv(OUT_YIELD, index=False)
+
+    print("\n" + out.to_string(index=False, float_format=lambda v: f"{v:.3g}"))
+    print(f"\nSaved → {OUT_SUMMARY}, {OUT_YIELD}, {OUT_PNG}")
+
+
+if __name__ == "__main__":
+    main()